@@ -2,17 +2,15 @@
 Anomalies Detection
 """
 from datetime import datetime
+import math
+import numpy as np
 from django.utils import timezone
 from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import D
-from django.contrib.gis.db.models.functions import Distance
 from apps.safety.models import (
-    LocationTracking,
     SafetyAction,
-    CrimeZone
 )
-from datetime import timedelta
-from collections import Counter
+from apps.safety.track_buffer import track_buffers
+from apps.safety.zone_index import zone_index
 
 
 class StoppedMovementDetector:
@@ -23,8 +21,12 @@ class StoppedMovementDetector:
     DURATION_THRESHOLD = 60  # Seconds (1 minute)
 
     @staticmethod
-    def detect(user_profile):
+    def detect(user_profile, track=None):
         """
+        Args:
+            user_profile: UserProfile
+            track: Optional TrackBuffer (default: the user's buffer)
+
         Returns:
         {
             "is_anomaly": True/False,
@@ -32,13 +34,14 @@ class StoppedMovementDetector:
             "risk_increase": 25  // How much to add to risk score
         }
         """
+        if track is None:
+            track = track_buffers.get(user_profile)
+
         # Get last 10 locations (last ~1.5 minutes if updating every 10s)
         # Get last 30 locations (last ~5 minutes if updating every 10s)
-        recent_locations = list(LocationTracking.objects.filter(
-            user_profile=user_profile
-        ).order_by('-timestamp')[:30])
+        timestamps, latitudes, longitudes, speeds = track.recent(30)
 
-        if len(recent_locations) < 10:
+        if len(timestamps) < 10:
             # Not enough data yet
             return {
                 "is_anomaly": False,
@@ -46,15 +49,12 @@ class StoppedMovementDetector:
                 "risk_increase": 0
             }
         
-        # check if stopped.
-        stopped_points = []
-        for loc in recent_locations:
-            if loc.speed < StoppedMovementDetector.STOPPED_THRESHOLD:
-                stopped_points.append(loc)
-            else:
-                break
+        # check if stopped: length of the newest run of slow fixes
+        # (unknown speed counts as moving)
+        moving = ~(speeds < StoppedMovementDetector.STOPPED_THRESHOLD)
+        n_stopped = int(np.argmax(moving)) if moving.any() else len(moving)
         
-        if not stopped_points:
+        if n_stopped == 0:
              return {
                 "is_anomaly": False,
                 "reason": "User is currently moving",
@@ -62,10 +62,7 @@ class StoppedMovementDetector:
             }
 
         # Calculate duration - How long have they been stopped
-        oldest_stopped = stopped_points[-1]
-        newest = stopped_points[0]
-
-        stopped_duration = (newest.timestamp - oldest_stopped.timestamp).total_seconds()
+        stopped_duration = timestamps[0] - timestamps[n_stopped - 1]
 
         if stopped_duration < StoppedMovementDetector.DURATION_THRESHOLD:
             return {
@@ -74,11 +71,10 @@ class StoppedMovementDetector:
                 "risk_increase": 0
             }
         
-        current_location = recent_locations[0].location
+        current_location = Point(float(longitudes[0]), float(latitudes[0]), srid=4326)
 
-        nearest_zone = CrimeZone.objects.filter(
-            location__distance_lte=(current_location, D(m=200))
-        ).annotate(distance=Distance('location', current_location)).order_by('distance').first()
+        nearby_zones = zone_index.within(latitudes[0], longitudes[0], 200)
+        nearest_zone = nearby_zones[0][0] if nearby_zones else None
 
         if not nearest_zone or nearest_zone.risk_level < 60:
             return {
@@ -110,8 +106,12 @@ class RouteDeviationDetector:
     DEVIATION_THRESHOLD_METERS = 2000  # 2km from usual area
 
     @staticmethod
-    def detect(user_profile):
+    def detect(user_profile, track=None):
         """
+        Args:
+            user_profile: UserProfile
+            track: Optional TrackBuffer (default: the user's buffer)
+
         Returns:
         {
             "is_anomaly": True/False,
@@ -120,34 +120,26 @@ class RouteDeviationDetector:
         }
         """
 
-        # Get Location history
-        last_50_locations = list(LocationTracking.objects.filter(
-            user_profile=user_profile
-        ).order_by('-timestamp')[:100])
+        # Get Location history (last 100 fixes)
+        if track is None:
+            track = track_buffers.get(user_profile)
 
-        if len(last_50_locations) < 10:
+        if len(track) < 10:
             return {
                 "is_anomaly": False,
                 "reason": "Insufficient location history for pattern analysis",
                 "risk_increase": 0
             }
         
-        # Calculate center point
-        # - Get all lats/longs coordinates
-        latitudes = [loc.location.y for loc in last_50_locations]
-        longitudes = [loc.location.x for loc in last_50_locations]
-        
-        # Calculate average (center of user's typical area)
-        avg_lat = sum(latitudes) / len(latitudes)
-        avg_lon = sum(longitudes) / len(longitudes)
-
-        center_point = Point(avg_lon, avg_lat)
+        # Center of user's typical area (maintained by the buffer)
+        avg_lat, avg_lon = track.centroid()
 
         # Check current deviation
-        current_location = last_50_locations[0].location
+        current_lat, current_lon = track.latest()
+        current_location = Point(float(current_lon), float(current_lat), srid=4326)
 
         # Calculate distance from center
-        distance = current_location.distance(center_point) * 111000  # degrees to meters
+        distance = math.hypot(current_lat - avg_lat, current_lon - avg_lon) * 111000  # degrees to meters
 
         if distance > RouteDeviationDetector.DEVIATION_THRESHOLD_METERS:
             SafetyAction.objects.create(
@@ -177,8 +169,12 @@ class TimePatternDetector:
     Detects when user is active at unusual times
     """
     @staticmethod
-    def detect(user_profile):
+    def detect(user_profile, track=None):
         """
+        Args:
+            user_profile: UserProfile
+            track: Optional TrackBuffer (default: the user's buffer)
+
         Returns:
         {
             "is_anomaly": True/False,
@@ -186,26 +182,19 @@ class TimePatternDetector:
             "risk_increase": 20
         }
         """
-        # 1. Get user's historical active hours (from past locations)
-
-        # Get locations from past week
-        one_week_ago = timezone.now() - timedelta(days=7)
-        history = LocationTracking.objects.filter(
-            user_profile=user_profile,
-            timestamp__gte=one_week_ago
-        )
+        # 1. Get user's historical active hours (decaying histogram, ~1 week half-life)
+        if track is None:
+            track = track_buffers.get(user_profile)
+        hour_counts = track.hour_counts()
 
-        if history.count() < 20:
+        if sum(hour_counts.values()) < 20:
             return {
                 "is_anomaly": False,
                 "reason": "Insufficient data for time pattern analysis",
                 "risk_increase": 0
             }
 
-        # Get hours when user was active
-        active_hours = [loc.timestamp.hour for loc in history]
         # 2. Calculate typical hour range
-        hour_counts = Counter(active_hours)
         # User is typically active during these hours
         typical_hours = [hour for hour, count in hour_counts.items() if count >= 2]
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
-from .models import IncidentReport, ThreatPrediction, RouteAnalysis
+from .models import IncidentReport, ThreatPrediction, RouteAnalysis, PredictionAccuracyState
 
 # ---------------------------
 # IncidentReport
@@ -29,3 +29,11 @@ class RouteAnalysisAdmin(GISModelAdmin):
     list_display = ['risk_score', 'total_distance_meters', 'crosses_danger_zones', 'user_selected', 'created_at']
     list_filter = ['user_selected', 'crosses_danger_zones']
     date_hierarchy = 'created_at'
+
+# ---------------------------
+# PredictionAccuracyState
+# ---------------------------
+@admin.register(PredictionAccuracyState)
+class PredictionAccuracyStateAdmin(admin.ModelAdmin):
+    list_display = ['verified_through', 'total_predictions', 'verified_predictions', 'correct_predictions', 'updated_at']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,22 @@
+"""
+Database functions for reading point coordinates without building GEOS objects
+"""
+from django.db.models import FloatField, Func
+
+
+class PointX(Func):
+    """
+    Longitude of a geography point (ST_X)
+    """
+    function = 'ST_X'
+    template = '%(function)s(%(expressions)s::geometry)'
+    output_field = FloatField()
+
+
+class PointY(Func):
+    """
+    Latitude of a geography point (ST_Y)
+    """
+    function = 'ST_Y'
+    template = '%(function)s(%(expressions)s::geometry)'
+    output_field = FloatField()
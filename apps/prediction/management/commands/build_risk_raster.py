@@ -0,0 +1,50 @@
+"""
+Management command to rebuild the location-risk raster tiles
+Run after incidents change (or from cron with --if-stale)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+
+from apps.prediction.models import IncidentReport
+from ml.incident_index import IncidentIndex
+from ml.location_risk_raster import LocationRiskRaster
+
+
+class Command(BaseCommand):
+    help = 'Rasterize incident density (location_risk) into memory-mappable tiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--radius',
+            type=int,
+            default=150,
+            help='Neighbour radius in meters (must match ThreatPredictor.LOCATION_RISK_RADIUS_M)'
+        )
+        parser.add_argument(
+            '--if-stale',
+            action='store_true',
+            help='Only rebuild if incidents changed since the last build'
+        )
+
+    def handle(self, *args, **options):
+        raster = LocationRiskRaster(settings.LOCATION_RISK_RASTER_DIR)
+
+        if options['if_stale']:
+            manifest = raster.read_manifest()
+            stats = IncidentReport.objects.aggregate(max_id=Max('id'), total=Count('id'))
+            if (manifest
+                    and manifest['radius_m'] == options['radius']
+                    and manifest['incident_count'] == stats['total']
+                    and manifest['last_incident_id'] == stats['max_id']):
+                self.stdout.write(self.style.SUCCESS('✅ Risk raster is up to date'))
+                return
+
+        self.stdout.write('🗺️  Loading incidents...')
+        index = IncidentIndex()
+        index.load()
+
+        self.stdout.write(f'Rasterizing {len(index)} incidents ({raster.CELL_SIZE_M}m cells)...')
+        tiles = raster.build(index, options['radius'], last_incident_id=index.last_id or None)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {tiles} tile(s) to {raster.root}'))
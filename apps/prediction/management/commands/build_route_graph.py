@@ -0,0 +1,73 @@
+"""
+Management command to build the walking graph used by suggest_safe_route
+Re-run after the OSM extract changes; pass --risk-only to just rescore edges
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml.prediction_service import ThreatPredictor
+from ml.route_graph import RouteGraph
+
+
+class Command(BaseCommand):
+    help = 'Build the CSR walking graph (with per-edge risk) from an OpenStreetMap extract'
+
+    PREDICT_CHUNK = 50000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--osm',
+            help='Path to an .osm / .osm.gz / .osm.bz2 extract'
+        )
+        parser.add_argument(
+            '--risk-only',
+            action='store_true',
+            help='Rescore edges of the existing graph instead of rebuilding it'
+        )
+        parser.add_argument(
+            '--hour',
+            type=int,
+            default=22,
+            help='Hour of day the static edge risk is predicted for'
+        )
+        parser.add_argument(
+            '--day',
+            type=int,
+            default=4,
+            help='Day of week (0=Mon) the static edge risk is predicted for'
+        )
+
+    def handle(self, *args, **options):
+        path = settings.ROUTE_GRAPH_PATH
+
+        if options['risk_only']:
+            if not os.path.exists(path):
+                raise CommandError(f'No graph at {path}; build it with --osm first')
+            graph = RouteGraph.load(path)
+        elif options['osm']:
+            self.stdout.write(f'🗺️  Parsing {options["osm"]}...')
+            try:
+                graph = RouteGraph.from_osm(options['osm'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            raise CommandError('Pass --osm <extract> (or --risk-only to rescore)')
+
+        self.stdout.write(f'Scoring {graph.edge_count} edges over {graph.node_count} nodes...')
+        predictor = ThreatPredictor()
+        lats, lons = graph.edge_midpoints()
+        for start in range(0, len(lats), self.PREDICT_CHUNK):
+            end = start + self.PREDICT_CHUNK
+            graph.edge_risk[start:end] = predictor.predict_batch(
+                lats[start:end], lons[start:end], options['hour'], options['day']
+            )
+
+        graph.save(path)
+
+        # Edge order changed, so the hour-of-week table no longer lines up
+        if not options['risk_only'] and os.path.exists(settings.ROUTE_RISK_TABLE_PATH):
+            os.remove(settings.ROUTE_RISK_TABLE_PATH)
+            self.stdout.write('⚠️  Removed stale edge risk table; run build_route_risk')
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote route graph to {path}'))
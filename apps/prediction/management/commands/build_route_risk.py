@@ -0,0 +1,31 @@
+"""
+Management command to precompute hour-of-week edge risk for the route graph
+Run nightly from cron, and after build_route_graph
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml.prediction_service import ThreatPredictor
+from ml.route_graph import RouteGraph, EdgeRiskTable, HOURS_PER_WEEK
+
+
+class Command(BaseCommand):
+    help = 'Predict risk at every route-graph edge for all 168 hour-of-week buckets'
+
+    def handle(self, *args, **options):
+        if not os.path.exists(settings.ROUTE_GRAPH_PATH):
+            raise CommandError(f'No graph at {settings.ROUTE_GRAPH_PATH}; run build_route_graph first')
+
+        graph = RouteGraph.load(settings.ROUTE_GRAPH_PATH)
+        predictor = ThreatPredictor()
+
+        self.stdout.write(f'Scoring {graph.edge_count} edges x {HOURS_PER_WEEK} hours...')
+
+        def progress(edges_done):
+            self.stdout.write(f'  {edges_done}/{graph.edge_count} edges')
+
+        EdgeRiskTable.build(settings.ROUTE_RISK_TABLE_PATH, graph, predictor, progress=progress)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote edge risk table to {settings.ROUTE_RISK_TABLE_PATH}'))
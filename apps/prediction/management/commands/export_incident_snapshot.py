@@ -0,0 +1,36 @@
+"""
+Management command to export incidents to a Parquet snapshot for training
+Usage: python manage.py export_incident_snapshot --output ml/incidents.parquet
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ml.data_preparation import DataPreparation
+
+
+class Command(BaseCommand):
+    help = 'Export all incidents to a columnar Parquet snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='ml/incidents.parquet',
+            help='Snapshot file to write'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DataPreparation.CHUNK_SIZE,
+            help='Rows per server-side cursor fetch'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('📦 Exporting incidents...')
+        try:
+            rows = DataPreparation.export_snapshot(
+                options['output'],
+                chunk_size=options['chunk_size']
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Exported {rows} incident(s) to {options['output']}"))
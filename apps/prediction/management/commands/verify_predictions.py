@@ -0,0 +1,38 @@
+"""
+Management command to verify past ThreatPredictions against incident reports
+Run from cron (e.g. hourly); each run picks up where the last one stopped
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.prediction.verification import SETTLE_TIME, WINDOW, verify_predictions
+
+
+class Command(BaseCommand):
+    help = 'Match predictions with incidents (±1h, 500m) and update accuracy totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settle-hours',
+            type=float,
+            default=SETTLE_TIME.total_seconds() / 3600,
+            help='Only verify predictions at least this many hours old'
+        )
+        parser.add_argument(
+            '--window-hours',
+            type=float,
+            default=WINDOW.total_seconds() / 3600,
+            help='Prediction time span verified per statement'
+        )
+
+    def handle(self, *args, **options):
+        windows, predictions = verify_predictions(
+            timezone.now(),
+            window=timedelta(hours=options['window_hours']),
+            settle=timedelta(hours=options['settle_hours'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Verified {predictions} prediction(s) in {windows} window(s)'
+        ))
@@ -1,5 +1,5 @@
 # ============================================
-# PREDICTION MODELS (3)
+# PREDICTION MODELS (4)
 # ============================================
 from django.db import models
 from django.contrib.gis.geos import Point
@@ -67,10 +67,33 @@ class ThreatPrediction(models.Model):
     
     class Meta:
         ordering = ['-prediction_for_datetime']
+        indexes = [
+            # Verification job scans by prediction time window
+            models.Index(fields=['prediction_for_datetime'], name='threatpred_for_dt_idx'),
+        ]
         verbose_name = "Threat Prediction"
         verbose_name_plural = "Threat Predictions"
 
 
+class PredictionAccuracyState(models.Model):
+    """
+    Running accuracy totals kept by `manage.py verify_predictions`
+    (single row). Predictions for times before verified_through have been
+    checked against incident reports.
+    """
+    verified_through = models.DateTimeField(null=True, blank=True, help_text="Watermark on prediction_for_datetime")
+    total_predictions = models.IntegerField(default=0)
+    verified_predictions = models.IntegerField(default=0, help_text="Predictions judged (not medium risk)")
+    correct_predictions = models.IntegerField(default=0)
+    false_positives = models.IntegerField(default=0)
+    false_negatives = models.IntegerField(default=0)
+    confidence_breakdown = models.JSONField(default=dict, help_text="{band: {count, verified, correct}}")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Prediction accuracy through {self.verified_through}"
+
+
 class RouteAnalysis(models.Model):
     """
     Calculated safe route options
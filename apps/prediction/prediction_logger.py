@@ -0,0 +1,172 @@
+"""
+Buffered ThreatPrediction logging
+
+Request handlers hand predictions to a process-local buffer instead of
+inserting them inline; a background thread writes them with bulk_create
+when the buffer fills or every FLUSH_INTERVAL seconds, and whatever is
+left is flushed at interpreter exit.
+"""
+import atexit
+import random
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import close_old_connections
+from django.utils import timezone
+
+
+def next_occurrence(hour, day_of_week, now=None):
+    """
+    Start of the next (or current) hour matching an hour and weekday
+
+    Args:
+        hour: 0-23 (wrapped, like hour_of_week)
+        day_of_week: 0-6 (0=Mon)
+        now: Aware datetime, defaults to the current local time
+    """
+    now = timezone.localtime(now or timezone.now())
+    start = now.replace(minute=0, second=0, microsecond=0)
+    days_ahead = (int(day_of_week) % 7 - start.weekday()) % 7
+    candidate = start.replace(hour=int(hour) % 24) + timedelta(days=days_ahead)
+    if candidate < start:
+        candidate += timedelta(days=7)
+    return candidate
+
+
+class PredictionLogger:
+    """
+    Collects prediction records and writes them in batches
+    """
+    FLUSH_SIZE = 500        # Wake the writer once this many are pending
+    FLUSH_INTERVAL = 5.0    # Seconds between timed flushes
+    MAX_PENDING = 50000     # Drop records past this (e.g. while the DB is down)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='prediction-logger', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def log_many(self, latitudes, longitudes, prediction_for, risk_probabilities,
+                 incident_type='General Threat'):
+        """
+        Queue predictions for writing
+
+        Args:
+            latitudes, longitudes, risk_probabilities: Equal-length sequences
+            prediction_for: Datetime the predictions are for, or a sequence
+                of one per prediction
+        """
+        risks = np.asarray(risk_probabilities, dtype=np.float64)
+        if np.ndim(prediction_for) == 0:
+            prediction_for = [prediction_for] * len(risks)
+
+        records = [
+            (float(lon), float(lat), when, round(risk * 100, 1), risk * 100, incident_type)
+            for lat, lon, when, risk in zip(latitudes, longitudes, prediction_for, risks.tolist())
+        ]
+        if not records:
+            return
+
+        with self._lock:
+            room = self.MAX_PENDING - len(self._pending)
+            if room < len(records):
+                self.dropped += len(records) - max(room, 0)
+                records = records[:max(room, 0)]
+            self._pending.extend(records)
+            pending = len(self._pending)
+
+        self._ensure_started()
+        if pending >= self.FLUSH_SIZE:
+            self._wake.set()
+
+    def log(self, latitude, longitude, prediction_for, risk_probability,
+            incident_type='General Threat'):
+        self.log_many([latitude], [longitude], prediction_for, [risk_probability], incident_type)
+
+    def sampled(self, rate=None):
+        """
+        Whether to log this request's predictions
+
+        Args:
+            rate: Sampling probability (default settings.PREDICTION_LOG_SAMPLE_RATE)
+        """
+        rate = settings.PREDICTION_LOG_SAMPLE_RATE if rate is None else rate
+        return random.random() < rate
+
+    def flush(self):
+        """
+        Write everything pending
+
+        On a database error the batch is put back (ahead of anything
+        queued meanwhile, up to MAX_PENDING) for the next flush, and the
+        error is raised.
+
+        Returns:
+            Number of rows written
+        """
+        from apps.prediction.models import ThreatPrediction
+
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return 0
+
+        try:
+            ThreatPrediction.objects.bulk_create([
+                ThreatPrediction(
+                    location=Point(lon, lat, srid=4326),
+                    prediction_for_datetime=when,
+                    predicted_risk_score=score,
+                    prediction_confidence=confidence,
+                    incident_type_predicted=incident_type
+                )
+                for lon, lat, when, score, confidence, incident_type in records
+            ], batch_size=self.FLUSH_SIZE)
+        except Exception:
+            self._requeue(records)
+            raise
+
+        self.written += len(records)
+        return len(records)
+
+    def _requeue(self, records):
+        """
+        Put an unwritten batch back, dropping its oldest records if the
+        buffer has since filled up
+        """
+        with self._lock:
+            room = max(self.MAX_PENDING - len(self._pending), 0)
+            if room < len(records):
+                self.dropped += len(records) - room
+                records = records[len(records) - room:]
+            self._pending[:0] = records
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Prediction log flush failed: {e}")
+            finally:
+                # This thread holds its own DB connection
+                close_old_connections()
+
+
+prediction_logger = PredictionLogger()
@@ -1,3 +1,120 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.gis.geos import Point
 from django.test import TestCase
 
-# Create your tests here.
+from .models import IncidentReport, PredictionAccuracyState, ThreatPrediction
+from .prediction_logger import PredictionLogger, next_occurrence
+from .verification import accuracy_summary, verify_predictions
+
+
+class PredictionLoggerTests(TestCase):
+    def test_flush_writes_pending_in_one_batch(self):
+        logger = PredictionLogger()
+        when = datetime(2025, 1, 3, 22, tzinfo=dt_timezone.utc)
+        # Queue without starting the writer thread
+        logger._ensure_started = lambda: None
+        logger.log_many([5.125, 5.126], [7.356, 7.357], when, [0.25, 0.8])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(logger.flush(), 2)
+
+        rows = ThreatPrediction.objects.order_by('predicted_risk_score')
+        self.assertEqual([r.predicted_risk_score for r in rows], [25.0, 80.0])
+        self.assertEqual(rows[1].prediction_for_datetime, when)
+        self.assertEqual(logger.flush(), 0)
+
+    def test_pending_is_capped(self):
+        logger = PredictionLogger()
+        logger._ensure_started = lambda: None
+        logger.MAX_PENDING = 3
+        when = datetime(2025, 1, 3, 22, tzinfo=dt_timezone.utc)
+        logger.log_many([5.0] * 5, [7.0] * 5, when, [0.5] * 5)
+        self.assertEqual(len(logger._pending), 3)
+        self.assertEqual(logger.dropped, 2)
+
+    def test_failed_flush_is_requeued(self):
+        logger = PredictionLogger()
+        logger._ensure_started = lambda: None
+        logger.MAX_PENDING = 3
+        when = datetime(2025, 1, 3, 22, tzinfo=dt_timezone.utc)
+        logger.log_many([5.0, 5.1], [7.0, 7.1], when, [0.1, 0.2])
+
+        def fail(*args, **kwargs):
+            # Requests keep logging while the write is in flight
+            logger.log_many([5.2, 5.3], [7.2, 7.3], when, [0.3, 0.4])
+            raise RuntimeError('db down')
+
+        with mock.patch.object(ThreatPrediction.objects, 'bulk_create', side_effect=fail):
+            with self.assertRaises(RuntimeError):
+                logger.flush()
+
+        # The batch went back ahead of the new records; only the oldest
+        # failed record didn't fit
+        self.assertEqual(logger.dropped, 1)
+        self.assertEqual(logger.flush(), 3)
+        self.assertEqual(
+            sorted(ThreatPrediction.objects.values_list('predicted_risk_score', flat=True)),
+            [20.0, 30.0, 40.0]
+        )
+
+
+class NextOccurrenceTests(TestCase):
+    def test_later_today_and_next_week(self):
+        # Friday 2025-01-03 15:30 UTC (TIME_ZONE may shift the local view)
+        now = datetime(2025, 1, 3, 15, 30, tzinfo=dt_timezone.utc)
+        later = next_occurrence(22, 4, now)
+        self.assertEqual((later.weekday(), later.hour), (4, 22))
+        self.assertGreaterEqual(later, now.replace(minute=0))
+
+        earlier = next_occurrence(3, 4, now)
+        self.assertEqual((earlier.weekday(), earlier.hour), (4, 3))
+        self.assertGreater(earlier, now)
+
+    def test_out_of_range_values_wrap(self):
+        now = datetime(2025, 1, 3, 15, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(next_occurrence(24, 11, now), next_occurrence(0, 4, now))
+
+
+class VerifyPredictionsTests(TestCase):
+    def setUp(self):
+        self.when = datetime(2025, 1, 3, 22, tzinfo=dt_timezone.utc)
+        IncidentReport.objects.create(
+            incident_type='Robbery', location=Point(7.356, 5.125, srid=4326),
+            occurred_at=self.when + timedelta(minutes=30), severity=5,
+            day_of_week=4, hour_of_day=22
+        )
+
+    def predict(self, lon, lat, score, when=None):
+        return ThreatPrediction.objects.create(
+            location=Point(lon, lat, srid=4326), prediction_for_datetime=when or self.when,
+            predicted_risk_score=score, prediction_confidence=score
+        )
+
+    def test_window_join_and_running_totals(self):
+        hit = self.predict(7.3565, 5.125, 85)        # ~55m away: correct
+        miss = self.predict(7.40, 5.125, 70)         # ~4.8km away: false positive
+        quiet = self.predict(7.40, 5.125, 20)        # correct
+        medium = self.predict(7.356, 5.125, 50)      # not judged
+
+        now = self.when + timedelta(days=2)
+        windows, verified = verify_predictions(now)
+        self.assertEqual(verified, 4)
+
+        for prediction in (hit, miss, quiet, medium):
+            prediction.refresh_from_db()
+        self.assertEqual((hit.was_accurate, hit.actual_incidents_count), (True, 1))
+        self.assertEqual(miss.was_accurate, False)
+        self.assertEqual(quiet.was_accurate, True)
+        self.assertIsNone(medium.was_accurate)
+
+        summary = accuracy_summary(PredictionAccuracyState.objects.get())
+        self.assertEqual(summary['total_predictions'], 4)
+        self.assertEqual(summary['verified_predictions'], 3)
+        self.assertEqual(summary['false_positives'], 1)
+        self.assertEqual(summary['confidence_breakdown']['Very High']['accuracy'], 100.0)
+        self.assertIsNone(summary['confidence_breakdown']['Medium']['accuracy'])
+
+        # Rows behind the watermark are not counted twice
+        self.assertEqual(verify_predictions(now), (0, 0))
@@ -0,0 +1,164 @@
+"""
+Set-based verification of ThreatPredictions against IncidentReports
+
+Predictions are processed in time windows behind a watermark
+(PredictionAccuracyState.verified_through). Each window is one SQL
+statement: a PostGIS ST_DWithin join against incidents (±1 hour, 500m),
+a bulk UPDATE of actual_incidents_count / was_accurate, and per-band
+counts of the updated rows, which are added to the running totals.
+
+Predictions inserted for times already behind the watermark are not
+revisited.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Min
+
+from .models import IncidentReport, PredictionAccuracyState, ThreatPrediction
+
+
+MATCH_RADIUS_M = 500
+MATCH_WINDOW = timedelta(hours=1)
+WINDOW = timedelta(days=1)          # Predictions verified per statement
+SETTLE_TIME = timedelta(hours=6)    # Wait this long after a prediction's time for late reports
+
+# Same cut-offs as ThreatPredictor.confidence_level, on the 0-100 score
+CONFIDENCE_BANDS = ['Very High', 'High', 'Medium', 'Low']
+
+VERIFY_SQL = """
+WITH matched AS (
+    SELECT p.id, count(i.id) AS incidents
+    FROM {predictions} p
+    LEFT JOIN {incidents} i
+        ON i.occurred_at BETWEEN p.prediction_for_datetime - %(match_window)s
+                             AND p.prediction_for_datetime + %(match_window)s
+        AND ST_DWithin(i.location, p.location, %(radius)s)
+    WHERE p.prediction_for_datetime >= %(start)s AND p.prediction_for_datetime < %(end)s
+    GROUP BY p.id
+), updated AS (
+    UPDATE {predictions} p
+    SET actual_incidents_count = m.incidents,
+        -- High risk (>60) should see incidents, low risk (<40) should not;
+        -- medium risk is not judged
+        was_accurate = CASE
+            WHEN p.predicted_risk_score > 60 THEN m.incidents > 0
+            WHEN p.predicted_risk_score < 40 THEN m.incidents = 0
+            ELSE NULL
+        END
+    FROM matched m
+    WHERE p.id = m.id
+    RETURNING p.predicted_risk_score, p.was_accurate
+)
+SELECT
+    CASE
+        WHEN predicted_risk_score > 80 THEN 'Very High'
+        WHEN predicted_risk_score > 60 THEN 'High'
+        WHEN predicted_risk_score > 40 THEN 'Medium'
+        ELSE 'Low'
+    END AS band,
+    count(*),
+    count(was_accurate),
+    count(*) FILTER (WHERE was_accurate),
+    count(*) FILTER (WHERE predicted_risk_score > 60 AND NOT was_accurate),
+    count(*) FILTER (WHERE predicted_risk_score < 40 AND NOT was_accurate)
+FROM updated
+GROUP BY band
+"""
+
+
+def verify_window(start, end):
+    """
+    Verify every prediction for a time in [start, end)
+
+    Returns:
+        {band: (count, verified, correct, false_positives, false_negatives)}
+    """
+    qn = connection.ops.quote_name
+    sql = VERIFY_SQL.format(
+        predictions=qn(ThreatPrediction._meta.db_table),
+        incidents=qn(IncidentReport._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            'match_window': MATCH_WINDOW,
+            'radius': MATCH_RADIUS_M,
+            'start': start,
+            'end': end,
+        })
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def _add_to_state(state, counts):
+    breakdown = state.confidence_breakdown or {}
+    for band, (count, verified, correct, false_pos, false_neg) in counts.items():
+        state.total_predictions += count
+        state.verified_predictions += verified
+        state.correct_predictions += correct
+        state.false_positives += false_pos
+        state.false_negatives += false_neg
+
+        totals = breakdown.setdefault(band, {'count': 0, 'verified': 0, 'correct': 0})
+        totals['count'] += count
+        totals['verified'] += verified
+        totals['correct'] += correct
+    state.confidence_breakdown = breakdown
+
+
+def verify_predictions(now, window=WINDOW, settle=SETTLE_TIME):
+    """
+    Advance the watermark to now - settle, one window per transaction
+
+    Returns:
+        (windows processed, predictions verified)
+    """
+    until = now - settle
+    windows = predictions = 0
+
+    while True:
+        with transaction.atomic():
+            state, _ = PredictionAccuracyState.objects.select_for_update().get_or_create(pk=1)
+
+            start = state.verified_through
+            if start is None:
+                start = ThreatPrediction.objects.aggregate(first=Min('prediction_for_datetime'))['first']
+                if start is None:
+                    return windows, predictions
+            if start >= until:
+                return windows, predictions
+
+            end = min(start + window, until)
+            counts = verify_window(start, end)
+            _add_to_state(state, counts)
+            state.verified_through = end
+            state.save()
+
+        windows += 1
+        predictions += sum(c[0] for c in counts.values())
+
+
+def accuracy_summary(state):
+    """
+    Response body for the prediction_accuracy endpoint
+    """
+    def pct(correct, verified):
+        return round(correct / verified * 100, 1) if verified else None
+
+    breakdown = state.confidence_breakdown or {}
+    return {
+        "overall_accuracy": pct(state.correct_predictions, state.verified_predictions) or 0,
+        "total_predictions": state.total_predictions,
+        "verified_predictions": state.verified_predictions,
+        "correct_predictions": state.correct_predictions,
+        "false_positives": state.false_positives,
+        "false_negatives": state.false_negatives,
+        "confidence_breakdown": {
+            band: {
+                "accuracy": pct(breakdown[band]['correct'], breakdown[band]['verified']),
+                "count": breakdown[band]['count'],
+                "verified": breakdown[band]['verified'],
+            }
+            for band in CONFIDENCE_BANDS if band in breakdown
+        },
+        "verified_through": state.verified_through,
+    }
@@ -0,0 +1,263 @@
+"""
+Risk Engine
+Single-pass risk assessment for the calculate_risk endpoint
+
+Loads everything a GPS tick needs in a fixed number of queries:
+    1. fixes written since the user's in-memory TrackBuffer was last
+       updated (usually none; the buffer feeds every detector)
+    2. the user's alerts from the last few minutes (voice + dedupe)
+Crime zones come from the in-memory ZoneIndex.
+"""
+from datetime import datetime, timedelta
+from django.utils import timezone
+from django.contrib.gis.geos import Point
+from apps.safety.models import Alert
+from apps.safety.track_buffer import track_buffers
+from apps.safety.zone_index import zone_index
+from apps.anomaly_detection import (
+    StoppedMovementDetector,
+    RouteDeviationDetector,
+    TimePatternDetector
+)
+
+
+class RiskEngine:
+    """
+    Combines zone, time, speed, anomaly, voice and prediction risk
+    """
+    ALERT_WINDOW = timedelta(minutes=5)
+
+    def __init__(self, predictor=None):
+        self.predictor = predictor
+
+    def load_context(self, user_profile):
+        """
+        Fetch the per-user data shared by all risk factors
+
+        Returns:
+            {
+                'track': TrackBuffer,
+                'recent_alerts': [Alert, ...]  # newest first
+            }
+        """
+        recent_alerts = list(Alert.objects.filter(
+            user_profile=user_profile,
+            status__in=['Active', 'Pending Response'],
+            triggered_at__gte=timezone.now() - self.ALERT_WINDOW
+        ).select_related('audio').order_by('-triggered_at'))
+
+        return {
+            'track': track_buffers.get(user_profile),
+            'recent_alerts': recent_alerts
+        }
+
+    @staticmethod
+    def zone_risk(latitude, longitude):
+        """
+        Risk from the nearest crime zone
+
+        Returns:
+            (zone_risk, nearest_zone, distance_m)
+        """
+        nearest_zone, distance_m = zone_index.nearest(latitude, longitude)
+
+        if nearest_zone is None:
+            # no zones defined in system
+            return 0, None, 0
+
+        # Zone risk (40% of total)
+        # Logic: Closer to high-risk zone = higher risk
+        # If within zone radius, use full zone risk
+        # If outside, decrease based on distance
+        if distance_m <= nearest_zone.radius:
+            # inside danger zone
+            zone_risk = nearest_zone.risk_level
+        else:
+            # Outside, but nearby - decrease risk with distance
+            # Max influence: 500m
+            distance_factor = max(0, 1 - (distance_m / 500))
+            zone_risk = nearest_zone.risk_level * 0.4 * distance_factor
+
+        return zone_risk, nearest_zone, distance_m
+
+    @staticmethod
+    def time_risk(hour):
+        # Night time (22:00 - 05:00) = high risk
+        if 22 <= hour or hour <= 5:
+            return 20  # 20% of total (full weight)
+        elif 18 <= hour <= 21:
+            return 10  # Evening (medium risk)
+        return 5   # Daytime (low risk)
+
+    @staticmethod
+    def speed_risk(speed):
+        # Slow movement or stopped = suspicious
+        if speed < 2:  # Walking very slowly or stopped
+            return 20  # Full weight
+        elif speed < 5:
+            return 10  # Walking slowly
+        return 0   # Normal speed, no risk
+
+    def prediction_risk(self, latitude, longitude):
+        """
+        Returns:
+            (prediction_risk, prediction_reason, prediction_data)
+        """
+        if not self.predictor:
+            return 0, "", {"enabled": False, "error": "Model not loaded"}
+
+        try:
+            now = datetime.now()
+            prediction = self.predictor.predict(latitude, longitude, now.hour, now.weekday())
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            return 0, "", {"enabled": False, "error": str(e)}
+
+        # Prediction contributes 20% to total risk
+        # Only if prediction is high enough to be relevant
+        prediction_risk = 0
+        if prediction['risk_probability'] > 0.3:
+            prediction_risk = prediction['risk_probability'] * 20
+
+        prediction_reason = ""
+        if prediction['risk_probability'] > 0.7:
+            prediction_reason = f"High threat predicted ({prediction['risk_percentage']}%)"
+        elif prediction['risk_probability'] > 0.4:
+            prediction_reason = f"Moderate threat predicted ({prediction['risk_percentage']}%)"
+
+        return prediction_risk, prediction_reason, {
+            "enabled": True,
+            "risk_probability": prediction.get('risk_probability', 0),
+            "risk_percentage": prediction.get('risk_percentage', 0),
+            "confidence": prediction.get('confidence', 'N/A')
+        }
+
+    def assess(self, user_profile, latitude, longitude, speed):
+        """
+        Score one GPS tick
+
+        Args:
+            user_profile: UserProfile or None
+            latitude, longitude: Current position
+            speed: Current speed (km/h)
+
+        Returns:
+            {
+                'total_risk': 82.5,
+                'zone_risk': 70, 'time_risk': 20, 'speed_risk': 0,
+                'anomaly_risk': 15, 'anomalies': ['...'],
+                'voice_crisis_risk': 0, 'voice_crisis_reason': '',
+                'prediction_risk': 12.4, 'prediction_reason': '...',
+                'prediction': {...},
+                'nearest_zone': Zone or None, 'distance_m': 45.0,
+                'existing_alert': Alert or None
+            }
+        """
+        zone_risk, nearest_zone, distance_m = self.zone_risk(latitude, longitude)
+        time_risk = self.time_risk(datetime.now().hour)
+        speed_risk = self.speed_risk(speed)
+
+        anomaly_risk = 0
+        anomalies = []
+        voice_crisis_risk = 0
+        voice_crisis_reason = ""
+        existing_alert = None
+
+        if user_profile:
+            context = self.load_context(user_profile)
+            track = context['track']
+
+            # Run detectors on the shared track
+            for detector_result in [
+                StoppedMovementDetector.detect(user_profile, track=track),
+                RouteDeviationDetector.detect(user_profile, track=track),
+                TimePatternDetector.detect(user_profile, track=track)
+            ]:
+                if detector_result['is_anomaly']:
+                    anomalies.append(detector_result['reason'])
+                    anomaly_risk += detector_result['risk_increase']
+
+            # Check for recent voice crisis
+            recent_voice_alert = next((
+                alert for alert in context['recent_alerts']
+                if alert.alert_source == 'Voice' and alert.status == 'Active'
+            ), None)
+
+            if recent_voice_alert:
+                voice_crisis_risk = 50
+
+                # Get keywords from audio recording.
+                if hasattr(recent_voice_alert, 'audio'):
+                    voice_crisis_reason = ", ".join(recent_voice_alert.audio.crisis_keywords_detected)
+                else:
+                    voice_crisis_reason = "Voice crisis detected."
+
+            # Any active alert in the window suppresses a new one
+            existing_alert = context['recent_alerts'][0] if context['recent_alerts'] else None
+
+        prediction_risk, prediction_reason, prediction_data = self.prediction_risk(latitude, longitude)
+
+        total_risk = zone_risk + time_risk + speed_risk + anomaly_risk + voice_crisis_risk + prediction_risk
+
+        return {
+            'total_risk': total_risk,
+            'zone_risk': zone_risk,
+            'time_risk': time_risk,
+            'speed_risk': speed_risk,
+            'anomaly_risk': anomaly_risk,
+            'anomalies': anomalies,
+            'voice_crisis_risk': voice_crisis_risk,
+            'voice_crisis_reason': voice_crisis_reason,
+            'prediction_risk': prediction_risk,
+            'prediction_reason': prediction_reason,
+            'prediction': prediction_data,
+            'nearest_zone': nearest_zone,
+            'distance_m': distance_m,
+            'existing_alert': existing_alert
+        }
+
+    @staticmethod
+    def raise_alert(user_profile, assessment, latitude, longitude):
+        """
+        Create and dispatch a Combined alert for a high-risk assessment,
+        unless the user already has one from the last few minutes
+
+        Returns:
+            The new Alert, or None
+        """
+        # Check if there's already an active alert in last 5 minutes
+        if assessment['existing_alert']:
+            return None
+
+        # Create new alert
+        from apps.alert_services import AlertService
+        from apps.admin_alert_service import AdminAlertService
+
+        total_risk = assessment['total_risk']
+        alert = Alert.objects.create(
+            user_profile=user_profile,
+            alert_level='Emergency' if total_risk > 85 else 'Warning',
+            alert_source='Combined',
+            trigger_location=Point(longitude, latitude, srid=4326),
+            risk_score=total_risk,
+            reason=(
+                f"High risk detected: Zone={assessment['zone_risk']:.1f}, "
+                f"Time={assessment['time_risk']}, Speed={assessment['speed_risk']}"
+            ),
+            status='Active'
+        )
+
+        # Send WhatsApp alerts
+        alert_service = AlertService()
+        contacts_alerted = alert_service.trigger_emergency_alert(alert)
+
+        # Handle admin logging based on alert source
+        if assessment['voice_crisis_risk'] > 0:
+            # Voice crisis detected - log immediately to admin
+            AdminAlertService.handle_voice_crisis_alert(alert)
+        else:
+            # High risk but no voice crisis - set response deadline
+            AdminAlertService.handle_high_risk_alert(alert)
+
+        print(f"🚨 Alert {alert.id} triggered, {contacts_alerted} contacts notified")
+        return alert
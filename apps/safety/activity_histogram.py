@@ -0,0 +1,140 @@
+"""
+Per-user hour-of-day activity histogram with exponential decay
+
+Replaces the week-long scan in TimePatternDetector: every fix adds one to
+its hour's weight, and all weights halve every HALF_LIFE, so recent
+habits dominate and the detector reads 24 numbers.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import LocationTracking, UserActivityHistogram
+
+
+class HourHistogram:
+    """
+    24 decayed fix counts plus the time they were decayed to
+    """
+    HALF_LIFE = 7 * 24 * 3600  # Seconds
+
+    def __init__(self, weights=None, decayed_at=0.0):
+        self.weights = np.zeros(24) if not weights else np.asarray(weights, dtype=np.float64)
+        self.decayed_at = decayed_at
+
+    def _factor(self, seconds):
+        return 0.5 ** (seconds / self.HALF_LIFE)
+
+    def add(self, timestamp, count=1.0):
+        """
+        Count fixes at a Unix timestamp (late arrivals are decayed to fit)
+        """
+        hour = int(timestamp // 3600) % 24
+        if timestamp >= self.decayed_at:
+            self.weights *= self._factor(timestamp - self.decayed_at)
+            self.decayed_at = timestamp
+            self.weights[hour] += count
+        else:
+            self.weights[hour] += count * self._factor(self.decayed_at - timestamp)
+
+    def counts(self, now=None):
+        """
+        Weights decayed to now
+
+        Returns:
+            Counter {hour: weight}
+        """
+        now = now if now is not None else timezone.now().timestamp()
+        weights = self.weights * self._factor(max(0.0, now - self.decayed_at))
+        return Counter({hour: float(w) for hour, w in enumerate(weights) if w > 0})
+
+    def to_row(self):
+        return {
+            'hour_weights': [round(float(w), 6) for w in self.weights],
+            'decayed_at': datetime.fromtimestamp(self.decayed_at, tz=dt_timezone.utc)
+        }
+
+
+def _backfill(user_profile):
+    """
+    Build a histogram from the past week of LocationTracking rows
+    (first use for users whose fixes predate the rollup)
+    """
+    histogram = HourHistogram()
+    hourly = LocationTracking.objects.filter(
+        user_profile=user_profile,
+        timestamp__gte=timezone.now() - timedelta(days=7)
+    ).annotate(
+        hour=TruncHour('timestamp')
+    ).values('hour').annotate(count=Count('id')).order_by('hour').values_list('hour', 'count')
+
+    for hour, count in hourly:
+        histogram.add(hour.timestamp(), count)
+    return histogram
+
+
+def _create_row(user_profile):
+    """
+    Backfill and insert the user's row, unless another request got there first
+
+    Returns:
+        (UserActivityHistogram, created)
+    """
+    histogram = _backfill(user_profile)
+    return UserActivityHistogram.objects.get_or_create(
+        user_profile=user_profile, defaults=histogram.to_row()
+    )
+
+
+def load_histogram(user_profile):
+    """
+    The user's persisted histogram, backfilled on first use
+
+    Returns:
+        HourHistogram
+    """
+    row = UserActivityHistogram.objects.filter(user_profile=user_profile).first()
+    if row is None:
+        row, _ = _create_row(user_profile)
+    return HourHistogram(row.hour_weights, row.decayed_at.timestamp())
+
+
+def record_fix(user_profile, timestamp):
+    """
+    Fold a saved fix into the user's persisted histogram
+
+    Args:
+        timestamp: The fix's aware datetime
+    """
+    record_fixes(user_profile, [timestamp])
+
+
+def record_fixes(user_profile, timestamps):
+    """
+    Fold a batch of saved fixes into the histogram with one read and one write
+
+    The row is locked for the read-modify-write, so concurrent ingests for
+    the same user are applied one after the other.
+
+    Args:
+        timestamps: Aware datetimes of the saved fixes
+    """
+    with transaction.atomic():
+        row = UserActivityHistogram.objects.select_for_update().filter(user_profile=user_profile).first()
+        if row is None:
+            row, created = _create_row(user_profile)
+            if created:
+                # The backfill already counts these fixes
+                return
+            # Created concurrently; wait for its writer before adding ours
+            row = UserActivityHistogram.objects.select_for_update().get(pk=row.pk)
+
+        histogram = HourHistogram(row.hour_weights, row.decayed_at.timestamp())
+        for timestamp in sorted(timestamps):
+            histogram.add(timestamp.timestamp())
+        UserActivityHistogram.objects.filter(pk=row.pk).update(**histogram.to_row())
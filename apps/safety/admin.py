@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
-from .models import CrimeZone, LocationTracking, Alert, AudioRecording, SafetyAction
+from .models import CrimeZone, LocationTracking, Alert, AudioRecording, SafetyAction, AudioAnalysisJob, UserActivityHistogram, TrajectorySegment
 
 @admin.register(CrimeZone)
 class CrimeZoneAdmin(GISModelAdmin):
@@ -36,6 +36,15 @@ class AudioRecordingAdmin(admin.ModelAdmin):
     list_display = ['alert', 'duration_seconds', 'recorded_at']
     readonly_fields = ['transcript', 'crisis_keywords_detected']
 
+# ---------------------------
+# AudioAnalysisJob
+# ---------------------------
+@admin.register(AudioAnalysisJob)
+class AudioAnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user_profile', 'status', 'crisis_detected', 'created_at', 'completed_at']
+    list_filter = ['status', 'crisis_detected']
+    readonly_fields = ['transcript', 'keywords_found', 'error']
+
 # ---------------------------
 # SafetyAction
 # ---------------------------
@@ -44,3 +53,20 @@ class SafetyActionAdmin(GISModelAdmin):
     list_display = ['user_profile', 'action_type', 'outcome', 'timestamp']
     list_filter = ['action_type', 'outcome']
     date_hierarchy = 'timestamp'
+
+# ---------------------------
+# UserActivityHistogram
+# ---------------------------
+@admin.register(UserActivityHistogram)
+class UserActivityHistogramAdmin(admin.ModelAdmin):
+    list_display = ['user_profile', 'decayed_at']
+    readonly_fields = ['hour_weights']
+
+# ---------------------------
+# TrajectorySegment
+# ---------------------------
+@admin.register(TrajectorySegment)
+class TrajectorySegmentAdmin(admin.ModelAdmin):
+    list_display = ['user_profile', 'start_time', 'end_time', 'point_count']
+    date_hierarchy = 'start_time'
+    exclude = ['data']
@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from apps.admin_alert_service import AdminAlertService
 from .models import Alert
+from .audio_services import AudioAnalyzer
 from apps.accounts.models import UserProfile
 from django.utils import timezone
 
@@ -293,5 +294,7 @@ def admin_statistics(request):
         "user_triggered_emergencies": user_emergency_count,
         "no_response_alerts": no_response_count,
         "by_status": {item['status']: item['count'] for item in status_counts},
-        "by_source": {item['alert_source']: item['count'] for item in source_counts}
+        "by_source": {item['alert_source']: item['count'] for item in source_counts},
+        # Audio kept away from Whisper by the VAD gate (this worker only)
+        "voice_activity": AudioAnalyzer.vad_stats()
     }, status=status.HTTP_200_OK)
@@ -1,6 +1,34 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SafetyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.safety'
+
+    def ready(self):
+        # Connects the signals that keep the zone index fresh
+        from . import zone_index  # noqa: F401
+
+
+def _preload_whisper():
+    try:
+        from .audio_services import AudioAnalyzer
+        AudioAnalyzer.preload()
+    except Exception as e:
+        print(f"⚠️ Whisper preload failed: {e}")
+
+
+def start_whisper_preload():
+    """
+    Load the Whisper pool off the startup path (if WHISPER_PRELOAD);
+    requests that arrive first simply wait for a pooled model
+
+    Called from eve/wsgi.py and eve/asgi.py (runserver loads the former
+    in its serving process), so tests, celery and management commands
+    never load Whisper up front.
+    """
+    if settings.WHISPER_PRELOAD:
+        threading.Thread(target=_preload_whisper, name='whisper-preload', daemon=True).start()
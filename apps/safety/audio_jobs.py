@@ -0,0 +1,170 @@
+"""
+Background audio analysis
+
+Transcription runs on a local thread pool instead of the request thread.
+Jobs are tracked in AudioAnalysisJob so any worker can answer a poll, and
+crisis alerts are raised as soon as a job completes.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .audio_services import AudioAnalyzer
+from .models import Alert, AudioAnalysisJob, AudioRecording, LocationTracking
+
+
+def create_voice_crisis_alert(user_profile, result):
+    """
+    Raise an Emergency/Voice alert for a crisis analysis result
+
+    Args:
+        user_profile: UserProfile the audio came from
+        result: AudioAnalyzer.analyze() output with crisis_detected=True
+
+    Returns:
+        Alert, or None if the user has no known location yet
+    """
+    # Get current location (last location from tracking)
+    last_location = LocationTracking.objects.filter(
+        user_profile=user_profile
+    ).order_by('-timestamp').first()
+
+    if not last_location:
+        return None
+
+    # Create emergency alert
+    alert = Alert.objects.create(
+        user_profile=user_profile,
+        alert_level='Emergency',
+        alert_source='Voice',
+        trigger_location=last_location.location,
+        risk_score=95,  # Voice crisis = very high risk
+        reason=f"Voice crisis detected: {', '.join(result['keywords_found'])}",
+        status='Active'
+    )
+
+    # Save Audio recording
+    AudioRecording.objects.create(
+        alert=alert,
+        file_path=f"audio_{alert.id}.wav",
+        duration_seconds=3,
+        transcript=result['transcript'],
+        crisis_keywords_detected=result['keywords_found'],
+    )
+
+    # LOG TO ADMIN DASHBOARD IMMEDIATELY (voice crisis)
+    from apps.admin_alert_service import AdminAlertService
+    AdminAlertService.handle_voice_crisis_alert(alert)
+
+    return alert
+
+
+class AudioJobQueue:
+    """
+    Process-local worker pool for audio analysis jobs
+    """
+    POLL_INTERVAL = 0.25  # Seconds between DB checks for jobs owned by other workers
+
+    _executor = None
+    _futures = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=settings.AUDIO_ANALYSIS_WORKERS,
+                    thread_name_prefix='audio-analysis'
+                )
+            return cls._executor
+
+    @classmethod
+    def submit(cls, audio_file, user_profile=None):
+        """
+        Queue an uploaded clip for analysis
+
+        The upload is read into memory here, since the request's file
+        handle is closed once the response is sent.
+
+        Returns:
+            AudioAnalysisJob (status Queued)
+        """
+        data = audio_file.read()
+        name = audio_file.name
+
+        job = AudioAnalysisJob.objects.create(user_profile=user_profile)
+
+        future = cls._get_executor().submit(cls._run, job.id, data, name)
+        with cls._lock:
+            cls._futures[job.id] = future
+        future.add_done_callback(lambda _: cls._futures.pop(job.id, None))
+
+        return job
+
+    @classmethod
+    def _run(cls, job_id, data, name):
+        try:
+            job = AudioAnalysisJob.objects.select_related('user_profile').get(id=job_id)
+            job.status = 'Processing'
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+
+            try:
+                result = AudioAnalyzer.analyze(ContentFile(data, name=name))
+            except Exception as e:
+                job.status = 'Failed'
+                job.error = str(e)
+                job.completed_at = timezone.now()
+                job.save(update_fields=['status', 'error', 'completed_at'])
+                return
+
+            job.transcript = result['transcript']
+            job.language = result.get('language', 'en')
+            job.crisis_detected = result['crisis_detected']
+            job.keywords_found = result['keywords_found']
+            job.confidence = result['confidence']
+
+            # Alert as soon as the transcript is in
+            if result['crisis_detected'] and job.user_profile:
+                job.alert = create_voice_crisis_alert(job.user_profile, result)
+
+            job.status = 'Completed'
+            job.completed_at = timezone.now()
+            job.save()
+        except Exception as e:
+            print(f"❌ Audio job {job_id} failed: {e}")
+            AudioAnalysisJob.objects.filter(id=job_id).update(
+                status='Failed', error=str(e), completed_at=timezone.now()
+            )
+        finally:
+            # Worker threads hold their own DB connection
+            close_old_connections()
+
+    @classmethod
+    def wait_for(cls, job_id, timeout):
+        """
+        Block until the job finishes or timeout seconds pass
+
+        Returns:
+            The (refreshed) AudioAnalysisJob
+        """
+        future = cls._futures.get(job_id)
+        if future is not None:
+            wait([future], timeout=timeout)
+        else:
+            # Queued on another worker - poll the row
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if AudioAnalysisJob.objects.filter(
+                    id=job_id, status__in=['Completed', 'Failed']
+                ).exists():
+                    break
+                time.sleep(cls.POLL_INTERVAL)
+
+        return AudioAnalysisJob.objects.get(id=job_id)
@@ -3,18 +3,27 @@ Audio Analysis service using whisper
 """
 
 import whisper
+import torch
 import os
+import queue
+import struct
+import subprocess
 import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
 from django.core.files.storage import default_storage
 from django.conf import settings
 
+from .keyword_matcher import KeywordMatcher
+
 
 class AudioAnalyzer:
     """
     Handles audio transcription and crisis detection.
     """
 
-    # crrisis keywords
+    # crrisis keywords (fallback when CRISIS_KEYWORDS_FILE is missing)
     CRISIS_KEYWORD = [
         'help',
         'stop',
@@ -33,24 +42,298 @@ class AudioAnalyzer:
         'abeg',
     ]
 
-    _model = None
+    _matcher = None
+
+    # Whisper model pool: idle models, a semaphore bounding concurrent
+    # transcriptions to the pool size, and a lock for loading
+    _models = None
+    _loaded = 0
+    _slots = None
+    _pool_lock = threading.Lock()
+
+    # Whisper's expected input: mono float32 at 16 kHz
+    SAMPLE_RATE = 16000
+
+    # Voice activity gate (energy based)
+    VAD_FRAME_MS = 30
+    VAD_MIN_SPEECH_MS = 250   # Less voiced audio than this counts as no speech
+    VAD_PADDING_MS = 200      # Kept either side of the voiced region
+    VAD_MIN_RMS = 0.005       # Absolute floor (about -46 dBFS)
+    VAD_NOISE_MARGIN = 3.0    # Voiced frames are this much louder than the noise floor
+    VAD_LOUD_RMS = 0.05       # Frames this loud (about -26 dBFS) always count as voiced
+
+    # Audio seen by / sent to Whisper in this process
+    _vad_stats = {
+        'clips': 0,
+        'clips_skipped': 0,
+        'input_seconds': 0.0,
+        'transcribed_seconds': 0.0,
+    }
+    _vad_lock = threading.Lock()
 
     @classmethod
-    def get_model(cls):
+    def _load_whisper(cls):
         """
-        Load Whisper model.
+        Load one Whisper model (size from WHISPER_MODEL_SIZE)
         """
-        if cls._model == None:
-            print("Loading Whisper model (first_time only)...")
-            cls._model = whisper.load_model('base')
-            print("✅ Whisper model loaded")
-        return cls._model
+        size = settings.WHISPER_MODEL_SIZE
+        print(f"Loading Whisper '{size}' model...")
+        model = whisper.load_model(size)
+
+        if settings.WHISPER_INT8 and model.device.type == 'cpu':
+            # Dynamic quantization only swaps exact nn.Linear modules;
+            # whisper's Linear subclass just adds dtype casting for fp16
+            for module in model.modules():
+                if isinstance(module, torch.nn.Linear):
+                    module.__class__ = torch.nn.Linear
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        print("✅ Whisper model loaded")
+        return model
+
+    @classmethod
+    def _init_pool(cls):
+        with cls._pool_lock:
+            if cls._models is None:
+                cls._models = queue.SimpleQueue()
+                cls._slots = threading.BoundedSemaphore(settings.WHISPER_POOL_SIZE)
+
+    @classmethod
+    def preload(cls):
+        """
+        Fill the model pool up front (called at worker startup)
+        """
+        cls._init_pool()
+        with cls._pool_lock:
+            while cls._loaded < settings.WHISPER_POOL_SIZE:
+                cls._models.put(cls._load_whisper())
+                cls._loaded += 1
+
+    @classmethod
+    @contextmanager
+    def borrow_model(cls):
+        """
+        Check a Whisper model out of the pool for one transcription
+
+        Blocks while WHISPER_POOL_SIZE transcriptions are already running.
+        Models not preloaded are loaded on first demand.
+        """
+        cls._init_pool()
+        with cls._slots:
+            try:
+                model = cls._models.get_nowait()
+            except queue.Empty:
+                with cls._pool_lock:
+                    try:
+                        # preload() may have finished while we waited
+                        model = cls._models.get_nowait()
+                    except queue.Empty:
+                        # A free slot with no idle model: load one more
+                        model = cls._load_whisper()
+                        cls._loaded += 1
+            try:
+                yield model
+            finally:
+                cls._models.put(model)
+
+    @classmethod
+    def get_matcher(cls):
+        """
+        Compile the crisis keyword matcher (first use only)
+        """
+        if cls._matcher is None:
+            path = getattr(settings, 'CRISIS_KEYWORDS_FILE', None)
+            if path and os.path.exists(path):
+                cls._matcher = KeywordMatcher.from_config(path)
+            else:
+                print("⚠️ CRISIS_KEYWORDS_FILE not found, using built-in keywords")
+                cls._matcher = KeywordMatcher(
+                    (keyword, 'en', 0.5) for keyword in cls.CRISIS_KEYWORD
+                )
+        return cls._matcher
+
+    @staticmethod
+    def _read_bytes(audio_file):
+        """
+        Read an UploadedFile (or anything file-like) into one bytes object
+        """
+        if hasattr(audio_file, 'seek'):
+            audio_file.seek(0)
+        return audio_file.read()
+
+    @classmethod
+    def _decode_wav(cls, data):
+        """
+        Decode 16 kHz PCM16 / float32 WAV bytes without copying the payload
+
+        Returns:
+            float32 array, or None for WAVs that need resampling or use
+            another sample format
+        """
+        view = memoryview(data)
+        pos = 12
+        fmt = None
+
+        # Walk the RIFF chunks looking for 'fmt ' and 'data'
+        while pos + 8 <= len(data):
+            chunk_id = bytes(view[pos:pos + 4])
+            chunk_size = struct.unpack_from('<I', data, pos + 4)[0]
+            body = pos + 8
+
+            if chunk_id == b'fmt ':
+                audio_format, channels, sample_rate = struct.unpack_from('<HHI', data, body)
+                bits_per_sample = struct.unpack_from('<H', data, body + 14)[0]
+                fmt = (audio_format, channels, sample_rate, bits_per_sample)
+            elif chunk_id == b'data' and fmt is not None:
+                audio_format, channels, sample_rate, bits_per_sample = fmt
+                if sample_rate != cls.SAMPLE_RATE:
+                    return None
+
+                payload = view[body:min(body + chunk_size, len(data))]
+                if audio_format == 1 and bits_per_sample == 16:
+                    samples = np.frombuffer(payload, dtype='<i2', count=len(payload) // 2)
+                    audio = samples.astype(np.float32) / 32768.0
+                elif audio_format == 3 and bits_per_sample == 32:
+                    audio = np.frombuffer(payload, dtype='<f4', count=len(payload) // 4)
+                else:
+                    return None
+
+                if channels > 1:
+                    audio = audio[:len(audio) - len(audio) % channels]
+                    audio = audio.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+                return audio
+
+            # Chunks are word-aligned
+            pos = body + chunk_size + (chunk_size & 1)
+
+        return None
+
+    @classmethod
+    def _decode_ffmpeg_pipe(cls, data):
+        """
+        Decode any container ffmpeg can stream, via stdin/stdout pipes
+
+        Returns:
+            float32 array, or None if ffmpeg can't decode it from a pipe
+            (e.g. MP4/M4A with the moov atom at the end)
+        """
+        cmd = [
+            'ffmpeg', '-nostdin', '-threads', '0',
+            '-i', 'pipe:0',
+            '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le',
+            '-ar', str(cls.SAMPLE_RATE),
+            'pipe:1'
+        ]
+        try:
+            out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        if not out:
+            return None
+        return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
+    @classmethod
+    def decode_audio(cls, data):
+        """
+        Decode audio bytes in memory to Whisper's 16 kHz float32 waveform
+
+        Args:
+            data: Raw bytes of the uploaded file
+
+        Returns:
+            float32 NumPy array, or None if it can only be decoded from disk
+        """
+        if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+            try:
+                audio = cls._decode_wav(data)
+            except struct.error:
+                audio = None
+            if audio is not None:
+                return audio
+
+        return cls._decode_ffmpeg_pipe(data)
+
+    @classmethod
+    def detect_speech(cls, audio):
+        """
+        Find the voiced region of a 16 kHz waveform
+
+        Frames are voiced when their RMS clears both VAD_MIN_RMS and the
+        clip's own noise floor (10th percentile frame RMS) times
+        VAD_NOISE_MARGIN, so steady background noise doesn't count. The
+        relative floor is capped at VAD_LOUD_RMS: a clip that is loud
+        throughout (sustained shouting) would otherwise raise its own floor
+        above itself, and must still reach the crisis check.
+
+        Returns:
+            (start, end) sample offsets including padding, or None if the
+            clip has less than VAD_MIN_SPEECH_MS of voiced audio
+        """
+        frame = cls.SAMPLE_RATE * cls.VAD_FRAME_MS // 1000
+        n_frames = len(audio) // frame
+        if n_frames == 0:
+            return None
+
+        frames = audio[:n_frames * frame].reshape(n_frames, frame)
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame)
+
+        noise_floor = float(np.percentile(rms, 10)) * cls.VAD_NOISE_MARGIN
+        threshold = max(cls.VAD_MIN_RMS, min(noise_floor, cls.VAD_LOUD_RMS))
+        voiced = np.flatnonzero(rms > threshold)
+
+        if len(voiced) * cls.VAD_FRAME_MS < cls.VAD_MIN_SPEECH_MS:
+            return None
+
+        pad = cls.VAD_PADDING_MS // cls.VAD_FRAME_MS
+        start = max(0, voiced[0] - pad) * frame
+        end = min(len(audio), (voiced[-1] + 1 + pad) * frame)
+        return int(start), int(end)
+
+    @classmethod
+    def _record_vad(cls, input_samples, transcribed_samples):
+        with cls._vad_lock:
+            cls._vad_stats['clips'] += 1
+            cls._vad_stats['clips_skipped'] += transcribed_samples == 0
+            cls._vad_stats['input_seconds'] += input_samples / cls.SAMPLE_RATE
+            cls._vad_stats['transcribed_seconds'] += transcribed_samples / cls.SAMPLE_RATE
+
+    @classmethod
+    def vad_stats(cls):
+        """
+        How much audio the VAD gate kept away from Whisper in this process
+
+        Returns:
+            {
+                'clips': 120,
+                'clips_skipped': 85,
+                'input_seconds': 600.0,
+                'transcribed_seconds': 95.5,
+                'skipped_seconds': 504.5,
+                'skipped_ratio': 0.84
+            }
+        """
+        with cls._vad_lock:
+            stats = dict(cls._vad_stats)
+
+        stats['skipped_seconds'] = round(stats['input_seconds'] - stats['transcribed_seconds'], 2)
+        stats['skipped_ratio'] = round(
+            stats['skipped_seconds'] / stats['input_seconds'], 4
+        ) if stats['input_seconds'] else 0.0
+        stats['input_seconds'] = round(stats['input_seconds'], 2)
+        stats['transcribed_seconds'] = round(stats['transcribed_seconds'], 2)
+        return stats
 
-    
     @classmethod
     def transcribe_audio(cls, audio_file):
         """
         Transcribe audio file to text.
+
+        Decodes in memory when possible; only containers ffmpeg can't read
+        from a pipe (e.g. MP4/M4A with the index at the end) go through a
+        temp file. Either way the waveform passes the voice activity gate.
         
         Args:
             audio_file: Django UploadedFile or file path
@@ -62,23 +345,68 @@ class AudioAnalyzer:
                 'confidence': 0.95
             }
         """
-        model = cls.get_model()
+        data = cls._read_bytes(audio_file)
+        audio = cls.decode_audio(data)
+
+        if audio is None:
+            # Fallback: let ffmpeg read a seekable temp file
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+                temp_file.write(data)
+                temp_file_path = temp_file.name
+            try:
+                audio = whisper.load_audio(temp_file_path, sr=cls.SAMPLE_RATE)
+            finally:
+                # Clean up temp file
+                if os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+
+        return cls.transcribe_array(audio)
+
+
+    @classmethod
+    def transcribe_array(cls, audio, **options):
+        """
+        Transcribe an already-decoded 16 kHz float32 waveform
+
+        Args:
+            audio: float32 NumPy array (or a path Whisper can decode)
+            **options: Extra whisper transcribe() options
+
+        Returns:
+            Same shape as transcribe_audio(), plus 'vad' for arrays:
+            {'speech_detected', 'input_seconds', 'transcribed_seconds'}
+        """
+        vad = None
+        if isinstance(audio, np.ndarray):
+            # Trim silence; skip Whisper entirely when there is no speech
+            speech = cls.detect_speech(audio)
+            transcribed = audio[speech[0]:speech[1]] if speech else audio[:0]
+            cls._record_vad(len(audio), len(transcribed))
+
+            vad = {
+                'speech_detected': speech is not None,
+                'input_seconds': round(len(audio) / cls.SAMPLE_RATE, 2),
+                'transcribed_seconds': round(len(transcribed) / cls.SAMPLE_RATE, 2)
+            }
+            if speech is None:
+                return {
+                    'text': '',
+                    'language': 'en',
+                    'confidence': 0.0,
+                    'vad': vad
+                }
+            audio = transcribed
 
-        # Create temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            # Write uploaded audio to temp file
-            for chunk in audio_file.chunks():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
-        
         try:
-            # Transcribe audio
-            result = model.transcribe(temp_file_path)
+            with cls.borrow_model() as model:
+                options.setdefault('fp16', model.device.type == 'cuda')
+                result = model.transcribe(audio, **options)
 
             return {
                 'text': result['text'].strip(),
                 'language': result.get('language', 'en'),
-                'confidence': result.get('confidence', 1.0)
+                'confidence': result.get('confidence', 1.0),
+                'vad': vad
             }
 
         except Exception as e:
@@ -88,26 +416,24 @@ class AudioAnalyzer:
                 'language': 'en',
                 'confidence': 0.0
             }
-        
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-
 
     @classmethod
-    def detect_crisis(cls, transcript):
+    def detect_crisis(cls, transcript, languages=None):
         """
         Detect crisis keywords in transcript.
 
         Args:
             transcript: String of transcribed text
+            languages: Optional language codes to restrict matching to
+                (default: all configured languages, since speakers mix them)
             
         Returns:
             {
                 'is_crisis': True/False,
                 'keywords_found': ['help', 'stop'],
-                'confidence': 0.95
+                'confidence': 0.95,
+                'matches': [{'keyword': 'help', 'language': 'en',
+                             'weight': 0.6, 'start': 0, 'end': 4}, ...]
             }
         """
 
@@ -115,40 +441,33 @@ class AudioAnalyzer:
             return {
                 'is_crisis': False,
                 'keywords_found': [],
-                'confidence': 0.0
+                'confidence': 0.0,
+                'matches': []
             }
         
-        transcript_lower = transcript.lower()
-
-        # Find matching keywords (use word boundaries to avoid false positives)
-        keywords_found = []
-        words = transcript_lower.split()
-
-        for keyword in cls.CRISIS_KEYWORD:
-            # Check for exact word match or phrase match
-            if ' ' in keyword:
-                # Multi-word phrase
-                if keyword in transcript_lower:
-                    keywords_found.append(keyword)
-            else:
-                # Single word - check if it's a complete word
-                if keyword in words:
-                    keywords_found.append(keyword)
-        
-        if not keywords_found:
+        matches = cls.get_matcher().find(transcript, languages)
+
+        if not matches:
             return {
                 'is_crisis': False,
                 'keywords_found': [],
-                'confidence': 0.0
+                'confidence': 0.0,
+                'matches': []
             }
+
+        # Distinct keywords in order of first appearance
+        weights = {}
+        for match in matches:
+            weights.setdefault(match['keyword'], match['weight'])
         
-        # Calculate confidence score
-        confidence = len(keywords_found) / len(cls.CRISIS_KEYWORD)
+        # Each distinct keyword is independent evidence of a crisis
+        confidence = 1.0 - float(np.prod([1.0 - w for w in weights.values()]))
         
         return {
             'is_crisis': True,
-            'keywords_found': keywords_found,
-            'confidence': confidence
+            'keywords_found': list(weights),
+            'confidence': round(confidence, 4),
+            'matches': matches
         }
     
     @classmethod
@@ -180,6 +499,7 @@ class AudioAnalyzer:
             'language': transcription['language'],
             'crisis_detected': crisis_detection['is_crisis'],
             'keywords_found': crisis_detection['keywords_found'],
-            'confidence': crisis_detection['confidence']
+            'confidence': crisis_detection['confidence'],
+            'vad': transcription.get('vad')
         }
 
@@ -0,0 +1,171 @@
+"""
+Batch location ingest
+
+Phones that were offline (or batching to save battery) upload many fixes
+in one request. The payload is decoded and validated in one pass over
+NumPy columns and written with a single bulk_create.
+"""
+import gzip
+import json
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.utils import timezone
+
+from .models import LocationTracking
+
+
+MAX_FIXES = 5000
+MAX_BODY_BYTES = 8 * 1024 * 1024  # Decompressed
+MAX_FUTURE_SKEW = timedelta(minutes=5)
+INSERT_BATCH_SIZE = 1000
+
+
+class BatchError(ValueError):
+    """
+    Payload could not be accepted; message is safe to return to the client
+    """
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def decode_body(body, content_encoding=None):
+    """
+    Decompress (gzip / deflate) and parse a JSON batch
+
+    Accepts {"fixes": [...]} or a bare list of fixes.
+
+    Returns:
+        List of fix dicts
+    """
+    encoding = (content_encoding or '').strip().lower()
+    try:
+        if encoding == 'gzip' or body[:2] == b'\x1f\x8b':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decompressor = zlib.decompressobj()
+        else:
+            decompressor = None
+
+        if decompressor is not None:
+            # Bounded, so a small body can't inflate without limit
+            body = decompressor.decompress(body, MAX_BODY_BYTES + 1)
+    except (zlib.error, gzip.BadGzipFile) as e:
+        raise BatchError(f"Could not decompress body: {e}")
+
+    if len(body) > MAX_BODY_BYTES:
+        raise BatchError(f"Batch too large (max {MAX_BODY_BYTES} bytes uncompressed)")
+
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise BatchError(f"Invalid JSON: {e}")
+
+    fixes = payload.get('fixes') if isinstance(payload, dict) else payload
+    if not isinstance(fixes, list) or not fixes:
+        raise BatchError("Expected a non-empty list of fixes")
+    if len(fixes) > MAX_FIXES:
+        raise BatchError(f"Too many fixes (max {MAX_FIXES})")
+
+    return fixes
+
+
+def _parse_timestamp(value, now):
+    if value is None:
+        return now
+    if isinstance(value, (int, float)):
+        # Epoch seconds, or milliseconds from JS clients
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def validate(fixes):
+    """
+    Validate every fix in one pass
+
+    Returns:
+        dict of columns: latitude, longitude, speed (NaN = missing),
+        battery_level (-1 = missing), timestamp (aware datetimes)
+
+    Raises:
+        BatchError listing the offending fixes
+    """
+    n = len(fixes)
+    latitude = np.full(n, np.nan)
+    longitude = np.full(n, np.nan)
+    speed = np.full(n, np.nan)
+    battery = np.full(n, -1, dtype=np.int64)
+    timestamps = [None] * n
+    errors = []
+    now = timezone.now()
+
+    for i, fix in enumerate(fixes):
+        try:
+            latitude[i] = float(fix['latitude'])
+            longitude[i] = float(fix['longitude'])
+            if fix.get('speed') is not None:
+                speed[i] = float(fix['speed'])
+            if fix.get('battery_level') is not None:
+                battery[i] = int(fix['battery_level'])
+            timestamps[i] = _parse_timestamp(fix.get('timestamp'), now)
+        except (KeyError, TypeError, ValueError, OverflowError, OSError) as e:
+            errors.append({"index": i, "error": f"Malformed fix: {e}"})
+
+    # Range checks on whole columns (NaN fails them, so malformed rows are caught too)
+    bad = ~((latitude >= -90) & (latitude <= 90))
+    bad |= ~((longitude >= -180) & (longitude <= 180))
+    bad |= speed < 0
+    bad |= (battery != -1) & ((battery < 0) | (battery > 100))
+
+    reported = {e['index'] for e in errors}
+    for i in np.flatnonzero(bad):
+        if i not in reported:
+            errors.append({"index": int(i), "error": "Latitude, longitude, speed or battery_level out of range"})
+
+    latest_allowed = now + MAX_FUTURE_SKEW
+    for i, ts in enumerate(timestamps):
+        if ts is not None and ts > latest_allowed:
+            errors.append({"index": i, "error": "Timestamp is in the future"})
+
+    if errors:
+        errors.sort(key=lambda e: e['index'])
+        raise BatchError(f"{len(errors)} invalid fixes", errors[:50])
+
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'speed': speed,
+        'battery_level': battery,
+        'timestamp': timestamps
+    }
+
+
+def ingest(user_profile, columns):
+    """
+    Insert validated fixes, oldest first
+
+    Returns:
+        List of saved LocationTracking rows (with ids), oldest first
+    """
+    order = sorted(range(len(columns['timestamp'])), key=columns['timestamp'].__getitem__)
+
+    rows = [
+        LocationTracking(
+            user_profile=user_profile,
+            location=Point(float(columns['longitude'][i]), float(columns['latitude'][i]), srid=4326),
+            timestamp=columns['timestamp'][i],
+            speed=None if np.isnan(columns['speed'][i]) else float(columns['speed'][i]),
+            battery_level=None if columns['battery_level'][i] < 0 else int(columns['battery_level'][i])
+        )
+        for i in order
+    ]
+
+    return LocationTracking.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
@@ -0,0 +1,122 @@
+"""
+Heatmap result cache
+
+Heatmaps are cached per snapped centre cell, model version and weekday in
+the 'heatmap' cache (LRU-evicted local memory, see settings.CACHES).
+Entries are invalidated by:
+- a model reload (ThreatPredictor.model_version changes)
+- new incidents nearby (a generation token of a covered area changes)
+"""
+import math
+import uuid
+
+from django.core.cache import caches
+
+
+# Centres closer than this (~55m) share a heatmap
+SNAP_DEGREES = 0.0005
+
+# Invalidation areas (~1.1km squares)
+AREA_DEGREES = 0.01
+
+# Incidents this far outside the grid still change its location risk (150m)
+MARGIN_DEGREES = 0.0015
+
+
+def _cache():
+    return caches['heatmap']
+
+
+def snap(value):
+    """
+    Snap a coordinate to the centre-cell grid
+    """
+    return round(round(value / SNAP_DEGREES) * SNAP_DEGREES, 6)
+
+
+def _area(lat, lon):
+    return math.floor(lat / AREA_DEGREES), math.floor(lon / AREA_DEGREES)
+
+
+def _area_key(area_lat, area_lon):
+    return f"heatmap:gen:{area_lat}:{area_lon}"
+
+
+def _generations(keys):
+    """
+    Current generation tokens for keys, created on first use.
+
+    Tokens are random rather than counters so an evicted token can never
+    make an old entry valid again.
+    """
+    cache = _cache()
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            tokens[key] = cache.get(key)
+    return [tokens[key] for key in keys]
+
+
+def cache_key(lat, lon, model_version, day_of_week, radius_degrees=0.005, variant=''):
+    """
+    Key for a heatmap centred on an already-snapped (lat, lon)
+
+    Includes the generation of every area the grid (plus the location-risk
+    margin) overlaps, so an incident anywhere in reach invalidates it.
+    """
+    reach = radius_degrees + MARGIN_DEGREES
+    lat0, lon0 = _area(lat - reach, lon - reach)
+    lat1, lon1 = _area(lat + reach, lon + reach)
+
+    keys = ["heatmap:gen:all"] + [
+        _area_key(area_lat, area_lon)
+        for area_lat in range(lat0, lat1 + 1)
+        for area_lon in range(lon0, lon1 + 1)
+    ]
+    generation = ".".join(_generations(keys))
+
+    return (
+        f"heatmap:{model_version}:{day_of_week}:{lat:.6f}:{lon:.6f}:"
+        f"{radius_degrees:.6f}:{variant}:{generation}"
+    )
+
+
+def get_or_compute(lat, lon, model_version, day_of_week, compute, radius_degrees=0.005, variant=''):
+    """
+    Return the cached heatmap, or compute() and cache it
+
+    Args:
+        lat, lon: Snapped centre
+        model_version: ThreatPredictor.model_version
+        day_of_week: 0-6
+        compute: Zero-argument callable producing the heatmap
+        radius_degrees: Grid radius, for the invalidation areas
+        variant: Extra key component for other heatmap parameters
+
+    Returns:
+        (heatmap, cache_hit)
+    """
+    cache = _cache()
+    key = cache_key(lat, lon, model_version, day_of_week, radius_degrees, variant)
+
+    heatmap = cache.get(key)
+    if heatmap is not None:
+        return heatmap, True
+
+    heatmap = compute()
+    cache.set(key, heatmap)
+    return heatmap, False
+
+
+def invalidate_area(lat, lon):
+    """
+    Invalidate heatmaps that can see an incident at (lat, lon).
+
+    Called with (None, None) to invalidate everything.
+    """
+    if lat is None or lon is None:
+        key = "heatmap:gen:all"
+    else:
+        key = _area_key(*_area(lat, lon))
+    _cache().set(key, uuid.uuid4().hex, timeout=None)
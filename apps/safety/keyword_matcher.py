@@ -0,0 +1,150 @@
+"""
+Compiled crisis keyword matcher
+
+A word-level Aho-Corasick automaton over every configured phrase, across
+all languages. A transcript is tokenised once and walked once, so the
+cost is linear in the transcript length (plus matches) no matter how many
+phrases are configured.
+
+Tokens are case- and accent-folded, so 'Olè', 'ole' and 'OLE' all match
+the Yoruba phrase 'olè', and quoted words match like bare ones.
+"""
+import json
+import re
+import unicodedata
+
+# Words with combining marks (Yoruba tone marks) and inner apostrophes
+# ("don't"); quote marks around a word are not part of it
+WORD = r"[\w\u0300-\u036f]+"
+TOKEN_RE = re.compile(rf"{WORD}(?:'{WORD})*")
+
+
+def fold(word):
+    """
+    Lowercase and strip diacritics from a token
+    """
+    decomposed = unicodedata.normalize('NFKD', word.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """
+    Split text into folded tokens
+
+    Returns:
+        List of (folded_word, start, end) with character offsets into text
+    """
+    return [(fold(m.group()), m.start(), m.end()) for m in TOKEN_RE.finditer(text)]
+
+
+class KeywordMatcher:
+    """
+    Multi-pattern phrase matcher with per-language keyword sets
+    """
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords: Iterable of (phrase, language, weight)
+        """
+        # Trie over folded words; node 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self.patterns = []  # (phrase, language, weight, n_words)
+
+        for phrase, language, weight in keywords:
+            words = [word for word, _, _ in tokenize(phrase)]
+            if not words:
+                continue
+
+            node = 0
+            for word in words:
+                nxt = self._goto[node].get(word)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][word] = nxt
+                node = nxt
+
+            self._out[node].append(len(self.patterns))
+            self.patterns.append((phrase, language, float(weight), len(words)))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        # Breadth-first, so a node's failure target is always finished first
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for word, child in self._goto[node].items():
+                queue.append(child)
+
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[child] = target if target != child else 0
+
+                # Inherit matches that end at the failure target
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    @classmethod
+    def from_config(cls, path):
+        """
+        Build a matcher from a JSON file of the form
+        {"en": {"help": 0.6, "let me go": 0.8}, "yo": {"olè": 0.7}}
+        """
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+
+        return cls(
+            (phrase, language, weight)
+            for language, phrases in config.items()
+            for phrase, weight in phrases.items()
+        )
+
+    @property
+    def languages(self):
+        return sorted({language for _, language, _, _ in self.patterns})
+
+    def find(self, text, languages=None):
+        """
+        Find every configured phrase in text, in one pass
+
+        Args:
+            text: Transcript
+            languages: Optional collection of language codes to keep
+
+        Returns:
+            List of matches ordered by position:
+            [{'keyword', 'language', 'weight', 'start', 'end'}]
+            where start/end are character offsets into text
+        """
+        tokens = tokenize(text)
+        matches = []
+        node = 0
+
+        for i, (word, _, end) in enumerate(tokens):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+
+            for pattern_id in self._out[node]:
+                phrase, language, weight, n_words = self.patterns[pattern_id]
+                if languages is not None and language not in languages:
+                    continue
+                matches.append({
+                    'keyword': phrase,
+                    'language': language,
+                    'weight': weight,
+                    'start': tokens[i - n_words + 1][1],
+                    'end': end
+                })
+
+        matches.sort(key=lambda m: (m['start'], m['end']))
+        return matches
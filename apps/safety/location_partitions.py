@@ -0,0 +1,186 @@
+"""
+Monthly range partitioning of LocationTracking on timestamp (PostgreSQL)
+
+Django has no notion of partitioned tables, so the parent table keeps the
+model's name and columns; partitions are plain child tables named
+<table>_pYYYYMM. The parent's primary key is (id, timestamp), as
+PostgreSQL requires the partition key in unique constraints, so the
+legacy table's own key is widened to match before it is attached. Django
+creates `id` as an IDENTITY column, which LIKE does not copy (and which
+partitioned tables only support from PostgreSQL 17), so conversion moves
+id generation to a plain sequence owned by the parent, continuing past
+the legacy table's highest id.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+from apps.accounts.models import UserProfile
+from .models import LocationTracking
+
+
+TABLE = LocationTracking._meta.db_table
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def convert_to_partitioned(first_month):
+    """
+    Turn the plain table into a partitioned one (one-off)
+
+    Existing rows stay where they are: the old table is attached as the
+    partition for everything before first_month, so first_month must be
+    later than any existing fix.
+    """
+    legacy = f"{TABLE}_legacy"
+    sequence = f"{TABLE}_id_seq"
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {qn(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {qn(TABLE)}")
+        max_id = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+            [TABLE]
+        )
+        is_identity = cursor.fetchone()[0] != ''
+
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(legacy)}")
+        if is_identity:
+            # Drops the identity's sequence too, freeing its name; a
+            # partition can't carry an identity its parent lacks
+            cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY")
+
+        # Django's PRIMARY KEY (id) would clash with the parent's key when
+        # attaching; give the legacy table the parent's key instead, which
+        # ATTACH then adopts as its partition of the parent's index
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [legacy]
+        )
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(constraint)}")
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ADD PRIMARY KEY (id, timestamp)")
+        cursor.execute(
+            f"CREATE TABLE {qn(TABLE)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+        if is_identity:
+            cursor.execute(f"CREATE SEQUENCE {qn(sequence)} START WITH {int(max_id) + 1}")
+            cursor.execute(f"ALTER TABLE {qn(TABLE)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)", [sequence])
+            cursor.execute(f"ALTER SEQUENCE {qn(sequence)} OWNED BY {qn(TABLE)}.id")
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} ADD PRIMARY KEY (id, timestamp)")
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ADD FOREIGN KEY (user_profile_id) "
+            f"REFERENCES {qn(UserProfile._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(
+            f"CREATE INDEX {qn(TABLE + '_user_recent')} ON {qn(TABLE)} (user_profile_id, timestamp DESC)"
+        )
+        cursor.execute(f"CREATE INDEX {qn(TABLE + '_location')} ON {qn(TABLE)} USING GIST (location)")
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(legacy)} "
+            f"FOR VALUES FROM (MINVALUE) TO (%s)",
+            [first_month]
+        )
+
+
+def list_partitions():
+    """
+    Returns:
+        [(name, bound_expression)] for each attached partition
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+        """, [TABLE])
+        return cursor.fetchall()
+
+
+def _legacy_upper_bound(partitions):
+    """
+    First month not covered by the legacy partition, if there is one
+    """
+    for name, bound in partitions:
+        if name == f"{TABLE}_legacy":
+            match = re.search(r"TO \('(\d{4})-(\d{2})-01", bound)
+            if match:
+                return date(int(match.group(1)), int(match.group(2)), 1)
+    return None
+
+
+def ensure_partitions(start, months_ahead):
+    """
+    Create monthly partitions from start's month through months_ahead
+    months later (existing ones are left alone)
+
+    Returns:
+        Names of partitions created
+    """
+    partitions = list_partitions()
+    existing = {name for name, _ in partitions}
+    legacy_end = _legacy_upper_bound(partitions)
+    qn = connection.ops.quote_name
+    created = []
+
+    month = month_start(start)
+    for _ in range(months_ahead + 1):
+        name = partition_name(month)
+        if name not in existing and (legacy_end is None or month >= legacy_end):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} FOR VALUES FROM (%s) TO (%s)",
+                    [month, add_months(month, 1)]
+                )
+            created.append(name)
+        month = add_months(month, 1)
+
+    return created
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drop monthly partitions whose whole range ends on or before cutoff
+
+    Returns:
+        Names of partitions dropped
+    """
+    qn = connection.ops.quote_name
+    dropped = []
+
+    for name, _ in list_partitions():
+        suffix = name[len(TABLE) + 2:]
+        if not name.startswith(f"{TABLE}_p") or not suffix.isdigit():
+            continue  # The legacy catch-all partition
+        month = date(int(suffix[:4]), int(suffix[4:]), 1)
+        if add_months(month, 1) <= cutoff:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            dropped.append(name)
+
+    return dropped
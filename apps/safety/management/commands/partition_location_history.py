@@ -0,0 +1,46 @@
+"""
+Management command to maintain monthly LocationTracking partitions
+Run once with --convert, then from cron (e.g. daily) to pre-create partitions
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.safety import location_partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly partitions for location history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='One-off: convert the existing table into a partitioned table'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=2,
+            help='How many future months to pre-create (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        this_month = location_partitions.month_start(timezone.now().date())
+
+        if not location_partitions.is_partitioned():
+            if not options['convert']:
+                raise CommandError(
+                    f'{location_partitions.TABLE} is not partitioned yet; run with --convert first'
+                )
+            self.stdout.write('Converting location history to a partitioned table...')
+            # This month's fixes stay in the legacy partition
+            location_partitions.convert_to_partitioned(location_partitions.add_months(this_month, 1))
+            self.stdout.write(self.style.SUCCESS('✅ Converted (existing rows kept in the legacy partition)'))
+
+        created = location_partitions.ensure_partitions(this_month, options['months_ahead'])
+
+        for name in created:
+            self.stdout.write(f'  + {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(created)} partition(s) created, {len(location_partitions.list_partitions())} in total'
+        ))
@@ -0,0 +1,119 @@
+"""
+Management command to apply location history retention
+Run nightly: downsamples old fixes, compacts them into trajectory
+segments and drops history beyond the horizon
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.safety import location_partitions, trajectory
+from apps.safety.models import LocationTracking, TrajectorySegment
+
+
+class Command(BaseCommand):
+    help = 'Downsample location history to one fix per minute after a few days and drop it after the horizon'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookback-days',
+            type=int,
+            default=3,
+            help='Days before the raw-retention cutoff to downsample (default: 3, covers missed runs)'
+        )
+        parser.add_argument(
+            '--no-compact',
+            action='store_true',
+            help='Keep downsampled fixes as rows instead of compacting them into segments'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be removed without deleting'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        raw_cutoff = now - timedelta(days=settings.LOCATION_RAW_RETENTION_DAYS)
+        horizon = now - timedelta(days=settings.LOCATION_HISTORY_HORIZON_DAYS)
+        dry_run = options['dry_run']
+
+        # 1. Downsample, one day at a time to keep transactions short
+        # and compact what is left into trajectory segments
+        compact = not options['no_compact'] and not dry_run
+        day_end = raw_cutoff
+        total_downsampled = 0
+        total_compacted = 0
+        total_segments = 0
+        for _ in range(options['lookback_days']):
+            day_start = max(day_end - timedelta(days=1), horizon)
+            if day_start >= day_end:
+                break
+            removed = self.downsample(day_start, day_end, dry_run)
+            total_downsampled += removed
+            if compact:
+                with transaction.atomic():
+                    compacted, segments = trajectory.compact(day_start, day_end)
+                total_compacted += compacted
+                total_segments += segments
+            day_end = day_start
+
+        self.stdout.write(f'Downsampled: {total_downsampled} fix(es) removed before {raw_cutoff:%Y-%m-%d %H:%M}')
+        if compact:
+            self.stdout.write(f'Compacted: {total_compacted} fix(es) into {total_segments} segment(s)')
+
+        # 2. Drop beyond the horizon - whole partitions where possible
+        dropped = []
+        if not dry_run and location_partitions.is_partitioned():
+            dropped = location_partitions.drop_partitions_before(horizon.date())
+        for name in dropped:
+            self.stdout.write(f'  - dropped partition {name}')
+
+        expired = LocationTracking.objects.filter(timestamp__lt=horizon)
+        if dry_run:
+            expired_count = expired.count()
+        else:
+            expired_count, _ = expired.delete()
+        self.stdout.write(f'Expired: {expired_count} fix(es) older than {horizon:%Y-%m-%d}')
+
+        expired_segments = TrajectorySegment.objects.filter(end_time__lt=horizon)
+        if dry_run:
+            segment_count = expired_segments.count()
+        else:
+            segment_count, _ = expired_segments.delete()
+        self.stdout.write(f'Expired: {segment_count} trajectory segment(s)')
+
+        self.stdout.write(self.style.SUCCESS('✅ Location history retention applied'))
+
+    def downsample(self, start, end, dry_run):
+        """
+        Keep the first fix per user per minute in [start, end)
+
+        Returns:
+            Number of fixes removed (or that would be)
+        """
+        table = connection.ops.quote_name(LocationTracking._meta.db_table)
+        ranked = f"""
+            SELECT id, row_number() OVER (
+                PARTITION BY user_profile_id, date_trunc('minute', timestamp)
+                ORDER BY timestamp, id
+            ) AS rank
+            FROM {table}
+            WHERE timestamp >= %s AND timestamp < %s
+        """
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if dry_run:
+                cursor.execute(f"SELECT count(*) FROM ({ranked}) r WHERE r.rank > 1", [start, end])
+                return cursor.fetchone()[0]
+
+            cursor.execute(f"""
+                DELETE FROM {table} t
+                USING ({ranked}) r
+                WHERE t.id = r.id AND r.rank > 1
+                  AND t.timestamp >= %s AND t.timestamp < %s
+            """, [start, end, start, end])
+            return cursor.rowcount
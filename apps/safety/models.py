@@ -3,6 +3,7 @@ from django.contrib.gis.db import models as gis_models
 from django.utils import timezone
 from apps.accounts.models import UserProfile
 from django.db import models
+import uuid
 
 class CrimeZone(models.Model):
     name = models.CharField(max_length=200)
@@ -18,13 +19,20 @@ class CrimeZone(models.Model):
 class LocationTracking(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='locations')
     location = gis_models.PointField(geography=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Defaults to arrival time; batch uploads keep the phone's fix time
+    timestamp = models.DateTimeField(default=timezone.now)
     speed = models.FloatField(null=True, blank=True)
     battery_level = models.IntegerField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user_profile.user.email} @ {self.timestamp.isoformat()}"
 
+    class Meta:
+        indexes = [
+            # Detectors and the track buffer read a user's latest fixes
+            models.Index(fields=['user_profile', '-timestamp'], name='loc_user_recent_idx'),
+        ]
+
 class Alert(models.Model):
     ALERT_LEVELS = [('Warning','Warning'), ('Emergency','Emergency')]
     ALERT_SOURCES = [('Location','Location'), ('Voice','Voice'), ('Prediction','Prediction'), ('Manual','Manual'), ('Combined','Combined')]
@@ -61,6 +69,26 @@ class AudioRecording(models.Model):
     def __str__(self):
         return f"Audio for Alert {self.alert.id}"
 
+class AudioAnalysisJob(models.Model):
+    STATUS_CHOICES = [('Queued','Queued'), ('Processing','Processing'), ('Completed','Completed'), ('Failed','Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='audio_jobs', null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Queued')
+    transcript = models.TextField(blank=True, null=True)
+    language = models.CharField(max_length=10, blank=True, null=True)
+    crisis_detected = models.BooleanField(default=False)
+    keywords_found = models.JSONField(default=list)
+    confidence = models.FloatField(default=0.0)
+    alert = models.ForeignKey(Alert, on_delete=models.SET_NULL, related_name='audio_jobs', null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Audio job {self.id} - {self.status}"
+
 class SafetyAction(models.Model):
     ACTION_TYPES = [
         ('Fake Call','Fake Call'), ('Panic Button','Panic Button'),
@@ -78,3 +106,37 @@ class SafetyAction(models.Model):
 
     def __str__(self):
         return f"{self.action_type} - {self.user_profile.user.username}"
+
+class UserActivityHistogram(models.Model):
+    """
+    Decaying count of location fixes per hour of day (UTC) for one user.
+    Maintained on ingest by apps/safety/activity_histogram.py.
+    """
+    user_profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, related_name='activity_histogram')
+    hour_weights = models.JSONField(default=list, help_text="24 decayed fix counts, index = hour")
+    decayed_at = models.DateTimeField(help_text="Time the weights were last decayed to")
+
+    def __str__(self):
+        return f"Activity histogram - {self.user_profile}"
+
+class TrajectorySegment(models.Model):
+    """
+    One user's fixes for one time window, delta-encoded and compressed.
+    Written by the retention job; read with apps/safety/trajectory.py.
+    """
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='trajectory_segments')
+    start_time = models.DateTimeField(help_text="Start of the window")
+    end_time = models.DateTimeField(help_text="Time of the last fix")
+    point_count = models.IntegerField()
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.user_profile} {self.start_time.isoformat()} ({self.point_count} fixes)"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_profile', 'start_time'], name='trajectory_user_window_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user_profile', '-start_time'], name='trajectory_user_recent_idx'),
+        ]
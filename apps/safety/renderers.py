@@ -0,0 +1,84 @@
+"""
+Compact heatmap encodings, negotiated via the Accept header
+
+Both renderers take the grid dict produced by
+ThreatPredictor.predict_24h_risk:
+    {'latitudes': (N,), 'longitudes': (M,), 'day_of_week': d,
+     'risk': (24, N, M) array indexed [hour, lat, lon]}
+"""
+import json
+import struct
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class HeatmapColumnarRenderer(JSONRenderer):
+    """
+    Accept: application/vnd.eve.heatmap+json
+
+    Axes listed once plus a nested [hour][lat][lon] risk array:
+    {
+        "latitudes": [...],
+        "longitudes": [...],
+        "hours": [0, ..., 23],
+        "day_of_week": 4,
+        "risk": [[[0.231, ...], ...], ...]
+    }
+    """
+    media_type = 'application/vnd.eve.heatmap+json'
+    format = 'heatmap-json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'risk' in data:
+            risk = np.asarray(data['risk'], dtype=np.float64)
+            data = {
+                **{k: v for k, v in data.items() if k not in ('latitudes', 'longitudes', 'risk', 'evaluated')},
+                'latitudes': np.round(data['latitudes'], 6).tolist(),
+                'longitudes': np.round(data['longitudes'], 6).tolist(),
+                'hours': list(range(risk.shape[0])),
+                'day_of_week': int(data['day_of_week']),
+                'risk': np.round(risk, 3).tolist(),
+            }
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class HeatmapBinaryRenderer(BaseRenderer):
+    """
+    Accept: application/vnd.eve.heatmap+binary
+
+    Little-endian layout:
+        4s   magic b'EVHM'
+        B    format version (1)
+        B    day_of_week
+        H    hours
+        H    n_lat
+        H    n_lon
+        f8 * n_lat   latitudes
+        f8 * n_lon   longitudes
+        f2 * (hours * n_lat * n_lon)   risk, [hour][lat][lon] order
+
+    Non-grid payloads (errors) are sent as UTF-8 JSON.
+    """
+    media_type = 'application/vnd.eve.heatmap+binary'
+    format = 'heatmap-bin'
+    charset = None
+    render_style = 'binary'
+
+    MAGIC = b'EVHM'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBBHHH')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not (isinstance(data, dict) and 'risk' in data):
+            return json.dumps(data).encode('utf-8')
+
+        latitudes = np.asarray(data['latitudes'], dtype='<f8')
+        longitudes = np.asarray(data['longitudes'], dtype='<f8')
+        risk = np.asarray(data['risk'], dtype='<f2')
+
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, int(data['day_of_week']),
+            risk.shape[0], len(latitudes), len(longitudes)
+        )
+        return b''.join([header, latitudes.tobytes(), longitudes.tobytes(), risk.tobytes()])
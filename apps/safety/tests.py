@@ -1,3 +1,335 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.accounts.models import User, UserProfile
+from apps.risk_engine import RiskEngine
+from .models import CrimeZone, LocationTracking
+from .audio_services import AudioAnalyzer
+from .keyword_matcher import KeywordMatcher
+from .activity_histogram import HourHistogram, load_histogram, record_fix
+from .track_buffer import TrackBuffer, track_buffers
+from .voice_stream import VoiceStreamSession
+from . import location_partitions, trajectory
+from .zone_index import zone_index
+
+
+class RiskEngineQueryCountTests(TestCase):
+    """
+    calculate_risk runs on every GPS tick, so its query count must not
+    grow with the number of detectors or the size of the track.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email='tracker@example.com', password='pass', first_name='T', last_name='U'
+        )
+        self.profile = UserProfile.objects.create(user=user, phone='0800000000')
+        CrimeZone.objects.create(
+            name='Generator House', location=Point(7.3567, 5.1251, srid=4326),
+            risk_level=70, radius=100
+        )
+        zone_index.load()
+        track_buffers._buffers.clear()
+
+    def add_track(self, n):
+        LocationTracking.objects.bulk_create([
+            LocationTracking(
+                user_profile=self.profile,
+                location=Point(7.3567, 5.1251, srid=4326),
+                speed=10.0
+            )
+            for _ in range(n)
+        ])
+
+    def test_assess_uses_constant_queries(self):
+        self.add_track(30)
+        engine = RiskEngine(predictor=None)
+
+        # Ingest keeps the histogram row; the first tick then warms the track
+        # buffer: recent alerts + last fixes + compacted segments + histogram
+        load_histogram(self.profile)
+        with self.assertNumQueries(4):
+            result = engine.assess(self.profile, 5.1251, 7.3567, 10.0)
+
+        self.assertEqual(result['nearest_zone'].name, 'Generator House')
+        self.assertEqual(result['zone_risk'], 70)
+
+        # Later ticks: recent alerts + catch-up on new fixes
+        self.add_track(200)
+        with self.assertNumQueries(2):
+            engine.assess(self.profile, 5.1251, 7.3567, 10.0)
+        with self.assertNumQueries(2):
+            engine.assess(self.profile, 5.1251, 7.3567, 10.0)
+
+    def test_zone_lookup_needs_no_queries(self):
+        with self.assertNumQueries(0):
+            zone, distance_m = zone_index.nearest(5.1260, 7.3567)
+
+        self.assertEqual(zone.name, 'Generator House')
+        self.assertAlmostEqual(distance_m, 100, delta=2)
+
+
+class TrackBufferTests(TestCase):
+
+    def test_centroid_and_hours_follow_the_window(self):
+        buffer = TrackBuffer()
+        start = 1_700_000_000  # 22:13 UTC
+
+        for i in range(TrackBuffer.CAPACITY + 20):
+            buffer.append(start + i * 60, 5.0 + i * 1e-4, 7.0, 3.0, location_id=i + 1)
+
+        self.assertEqual(len(buffer), TrackBuffer.CAPACITY)
+        kept = 5.0 + 1e-4 * (20 + (TrackBuffer.CAPACITY - 1) / 2)
+        self.assertAlmostEqual(buffer.centroid()[0], kept, places=9)
+
+        timestamps, latitudes, _, _ = buffer.recent(3)
+        self.assertEqual(timestamps[0], start + (TrackBuffer.CAPACITY + 19) * 60)
+        self.assertGreater(latitudes[0], latitudes[1])
+
+        # Every fix is counted by hour, not just the buffered ones
+        counts = buffer.hour_counts(now=start + 3 * 3600)
+        self.assertAlmostEqual(sum(counts.values()), TrackBuffer.CAPACITY + 20, delta=1)
+
+        # ...and the weights halve every half-life
+        later = buffer.hour_counts(now=start + 3 * 3600 + HourHistogram.HALF_LIFE)
+        self.assertAlmostEqual(sum(later.values()), sum(counts.values()) / 2, places=6)
+
+    def test_duplicate_rows_are_ignored(self):
+        buffer = TrackBuffer()
+        buffer.append(1_700_000_000, 5.0, 7.0, 3.0, location_id=1)
+        buffer.append(1_700_000_000, 5.0, 7.0, 3.0, location_id=1)
+        self.assertEqual(len(buffer), 1)
+
+    def test_back_dated_fix_is_kept_in_time_order(self):
+        buffer = TrackBuffer()
+        start = 1_700_000_000
+        buffer.append(start, 5.0, 7.0, 3.0, location_id=1)
+        buffer.append(start + 120, 5.2, 7.0, 3.0, location_id=2)
+        # Batch upload of a fix taken in between
+        buffer.append(start + 60, 5.1, 7.0, 3.0, location_id=3)
+
+        timestamps, latitudes, _, _ = buffer.recent()
+        self.assertEqual(timestamps.tolist(), [start + 120, start + 60, start])
+        self.assertEqual(buffer.latest(), (5.2, 7.0))
+        self.assertAlmostEqual(buffer.centroid()[0], 5.1, places=9)
+
+    def test_catch_up_reads_late_commits(self):
+        user = User.objects.create_user(
+            email='late@example.com', password='pass', first_name='L', last_name='C'
+        )
+        profile = UserProfile.objects.create(user=user, phone='0800000002')
+        track_buffers._buffers.clear()
+        now = timezone.now()
+        LocationTracking.objects.create(user_profile=profile, location=Point(7.0, 5.0, srid=4326), timestamp=now)
+        buffer = track_buffers.get(profile)
+
+        # Another worker commits a fix stamped before the buffer's newest
+        LocationTracking.objects.create(
+            user_profile=profile, location=Point(7.0, 5.1, srid=4326), timestamp=now - timedelta(seconds=30)
+        )
+        buffer = track_buffers.get(profile)
+        _, latitudes, _, _ = buffer.recent()
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(latitudes.tolist(), [5.0, 5.1])
+
+        # Re-reading the overlap window adds nothing twice
+        self.assertEqual(len(track_buffers.get(profile)), 2)
+
+
+class ActivityHistogramTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email='walker@example.com', password='pass', first_name='W', last_name='K'
+        )
+        self.profile = UserProfile.objects.create(user=user, phone='0800000001')
+
+    def test_backfill_then_incremental_updates(self):
+        fix = LocationTracking.objects.create(
+            user_profile=self.profile, location=Point(7.35, 5.12, srid=4326), speed=4.0
+        )
+        # No rollup yet: built from the fix already saved
+        record_fix(self.profile, fix.timestamp)
+        self.assertAlmostEqual(sum(load_histogram(self.profile).counts().values()), 1, places=3)
+
+        fix = LocationTracking.objects.create(
+            user_profile=self.profile, location=Point(7.35, 5.12, srid=4326), speed=4.0
+        )
+        record_fix(self.profile, fix.timestamp)
+
+        counts = load_histogram(self.profile).counts()
+        self.assertAlmostEqual(counts[fix.timestamp.hour], 2, places=3)
+
+        # Reading is a single-row lookup
+        with self.assertNumQueries(1):
+            load_histogram(self.profile)
+
+
+class LocationPartitionTests(TestCase):
+
+    def test_orm_inserts_after_conversion(self):
+        user = User.objects.create_user(
+            email='partition@example.com', password='pass', first_name='P', last_name='T'
+        )
+        profile = UserProfile.objects.create(user=user, phone='0800000001')
+        old = LocationTracking.objects.create(user_profile=profile, location=Point(7.0, 5.0, srid=4326))
+
+        this_month = location_partitions.month_start(timezone.now().date())
+        location_partitions.convert_to_partitioned(location_partitions.add_months(this_month, 1))
+        location_partitions.ensure_partitions(this_month, 2)
+        self.assertTrue(location_partitions.is_partitioned())
+
+        # Legacy partition and a new monthly partition
+        now_fix = LocationTracking.objects.create(user_profile=profile, location=Point(7.0, 5.0, srid=4326))
+        later_fix = LocationTracking.objects.create(
+            user_profile=profile, location=Point(7.0, 5.0, srid=4326),
+            timestamp=timezone.now() + timedelta(days=40)
+        )
+        self.assertGreater(now_fix.id, old.id)
+        self.assertGreater(later_fix.id, now_fix.id)
+        self.assertEqual(LocationTracking.objects.filter(user_profile=profile).count(), 3)
+
+
+class VoiceActivityTests(SimpleTestCase):
+
+    def tone(self, seconds, amplitude):
+        t = np.arange(int(seconds * AudioAnalyzer.SAMPLE_RATE)) / AudioAnalyzer.SAMPLE_RATE
+        return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    def test_sustained_loud_clip_passes(self):
+        rng = np.random.default_rng(0)
+        loud = self.tone(3, 0.3)
+        self.assertEqual(AudioAnalyzer.detect_speech(loud), (0, len(loud)))
+
+        noisy = loud + rng.normal(0, 0.02, len(loud)).astype(np.float32)
+        self.assertIsNotNone(AudioAnalyzer.detect_speech(noisy))
+
+    def test_steady_quiet_noise_is_skipped(self):
+        rng = np.random.default_rng(0)
+        noise = rng.normal(0, 0.01, 3 * AudioAnalyzer.SAMPLE_RATE).astype(np.float32)
+        self.assertIsNone(AudioAnalyzer.detect_speech(noise))
+
+        # A burst of speech-level audio over the same noise is found
+        burst = noise.copy()
+        burst[16000:24000] += self.tone(0.5, 0.2)
+        start, end = AudioAnalyzer.detect_speech(burst)
+        self.assertLessEqual(start, 16000)
+        self.assertGreaterEqual(end, 24000)
+        self.assertLess(end - start, len(burst))
+
+    def test_file_fallback_is_gated(self):
+        # e.g. an M4A with its index at the end, which ffmpeg can't pipe
+        rng = np.random.default_rng(0)
+        noise = rng.normal(0, 0.01, 3 * AudioAnalyzer.SAMPLE_RATE).astype(np.float32)
+        before = AudioAnalyzer.vad_stats()
+
+        with mock.patch.object(AudioAnalyzer, 'decode_audio', return_value=None), \
+                mock.patch('apps.safety.audio_services.whisper.load_audio', return_value=noise), \
+                mock.patch.object(AudioAnalyzer, 'borrow_model') as borrow:
+            result = AudioAnalyzer.transcribe_audio(io.BytesIO(b'not really m4a'))
+
+        borrow.assert_not_called()
+        self.assertFalse(result['vad']['speech_detected'])
+        after = AudioAnalyzer.vad_stats()
+        self.assertEqual(after['clips'], before['clips'] + 1)
+        self.assertEqual(after['clips_skipped'], before['clips_skipped'] + 1)
+
+
+class KeywordMatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.matcher = KeywordMatcher([
+            ('help', 'en', 0.6),
+            ('let me', 'en', 0.3),
+            ('let me go', 'en', 0.85),
+            ('me go', 'en', 0.2),
+            ('olè', 'yo', 0.7),
+            ('yan fashi', 'ha', 0.8),
+        ])
+
+    def keywords(self, text, languages=None):
+        return [m['keyword'] for m in self.matcher.find(text, languages)]
+
+    def test_multi_word_phrase_offsets(self):
+        text = 'Please LET me go now'
+        match = next(m for m in self.matcher.find(text) if m['keyword'] == 'let me go')
+        self.assertEqual(text[match['start']:match['end']], 'LET me go')
+
+    def test_overlapping_phrases_all_match(self):
+        self.assertEqual(self.keywords('let me go'), ['let me', 'let me go', 'me go'])
+
+    def test_accents_and_case_are_folded(self):
+        self.assertEqual(self.keywords('OLÈ! ole, Olè'), ['olè', 'olè', 'olè'])
+
+    def test_quoted_words_match(self):
+        self.assertEqual(self.keywords("He said 'help' twice"), ['help'])
+        self.assertEqual(self.keywords("'Yan fashi sun zo"), ['yan fashi'])
+        # Inner apostrophes stay part of the word
+        self.assertEqual(self.keywords("helpin' o'help"), [])
+
+    def test_language_filter(self):
+        text = 'help, ole'
+        self.assertEqual(self.keywords(text, languages={'yo'}), ['olè'])
+        self.assertEqual(self.keywords(text, languages={'en', 'yo'}), ['help', 'olè'])
+        self.assertEqual(self.keywords(text, languages=set()), [])
+
+    def test_detect_crisis_noisy_or(self):
+        with mock.patch.object(AudioAnalyzer, '_matcher', self.matcher):
+            # Repeats count once: 1 - (1 - 0.6) * (1 - 0.7)
+            result = AudioAnalyzer.detect_crisis('help! ole, help')
+            self.assertEqual(result['keywords_found'], ['help', 'olè'])
+            self.assertAlmostEqual(result['confidence'], 0.88, places=4)
+            self.assertEqual(len(result['matches']), 3)
+
+            result = AudioAnalyzer.detect_crisis('help', languages={'yo'})
+            self.assertFalse(result['is_crisis'])
+            self.assertEqual(result['confidence'], 0.0)
+
+
+class VoiceStreamTests(SimpleTestCase):
+
+    def test_odd_length_chunks_stay_aligned(self):
+        samples = np.random.default_rng(0).integers(-32768, 32767, 1000).astype('<i2')
+        data = samples.tobytes()
+        session = VoiceStreamSession()
+        for start, end in [(0, 301), (301, 1000), (1000, 1001), (1001, len(data))]:
+            session.push(data[start:end])
+
+        self.assertEqual(session.total_samples, len(samples))
+        np.testing.assert_array_equal(
+            session.window[-session.filled:], samples.astype(np.float32) / 32768.0
+        )
+
+
+class TrajectoryEncodingTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        n = 600
+        rng = np.random.default_rng(0)
+        track = trajectory.Track(
+            timestamps=1_700_000_000 + np.arange(n, dtype=np.float64),
+            latitudes=5.12 + np.cumsum(rng.normal(0, 2e-5, n)),
+            longitudes=7.35 + np.cumsum(rng.normal(0, 2e-5, n)),
+            speeds=np.abs(rng.normal(4, 1, n)).astype(np.float32),
+            battery_levels=np.full(n, 80, dtype=np.int8)
+        )
+        track.speeds[3] = np.nan
+        track.battery_levels[4] = -1
+
+        blob = trajectory.encode(track)
+        decoded = trajectory.decode(blob)
+
+        # Far smaller than one row per fix
+        self.assertLess(len(blob), n * 10)
+        np.testing.assert_allclose(decoded.timestamps, track.timestamps, atol=1e-3)
+        np.testing.assert_allclose(decoded.latitudes, track.latitudes, atol=1e-7)
+        np.testing.assert_allclose(decoded.longitudes, track.longitudes, atol=1e-7)
+        np.testing.assert_allclose(decoded.speeds, track.speeds, atol=0.01)
+        self.assertTrue(np.isnan(decoded.speeds[3]))
+        self.assertEqual(decoded.battery_levels[4], -1)
@@ -0,0 +1,263 @@
+"""
+Per-user ring buffer of recent GPS fixes
+
+Anomaly detectors look at the last few dozen fixes and at the user's
+hour-of-day activity on every risk calculation. Each process keeps those in
+compact NumPy arrays per user instead of re-reading LocationTracking:
+location_tracking appends to the buffer on ingest, and before each read
+the buffer picks up rows other workers wrote: everything timestamped since
+its last catch-up, re-reading CATCH_UP_OVERLAP seconds so rows committed
+late are not missed (rows already seen are skipped by id).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+
+from apps.prediction.db_functions import PointX, PointY
+from .activity_histogram import HourHistogram, load_histogram
+from .models import LocationTracking
+from .trajectory import latest_segments_track
+
+
+class TrackBuffer:
+    """
+    Last CAPACITY fixes of one user, plus their decaying hour-of-day
+    activity histogram
+
+    Fixes are kept in timestamp order. The centroid of the buffered fixes
+    and the histogram are maintained incrementally as fixes are added and
+    expire.
+    """
+    CAPACITY = 100
+    CATCH_UP_OVERLAP = 120  # Seconds re-read before the last catch-up
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timestamps = np.zeros(self.CAPACITY, dtype=np.float64)  # Unix seconds
+        self.latitudes = np.zeros(self.CAPACITY, dtype=np.float64)
+        self.longitudes = np.zeros(self.CAPACITY, dtype=np.float64)
+        self.speeds = np.full(self.CAPACITY, np.nan, dtype=np.float32)
+        self.size = 0
+        self.head = 0  # Next write position
+
+        # Unix time of the last catch-up, and ids of fixes recent enough
+        # to be read again by the next one
+        self.synced_at = time.time()
+        self._seen_ids = {}
+
+        self._lat_sum = 0.0
+        self._lon_sum = 0.0
+
+        self.activity = HourHistogram()
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, latitude, longitude, speed, location_id=None, count_activity=True):
+        """
+        Add one fix
+
+        A fix older than the newest buffered one (a back-dated batch
+        upload, or a row another worker committed late) is slotted into
+        timestamp order; if the buffer is full and it is older than all
+        of it, only its activity is counted.
+
+        Args:
+            timestamp: Aware datetime or Unix seconds
+            speed: km/h, or None if unknown
+            location_id: LocationTracking id, so re-read rows are skipped
+            count_activity: False for fixes the histogram already holds
+        """
+        ts = timestamp.timestamp() if hasattr(timestamp, 'timestamp') else float(timestamp)
+        if location_id is not None:
+            if location_id in self._seen_ids:
+                return
+            self._seen_ids[location_id] = ts
+
+        if count_activity:
+            self.activity.add(ts)
+
+        if self.size and ts < self.timestamps[(self.head - 1) % self.CAPACITY]:
+            self._insert_in_order(ts, latitude, longitude, speed)
+            return
+
+        i = self.head
+
+        if self.size == self.CAPACITY:
+            # Overwriting the oldest fix
+            self._lat_sum -= self.latitudes[i]
+            self._lon_sum -= self.longitudes[i]
+        else:
+            self.size += 1
+
+        self.timestamps[i] = ts
+        self.latitudes[i] = latitude
+        self.longitudes[i] = longitude
+        self.speeds[i] = np.nan if speed is None else speed
+        self._lat_sum += latitude
+        self._lon_sum += longitude
+        self.head = (i + 1) % self.CAPACITY
+
+    def _insert_in_order(self, ts, latitude, longitude, speed):
+        order = (self.head - self.size + np.arange(self.size)) % self.CAPACITY
+        position = int(np.searchsorted(self.timestamps[order], ts, side='right'))
+        if self.size == self.CAPACITY and position == 0:
+            return
+
+        columns = (self.timestamps, self.latitudes, self.longitudes, self.speeds)
+        values = (ts, latitude, longitude, np.nan if speed is None else speed)
+        merged = [np.insert(column[order], position, value) for column, value in zip(columns, values)]
+        if len(merged[0]) > self.CAPACITY:
+            # Full: the oldest fix expires
+            merged = [column[1:] for column in merged]
+
+        self.size = len(merged[0])
+        for column, ordered in zip(columns, merged):
+            column[:self.size] = ordered
+        self.head = self.size % self.CAPACITY
+        self._lat_sum = float(self.latitudes[:self.size].sum())
+        self._lon_sum = float(self.longitudes[:self.size].sum())
+
+    def catch_up_from(self):
+        """
+        Returns:
+            Aware datetime the next catch-up reads from
+        """
+        return datetime.fromtimestamp(self.synced_at - self.CATCH_UP_OVERLAP, tz=dt_timezone.utc)
+
+    def mark_synced(self, synced_at):
+        """
+        Record a catch-up that read every row committed by synced_at
+        (Unix time), forgetting ids the next one can't read again
+        """
+        self.synced_at = synced_at
+        cutoff = synced_at - self.CATCH_UP_OVERLAP
+        self._seen_ids = {i: ts for i, ts in self._seen_ids.items() if ts >= cutoff}
+
+    def recent(self, n=None):
+        """
+        Newest-first view of the last n fixes
+
+        Returns:
+            (timestamps, latitudes, longitudes, speeds) arrays
+        """
+        n = self.size if n is None else min(n, self.size)
+        idx = (self.head - 1 - np.arange(n)) % self.CAPACITY
+        return self.timestamps[idx], self.latitudes[idx], self.longitudes[idx], self.speeds[idx]
+
+    def latest(self):
+        """
+        Returns:
+            (latitude, longitude) of the newest fix
+        """
+        i = (self.head - 1) % self.CAPACITY
+        return self.latitudes[i], self.longitudes[i]
+
+    def centroid(self):
+        """
+        Returns:
+            (avg_latitude, avg_longitude) over the buffered fixes
+        """
+        return self._lat_sum / self.size, self._lon_sum / self.size
+
+    def hour_counts(self, now=None):
+        """
+        Decayed fixes per hour of day (UTC)
+
+        Returns:
+            Counter {hour: weight}
+        """
+        return self.activity.counts(now)
+
+
+def _fixes(queryset):
+    return queryset.annotate(
+        lat=PointY('location'), lon=PointX('location')
+    ).values_list('id', 'timestamp', 'lat', 'lon', 'speed')
+
+
+class TrackBufferRegistry:
+    """
+    Process-local TrackBuffers, least recently used evicted first
+    """
+    MAX_USERS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = OrderedDict()
+
+    def get(self, user_profile):
+        """
+        Buffer for a user, warmed from the database on first use and
+        caught up with rows written by other workers since
+
+        Returns:
+            TrackBuffer
+        """
+        with self._lock:
+            buffer = self._buffers.get(user_profile.pk)
+            if buffer is not None:
+                self._buffers.move_to_end(user_profile.pk)
+
+        if buffer is None:
+            buffer = self._warm(user_profile)
+            with self._lock:
+                buffer = self._buffers.setdefault(user_profile.pk, buffer)
+                while len(self._buffers) > self.MAX_USERS:
+                    self._buffers.popitem(last=False)
+        else:
+            with buffer.lock:
+                synced_at = time.time()
+                for row in _fixes(LocationTracking.objects.filter(
+                    user_profile=user_profile, timestamp__gte=buffer.catch_up_from()
+                ).order_by('timestamp', 'id')):
+                    buffer.append(row[1], row[2], row[3], row[4], location_id=row[0])
+                buffer.mark_synced(synced_at)
+
+        return buffer
+
+    def append(self, user_profile, location):
+        """
+        Record a freshly saved LocationTracking row
+        """
+        with self._lock:
+            buffer = self._buffers.get(user_profile.pk)
+        if buffer is None:
+            return  # Warmed from the DB (including this row) on first read
+
+        with buffer.lock:
+            buffer.append(
+                location.timestamp, location.location.y, location.location.x,
+                location.speed, location_id=location.id
+            )
+
+    def _warm(self, user_profile):
+        buffer = TrackBuffer()
+
+        rows = list(_fixes(LocationTracking.objects.filter(
+            user_profile=user_profile
+        ).order_by('-timestamp', '-id'))[:TrackBuffer.CAPACITY])
+
+        # Older fixes may only survive as compacted trajectory segments
+        older = None
+        if len(rows) < TrackBuffer.CAPACITY:
+            older = latest_segments_track(user_profile, TrackBuffer.CAPACITY - len(rows))
+            if not rows and not len(older.timestamps):
+                return buffer
+
+        # The persisted histogram already counts these fixes
+        buffer.activity = load_histogram(user_profile)
+        if older is not None:
+            for fix in zip(older.timestamps, older.latitudes, older.longitudes, older.speeds):
+                speed = None if np.isnan(fix[3]) else float(fix[3])
+                buffer.append(fix[0], fix[1], fix[2], speed, count_activity=False)
+        for row in reversed(rows):
+            buffer.append(row[1], row[2], row[3], row[4], location_id=row[0], count_activity=False)
+
+        return buffer
+
+
+track_buffers = TrackBufferRegistry()
@@ -0,0 +1,281 @@
+"""
+Compact trajectory storage
+
+Tracks older than the raw-retention window are folded into one
+TrajectorySegment row per user per SEGMENT_SECONDS window. A segment
+stores the first fix in full and every later fix as integer deltas
+(milliseconds, 1e-7 degrees), column by column, then zlib-compressed -
+typically a few bytes per fix instead of a full row.
+"""
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+
+from apps.prediction.db_functions import PointX, PointY
+from .models import LocationTracking, TrajectorySegment
+
+
+SEGMENT_SECONDS = 3600
+DELETE_BATCH_SIZE = 5000
+
+MAGIC = b'EVTR'
+VERSION = 1
+# magic, version, point count, first timestamp (ms), first lat, first lon (1e-7 deg)
+HEADER = struct.Struct('<4sBIqii')
+COORD_SCALE = 1e7
+SPEED_SCALE = 100        # Centi-km/h
+SPEED_MISSING = 0xFFFF
+BATTERY_MISSING = -1
+
+Track = namedtuple('Track', ['timestamps', 'latitudes', 'longitudes', 'speeds', 'battery_levels'])
+Track.__doc__ = """
+Columns of fixes in time order: timestamps (Unix seconds, float64),
+latitudes/longitudes (float64), speeds (float32, NaN = unknown),
+battery_levels (int8, -1 = unknown)
+"""
+
+
+def encode(track):
+    """
+    Pack a Track into a segment blob
+
+    Returns:
+        bytes
+    """
+    n = len(track.timestamps)
+    if n == 0:
+        raise ValueError("Cannot encode an empty track")
+
+    ms = np.round(np.asarray(track.timestamps, dtype=np.float64) * 1000).astype(np.int64)
+    lat = np.round(np.asarray(track.latitudes) * COORD_SCALE).astype(np.int64)
+    lon = np.round(np.asarray(track.longitudes) * COORD_SCALE).astype(np.int64)
+
+    speeds = np.asarray(track.speeds, dtype=np.float64)
+    speed = np.where(
+        np.isnan(speeds), SPEED_MISSING,
+        np.clip(np.round(speeds * SPEED_SCALE), 0, SPEED_MISSING - 1)
+    ).astype('<u2')
+    battery = np.asarray(track.battery_levels, dtype=np.int64).clip(BATTERY_MISSING, 100).astype(np.int8)
+
+    header = HEADER.pack(MAGIC, VERSION, n, int(ms[0]), int(lat[0]), int(lon[0]))
+    body = b''.join([
+        np.diff(ms).astype('<i4').tobytes(),
+        np.diff(lat).astype('<i4').tobytes(),
+        np.diff(lon).astype('<i4').tobytes(),
+        speed.tobytes(),
+        battery.tobytes(),
+    ])
+    return header + zlib.compress(body, 6)
+
+
+def decode(blob):
+    """
+    Unpack a segment blob
+
+    Returns:
+        Track
+    """
+    blob = bytes(blob)
+    magic, version, n, ms0, lat0, lon0 = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a trajectory segment")
+
+    body = zlib.decompress(blob[HEADER.size:])
+    offset = 0
+
+    def column(dtype, count):
+        nonlocal offset
+        values = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values
+
+    d_ms = column('<i4', n - 1)
+    d_lat = column('<i4', n - 1)
+    d_lon = column('<i4', n - 1)
+    speed = column('<u2', n)
+    battery = column(np.int8, n)
+
+    def undelta(first, deltas):
+        out = np.empty(n, dtype=np.int64)
+        out[0] = first
+        np.cumsum(deltas, out=out[1:])
+        out[1:] += first
+        return out
+
+    return Track(
+        timestamps=undelta(ms0, d_ms) / 1000.0,
+        latitudes=undelta(lat0, d_lat) / COORD_SCALE,
+        longitudes=undelta(lon0, d_lon) / COORD_SCALE,
+        speeds=np.where(speed == SPEED_MISSING, np.nan, speed / SPEED_SCALE).astype(np.float32),
+        battery_levels=battery.copy()
+    )
+
+
+def concat(tracks):
+    """
+    Merge Tracks into one, sorted by time
+    """
+    tracks = [t for t in tracks if len(t.timestamps)]
+    if not tracks:
+        return Track(np.empty(0), np.empty(0), np.empty(0),
+                     np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int8))
+
+    merged = Track(*(np.concatenate(columns) for columns in zip(*tracks)))
+    order = np.argsort(merged.timestamps, kind='stable')
+    return Track(*(column[order] for column in merged))
+
+
+def _raw_rows(queryset):
+    return queryset.annotate(
+        lat=PointY('location'), lon=PointX('location')
+    ).values_list('timestamp', 'lat', 'lon', 'speed', 'battery_level')
+
+
+def rows_to_track(rows):
+    """
+    Build a Track from (timestamp, lat, lon, speed, battery_level) rows
+    """
+    rows = list(rows)
+    return Track(
+        timestamps=np.array([r[0].timestamp() for r in rows], dtype=np.float64),
+        latitudes=np.array([r[1] for r in rows], dtype=np.float64),
+        longitudes=np.array([r[2] for r in rows], dtype=np.float64),
+        speeds=np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=np.float32),
+        battery_levels=np.array([BATTERY_MISSING if r[4] is None else r[4] for r in rows], dtype=np.int8)
+    )
+
+
+def load_track(user_profile, start=None, end=None):
+    """
+    A user's history between start and end, from segments and raw rows
+
+    Args:
+        start, end: Optional aware datetimes (end exclusive)
+
+    Returns:
+        Track in time order
+    """
+    segments = TrajectorySegment.objects.filter(user_profile=user_profile)
+    raw = LocationTracking.objects.filter(user_profile=user_profile)
+    if start is not None:
+        segments = segments.filter(end_time__gte=start)
+        raw = raw.filter(timestamp__gte=start)
+    if end is not None:
+        segments = segments.filter(start_time__lt=end)
+        raw = raw.filter(timestamp__lt=end)
+
+    track = concat(
+        [decode(blob) for blob in segments.values_list('data', flat=True)]
+        + [rows_to_track(_raw_rows(raw.order_by('timestamp')))]
+    )
+
+    # Segments can overhang the requested range
+    keep = np.ones(len(track.timestamps), dtype=bool)
+    if start is not None:
+        keep &= track.timestamps >= start.timestamp()
+    if end is not None:
+        keep &= track.timestamps < end.timestamp()
+    return Track(*(column[keep] for column in track))
+
+
+def latest_segments_track(user_profile, limit):
+    """
+    The newest `limit` fixes held in segments (for warming the track buffer)
+
+    Returns:
+        Track in time order
+    """
+    tracks = []
+    count = 0
+    for blob, point_count in TrajectorySegment.objects.filter(
+        user_profile=user_profile
+    ).order_by('-start_time').values_list('data', 'point_count').iterator():
+        tracks.append(decode(blob))
+        count += point_count
+        if count >= limit:
+            break
+
+    track = concat(tracks)
+    return Track(*(column[-limit:] for column in track))
+
+
+def _window_start(timestamp):
+    return int(timestamp // SEGMENT_SECONDS) * SEGMENT_SECONDS
+
+
+def compact(start, end, chunk_size=10000):
+    """
+    Move raw fixes in [start, end) into segments and delete the rows
+
+    Windows that already have a segment (late uploads) are merged into it.
+    Only the rows read into segments are deleted; fixes committed during
+    the scan are left for the next run. Call inside a transaction.
+
+    Returns:
+        (fixes compacted, segments written)
+    """
+    existing = {
+        (segment.user_profile_id, segment.start_time.timestamp()): segment
+        for segment in TrajectorySegment.objects.filter(
+            start_time__gte=datetime.fromtimestamp(_window_start(start.timestamp()), tz=dt_timezone.utc),
+            start_time__lt=end
+        )
+    }
+
+    rows = LocationTracking.objects.filter(
+        timestamp__gte=start, timestamp__lt=end
+    ).order_by('user_profile_id', 'timestamp').annotate(
+        lat=PointY('location'), lon=PointX('location')
+    ).values_list('id', 'user_profile_id', 'timestamp', 'lat', 'lon', 'speed', 'battery_level')
+
+    new_segments = []
+    updated = []
+    compacted = 0
+
+    def flush(key, group):
+        track = rows_to_track(group)
+        segment = existing.get(key)
+        if segment is not None:
+            track = concat([decode(segment.data), track])
+            segment.data = encode(track)
+            segment.point_count = len(track.timestamps)
+            segment.end_time = datetime.fromtimestamp(track.timestamps[-1], tz=dt_timezone.utc)
+            updated.append(segment)
+        else:
+            new_segments.append(TrajectorySegment(
+                user_profile_id=key[0],
+                start_time=datetime.fromtimestamp(key[1], tz=dt_timezone.utc),
+                end_time=group[-1][0],
+                point_count=len(group),
+                data=encode(track)
+            ))
+
+    key = None
+    group = []
+    scanned_ids = []
+    for row_id, user_id, *row in rows.iterator(chunk_size=chunk_size):
+        scanned_ids.append(row_id)
+        row_key = (user_id, float(_window_start(row[0].timestamp())))
+        if row_key != key and group:
+            flush(key, group)
+            group = []
+        key = row_key
+        group.append(row)
+        compacted += 1
+    if group:
+        flush(key, group)
+
+    TrajectorySegment.objects.bulk_create(new_segments, batch_size=1000)
+    TrajectorySegment.objects.bulk_update(updated, ['data', 'point_count', 'end_time'], batch_size=1000)
+    # Ids are not committed in order, so a concurrent insert can land below
+    # the highest id scanned - delete exactly the rows that were read
+    for offset in range(0, len(scanned_ids), DELETE_BATCH_SIZE):
+        LocationTracking.objects.filter(
+            timestamp__gte=start, timestamp__lt=end,
+            id__in=scanned_ids[offset:offset + DELETE_BATCH_SIZE]
+        ).delete()
+
+    return compacted, len(new_segments) + len(updated)
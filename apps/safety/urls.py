@@ -1,12 +1,17 @@
 from django.urls import path
 from .views import (
     location_tracking,
+    location_batch,
     get_crimezones,
     get_crimezones_nearby,
     generate_crime_zones_api,
     generate_zones_for_current_user,
     calculate_risk,
     audio_analyze,
+    audio_job_submit,
+    audio_job_status,
+    audio_stream_open,
+    audio_stream_chunk,
     predict_threat,
     heatmap,
     user_confirmation,
@@ -31,12 +36,17 @@ from .admin_views import (
 
 urlpatterns = [
     path('location/', location_tracking, name='location_tracking'),
+    path('location/batch/', location_batch, name='location_batch'),
     path('zones/', get_crimezones, name='get_crimezones'),
     path('zones/nearby/', get_crimezones_nearby, name='get_crimezones_nearby'),
     path('zones/generate/', generate_crime_zones_api, name='generate_crime_zones'),
     path('zones/generate-for-me/', generate_zones_for_current_user, name='generate_zones_for_me'),
     path('risk/calculate/', calculate_risk, name='calculate_risk'),
     path('audio/analyze/', audio_analyze, name='audio_analyze'),
+    path('audio/jobs/', audio_job_submit, name='audio_job_submit'),
+    path('audio/jobs/<uuid:job_id>/', audio_job_status, name='audio_job_status'),
+    path('audio/stream/', audio_stream_open, name='audio_stream_open'),
+    path('audio/stream/<uuid:session_id>/', audio_stream_chunk, name='audio_stream_chunk'),
     path('predict/', predict_threat, name='predict_threat'),
     path('heatmap/', heatmap, name='heatmap'),
     path('alerts/confirm/', user_confirmation, name='user_confirmation'),
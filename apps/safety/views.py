@@ -1,10 +1,11 @@
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import status
-from .models import LocationTracking, CrimeZone, AudioRecording, Alert
+from .models import LocationTracking, CrimeZone, AudioRecording, Alert, AudioAnalysisJob
 from apps.accounts.models import UserProfile
-from rest_framework.decorators import api_view, parser_classes
+from rest_framework.decorators import api_view, parser_classes, renderer_classes
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 from .serializers import (
     LocationTrackingSerializer,
     CrimeZoneSerializer,
@@ -15,15 +16,23 @@ from django.contrib.gis.measure import D
 from django.contrib.gis.db.models.functions import Distance
 from datetime import datetime, timedelta
 from django.utils import timezone
-from apps.anomaly_detection import (
-    TimePatternDetector,
-    RouteDeviationDetector,
-    StoppedMovementDetector
-)
+from django.conf import settings
 from .audio_services import AudioAnalyzer
+from .audio_jobs import AudioJobQueue, create_voice_crisis_alert
+from .voice_stream import VoiceStreamRegistry
+from .track_buffer import track_buffers
+from .zone_index import zone_index
+from .activity_histogram import record_fix, record_fixes
+from . import batch_ingest
+from . import heatmap_cache
+from .renderers import HeatmapColumnarRenderer, HeatmapBinaryRenderer
 from ml.prediction_service import ThreatPredictor
+from ml.route_graph import RouteGraph, EdgeRiskTable, haversine_m
+from apps.risk_engine import RiskEngine
+from apps.prediction.prediction_logger import prediction_logger, next_occurrence
 from math import radians, sin, cos
 from apps.prediction.models import IncidentReport
+import numpy as np
 
 # Trigger reload for new model v3
 
@@ -43,9 +52,90 @@ def location_tracking(request):
     serializer = LocationTrackingSerializer(data=request.data, context={'user_profile': user_profile})
     if serializer.is_valid():
         location = serializer.save()
+        record_fix(user_profile, location.timestamp)
+        track_buffers.append(user_profile, location)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Fixes older than this are stored but not risk-assessed
+BATCH_RISK_MAX_AGE = timedelta(minutes=5)
+
+
+@api_view(['POST'])
+def location_batch(request):
+    """
+    POST /safety/location/batch/
+    Saves many GPS fixes in one request (offline replay / battery batching)
+
+    Body (JSON, optionally Content-Encoding: gzip or deflate):
+    {
+        "fixes": [
+            {"latitude": 5.125, "longitude": 7.356, "speed": 3.2,
+             "battery_level": 80, "timestamp": "2025-01-05T21:14:03Z"},
+            ...
+        ]
+    }
+    timestamp may also be epoch seconds/milliseconds; it defaults to now.
+
+    Returns (201):
+    {
+        "saved": 240,
+        "first_timestamp": "...",
+        "last_timestamp": "...",
+        "risk": {"risk_score": 42.0, "risk_level": "Medium", ...} or null
+    }
+    Only the newest fix is risk-assessed, and only if it is recent.
+    """
+    try:
+        user_profile = UserProfile.objects.get(user=request.user)
+    except UserProfile.DoesNotExist:
+        return Response(
+            {"error": "User profile not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        fixes = batch_ingest.decode_body(request.body, request.META.get('HTTP_CONTENT_ENCODING'))
+        columns = batch_ingest.validate(fixes)
+    except batch_ingest.BatchError as e:
+        return Response(
+            {"error": str(e), "details": e.errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    saved = batch_ingest.ingest(user_profile, columns)
+
+    record_fixes(user_profile, [location.timestamp for location in saved])
+    for location in saved:
+        track_buffers.append(user_profile, location)
+
+    newest = saved[-1]
+    risk = None
+    if timezone.now() - newest.timestamp <= BATCH_RISK_MAX_AGE:
+        lat, lon = newest.location.y, newest.location.x
+        assessment = RiskEngine(predictor=threat_predictor).assess(
+            user_profile, lat, lon, newest.speed if newest.speed is not None else 0
+        )
+        total_risk = assessment['total_risk']
+        alert = None
+        if total_risk > 70:
+            alert = RiskEngine.raise_alert(user_profile, assessment, lat, lon)
+
+        risk = {
+            "risk_score": round(min(100, total_risk), 1),
+            "risk_level": "High" if total_risk > 70 else "Medium" if total_risk > 40 else "Low",
+            "anomalies": assessment['anomalies'],
+            "should_alert": total_risk > 70,
+            "alert_id": alert.id if alert else None
+        }
+
+    return Response({
+        "saved": len(saved),
+        "first_timestamp": saved[0].timestamp.isoformat(),
+        "last_timestamp": newest.timestamp.isoformat(),
+        "risk": risk
+    }, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 def get_crimezones(request):
     """
@@ -125,150 +215,36 @@ def calculate_risk(request):
     serializer = RiskCalculatorSerializer(data=request.data)
 
     if serializer.is_valid():
-        user_location = Point(serializer.validated_data['longitude'], serializer.validated_data['latitude'], srid=4326)
-        nearest_zone = CrimeZone.objects.annotate(
-            distance=Distance('location', user_location)
-        ).order_by('distance').first()
-
+        lat = serializer.validated_data['latitude']
+        lon = serializer.validated_data['longitude']
         speed = serializer.validated_data['speed']
-        
-        # Initialize default values for zone analysis
-        zone_risk = 0
-        distance_m = 0
-        nearest_zone_name = "None"
-        nearest_zone_risk = 0
-
-        if nearest_zone:
-            distance_m = nearest_zone.location.distance(user_location) * 111000  # degrees to meters
-            nearest_zone_name = nearest_zone.name
-            nearest_zone_risk = nearest_zone.risk_level
-
-            # Calculate zone risk
-            # Zone risk (40% of total)
-            # Logic: Closer to high-risk zone = higher risk
-            # If within zone radius, use full zone risk
-            # If outside, decrease based on distance
-
-            if distance_m <= nearest_zone.radius:
-                # inside danger zone
-                zone_risk = nearest_zone.risk_level
-            else:
-                # Outside, but nearby - decrease risk with distance
-                # Max influence: 500m
-                distance_factor = max(0, 1 - (distance_m / 500))
-                zone_risk = nearest_zone.risk_level * 0.4 * distance_factor
-        else:
-            # no zones defined in system
-            pass
-        
-        # Calculate time risk
-        current_hour = datetime.now().hour
-
-        # Night time (22:00 - 05:00) = high risk
-        if 22 <= current_hour or current_hour <= 5:
-            time_risk = 20  # 20% of total (full weight)
-        elif 18 <= current_hour <= 21:
-            time_risk = 10  # Evening (medium risk)
-        else:
-            time_risk = 5   # Daytime (low risk)
-        
 
-        # Calculate speed risk
-        # Slow movement or stopped = suspicious
-        if speed < 2:  # Walking very slowly or stopped
-            speed_risk = 20  # Full weight
-        elif speed < 5:
-            speed_risk = 10  # Walking slowly
-        else:
-            speed_risk = 0   # Normal speed, no risk
-        
-        # Calculate Anomaly risk
         try:
             user_profile = UserProfile.objects.get(user=request.user)
         except UserProfile.DoesNotExist:
             user_profile = None
 
-        anomaly_risk = 0
-
-        anomalies_detected = []
-
-        if user_profile:
-            # Run detectors
-            stopped = StoppedMovementDetector.detect(user_profile)
-            route = RouteDeviationDetector.detect(user_profile)
-            time = TimePatternDetector.detect(user_profile)
-
-            # Collect anomalies
-            for detector_result in [stopped, route, time]:
-                if detector_result['is_anomaly']:
-                    anomalies_detected.append(detector_result['reason'])
-                    anomaly_risk += detector_result['risk_increase']
-        
-
-        # Check for recent voice crisis
-        voice_crisis_risk = 0
-        voice_crisis_reason = ""
-
-        if user_profile:
-            recent_voice_alert = Alert.objects.filter(
-                user_profile=user_profile,
-                alert_source='Voice',
-                triggered_at__gte=timezone.now() - timedelta(minutes=5),
-                status='Active'
-            ).first()
-
-            if recent_voice_alert:
-                voice_crisis_risk = 50
-
-                # Get keywords from audio recording.
-                if hasattr(recent_voice_alert, 'audio'):
-                    keywords = recent_voice_alert.audio.crisis_keywords_detected
-                    voice_crisis_reason = ", ".join(keywords)
-                else:
-                    voice_crisis_reason = "Voice crisis detected."
-
-        # Calculate Prediction Risk
-        prediction_risk = 0
-        prediction_reason = ""
-        prediction_data = {}
-
-        if threat_predictor:
-            try:
-                current_hour = datetime.now().hour
-                current_day = datetime.now().weekday()
-                
-                # Get coords from validated data
-                lat = serializer.validated_data['latitude']
-                lon = serializer.validated_data['longitude']
-
-                prediction = threat_predictor.predict(
-                    lat, lon, current_hour, current_day
-                )
-                
-                # Prediction contributes 20% to total risk
-                # Only if prediction is high enough to be relevant
-                if prediction['risk_probability'] > 0.3:
-                    prediction_risk = prediction['risk_probability'] * 20
-                
-                if prediction['risk_probability'] > 0.7:
-                    prediction_reason = f"High threat predicted ({prediction['risk_percentage']}%)"
-                elif prediction['risk_probability'] > 0.4:
-                    prediction_reason = f"Moderate threat predicted ({prediction['risk_percentage']}%)"
-                    
-                prediction_data = {
-                    "enabled": True,
-                    "risk_probability": prediction.get('risk_probability', 0),
-                    "risk_percentage": prediction.get('risk_percentage', 0),
-                    "confidence": prediction.get('confidence', 'N/A')
-                }
-            except Exception as e:
-                print(f"Prediction error: {e}")
-                prediction_data = {"enabled": False, "error": str(e)}
-        else:
-             prediction_data = {"enabled": False, "error": "Model not loaded"}
+        # One pass: shared track, in-memory zones, one alert query
+        assessment = RiskEngine(predictor=threat_predictor).assess(user_profile, lat, lon, speed)
+
+        nearest_zone = assessment['nearest_zone']
+        distance_m = assessment['distance_m']
+        nearest_zone_name = nearest_zone.name if nearest_zone else "None"
+        nearest_zone_risk = nearest_zone.risk_level if nearest_zone else 0
+
+        zone_risk = assessment['zone_risk']
+        time_risk = assessment['time_risk']
+        speed_risk = assessment['speed_risk']
+        anomaly_risk = assessment['anomaly_risk']
+        anomalies_detected = assessment['anomalies']
+        voice_crisis_risk = assessment['voice_crisis_risk']
+        voice_crisis_reason = assessment['voice_crisis_reason']
+        prediction_risk = assessment['prediction_risk']
+        prediction_reason = assessment['prediction_reason']
+        prediction_data = assessment['prediction']
 
         # Combine and respond
-        total_risk = zone_risk + time_risk + speed_risk + anomaly_risk + voice_crisis_risk + prediction_risk
+        total_risk = assessment['total_risk']
                     
         # Scale to 100 (temporary until we add prediction)
         risk_score = min(100, total_risk * 1.25)
@@ -281,46 +257,10 @@ def calculate_risk(request):
         alert_id = None
         
         if should_alert and user_profile:
-            # Check if there's already an active alert in last 5 minutes
-            existing_alert = Alert.objects.filter(
-                user_profile=user_profile,
-                status__in=['Active', 'Pending Response'],
-                triggered_at__gte=timezone.now() - timedelta(minutes=5)
-            ).first()
-            
-            if not existing_alert:
-                # Create new alert
-                from apps.alert_services import AlertService
-                from apps.admin_alert_service import AdminAlertService
-                
-                alert = Alert.objects.create(
-                    user_profile=user_profile,
-                    alert_level='Emergency' if total_risk > 85 else 'Warning',
-                    alert_source='Combined',
-                    trigger_location=Point(serializer.validated_data['longitude'], 
-                                         serializer.validated_data['latitude'], 
-                                         srid=4326),
-                    risk_score=total_risk,
-                    reason=f"High risk detected: Zone={zone_risk:.1f}, Time={time_risk}, Speed={speed_risk}",
-                    status='Active'
-                )
-                
-                # Send WhatsApp alerts
-                alert_service = AlertService()
-                contacts_alerted = alert_service.trigger_emergency_alert(alert)
-                
-                # Handle admin logging based on alert source
-                if voice_crisis_risk > 0:
-                    # Voice crisis detected - log immediately to admin
-                    AdminAlertService.handle_voice_crisis_alert(alert)
-                else:
-                    # High risk but no voice crisis - set response deadline
-                    AdminAlertService.handle_high_risk_alert(alert)
-                
+            alert = RiskEngine.raise_alert(user_profile, assessment, lat, lon)
+            if alert:
                 alert_triggered = True
                 alert_id = alert.id
-                
-                print(f"🚨 Alert {alert.id} triggered, {contacts_alerted} contacts notified")
 
         # Build reason string
         reasons = []
@@ -436,37 +376,10 @@ def audio_analyze(request):
             user_profile = None
 
         if user_profile:
-            # Get current location (last location from tracking)
-            last_location = LocationTracking.objects.filter(
-                user_profile=user_profile
-            ).first()
-
-            if last_location:
-                # Create emergency alert
-                alert = Alert.objects.create(
-                    user_profile=user_profile,
-                    alert_level='Emergency',
-                    alert_source='Voice',
-                    trigger_location=last_location.location,
-                    risk_score=95,  # Voice crisis = very high risk
-                    reason=f"Voice crisis detected: {', '.join(result['keywords_found'])}",
-                    status='Active'
-                )
-
-                # Save Audio recording
-                AudioRecording.objects.create(
-                    alert=alert,
-                    file_path=f"audio_{alert.id}.wav",
-                    duration_seconds=3,
-                    transcript=result['transcript'],
-                    crisis_keywords_detected=result['keywords_found'],
-                )
-                
-                # LOG TO ADMIN DASHBOARD IMMEDIATELY (voice crisis)
-                from apps.admin_alert_service import AdminAlertService
-                AdminAlertService.handle_voice_crisis_alert(alert)
+            alert = create_voice_crisis_alert(user_profile, result)
+
+            if alert:
                 logged_to_admin = True
-                
                 alert_created = True
                 alert_id = alert.id
     
@@ -482,12 +395,239 @@ def audio_analyze(request):
         "logged_to_admin": logged_to_admin
     }, status=status.HTTP_200_OK)
 
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def audio_job_submit(request):
+    """
+    POST /api/audio/jobs/
+    Queues audio for background crisis analysis and returns immediately
+
+    Form data:
+    - audio: audio file (.wav, .mp3, .m4a)
+
+    Returns (202):
+    {
+        "job_id": "8d6c...",
+        "status": "Queued"
+    }
+
+    Poll GET /api/audio/jobs/<job_id>/ for the result. A crisis alert is
+    raised as soon as the job completes, without waiting for the poll.
+    """
+    audio_file = request.FILES.get('audio')
+
+    if not audio_file:
+        return Response(
+            {"error": "No audio file provided"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    allowed_types = ['audio/wav', 'audio/mpeg', 'audio/mp4', 'audio/x-m4a', 'audio/wave']
+    if audio_file.content_type not in allowed_types:
+        return Response(
+            {"error": f"Invalid audio type: {audio_file.content_type}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        user_profile = UserProfile.objects.get(user=request.user)
+    except UserProfile.DoesNotExist:
+        user_profile = None
+
+    job = AudioJobQueue.submit(audio_file, user_profile)
+
+    return Response({
+        "job_id": str(job.id),
+        "status": job.status
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def audio_job_status(request, job_id):
+    """
+    GET /api/audio/jobs/<job_id>/?wait=10
+    Returns the state of an audio analysis job
+
+    Query params:
+    - wait: optional, seconds to block for completion (max 30)
+
+    Returns:
+    {
+        "job_id": "8d6c...",
+        "status": "Completed",
+        "transcript": "help me please",
+        "crisis_detected": true,
+        "keywords_found": ["help"],
+        "confidence": 0.95,
+        "alert_created": true,
+        "alert_id": 456
+    }
+    """
+    try:
+        job = AudioAnalysisJob.objects.get(id=job_id)
+    except AudioAnalysisJob.DoesNotExist:
+        return Response(
+            {"error": "Job not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Only the submitting user may read a job
+    if job.user_profile and job.user_profile.user_id != getattr(request.user, 'id', None):
+        return Response(
+            {"error": "Job not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        wait_seconds = min(float(request.query_params.get('wait', 0)), 30)
+    except ValueError:
+        wait_seconds = 0
+
+    if wait_seconds > 0 and job.status in ('Queued', 'Processing'):
+        job = AudioJobQueue.wait_for(job.id, wait_seconds)
+
+    data = {
+        "job_id": str(job.id),
+        "status": job.status,
+        "created_at": job.created_at.isoformat(),
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None
+    }
+
+    if job.status == 'Completed':
+        data.update({
+            "transcript": job.transcript,
+            "language": job.language,
+            "crisis_detected": job.crisis_detected,
+            "keywords_found": job.keywords_found,
+            "confidence": job.confidence,
+            "alert_created": job.alert_id is not None,
+            "alert_id": job.alert_id
+        })
+    elif job.status == 'Failed':
+        data["error"] = job.error
+
+    return Response(data, status=status.HTTP_200_OK)
+
+# Largest chunk accepted by the streaming endpoint (10 s of PCM16 @ 16 kHz)
+AUDIO_STREAM_MAX_CHUNK_BYTES = 10 * 16000 * 2
+
+
+@api_view(['POST'])
+def audio_stream_open(request):
+    """
+    POST /api/audio/stream/
+    Opens a streaming voice monitoring session
+
+    Returns (201):
+    {
+        "session_id": "3f1c...",
+        "sample_rate": 16000,
+        "format": "s16le",
+        "step_seconds": 1.0
+    }
+
+    Then POST raw PCM16 mono chunks (Content-Type: application/octet-stream)
+    to /api/audio/stream/<session_id>/ on the same connection, and DELETE
+    that URL when done.
+    """
+    try:
+        user_profile = UserProfile.objects.get(user=request.user)
+    except UserProfile.DoesNotExist:
+        user_profile = None
+
+    session = VoiceStreamRegistry.open(user_profile)
+
+    return Response({
+        "session_id": str(session.id),
+        "sample_rate": session.sample_rate,
+        "format": "s16le",
+        "step_seconds": session.STEP_SECONDS
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST', 'DELETE'])
+def audio_stream_chunk(request, session_id):
+    """
+    POST /api/audio/stream/<session_id>/
+    Feeds a chunk of audio to a streaming session
+
+    Body: raw PCM16 little-endian mono samples at 16 kHz
+
+    Returns:
+    {
+        "session_id": "3f1c...",
+        "audio_seconds": 4.0,
+        "partial_transcript": "somebody help me",
+        "new_keywords": ["help"],
+        "keywords_found": ["help"],
+        "crisis_detected": true,
+        "alert_created": true,
+        "alert_id": 456
+    }
+
+    DELETE /api/audio/stream/<session_id>/ closes the session.
+    """
+    session = VoiceStreamRegistry.get(session_id)
+
+    # Only the user who opened a session may feed or close it
+    if session is None or (
+        session.user_profile and session.user_profile.user_id != getattr(request.user, 'id', None)
+    ):
+        return Response(
+            {"error": "Session not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if request.method == 'DELETE':
+        VoiceStreamRegistry.close(session_id)
+        return Response({
+            "session_id": str(session.id),
+            "keywords_found": session.keywords_found,
+            "alert_id": session.alert.id if session.alert else None
+        }, status=status.HTTP_200_OK)
+
+    chunk = request.body
+    if not chunk:
+        return Response(
+            {"error": "Empty audio chunk"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(chunk) > AUDIO_STREAM_MAX_CHUNK_BYTES:
+        return Response(
+            {"error": f"Chunk too large (max {AUDIO_STREAM_MAX_CHUNK_BYTES} bytes)"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        result = session.push(chunk)
+    except Exception as e:
+        return Response(
+            {"error": f"Audio analysis failed: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response(result, status=status.HTTP_200_OK)
+
+
 try:
     threat_predictor = ThreatPredictor()
+    # New incidents invalidate cached heatmaps around them
+    threat_predictor.incident_index.on_change = heatmap_cache.invalidate_area
 except:
     threat_predictor = None
     print("⚠️ Warning: Could not load LSTM model")
 
+try:
+    route_graph = RouteGraph.load(settings.ROUTE_GRAPH_PATH)
+    # Hour-of-week edge risk, rebuilt nightly by `manage.py build_route_risk`
+    route_graph.risk_table = EdgeRiskTable(settings.ROUTE_RISK_TABLE_PATH, route_graph.edge_count)
+except FileNotFoundError:
+    # No graph built yet: suggest_safe_route falls back to straight lines
+    route_graph = None
+except Exception as e:
+    route_graph = None
+    print(f"⚠️ Warning: Could not load route graph: {e}")
+
 @api_view(['POST'])
 def predict_threat(request):
     """
@@ -545,6 +685,16 @@ def predict_threat(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
+    # Accuracy logging must never fail the request
+    if prediction_logger.sampled():
+        try:
+            prediction_logger.log(
+                float(latitude), float(longitude),
+                next_occurrence(hour, day_of_week), prediction['risk_probability']
+            )
+        except Exception as e:
+            print(f"⚠️ Prediction logging failed: {e}")
+
     # Find nearest zone for context
     user_location = Point(float(longitude), float(latitude), srid=4326)
     nearest_zone = CrimeZone.objects.annotate(
@@ -564,13 +714,39 @@ def predict_threat(request):
         "features_used": prediction['features_used']
     }, status=status.HTTP_200_OK)
 
+# Heatmap resolution limits
+HEATMAP_MAX_RESOLUTION = 100
+HEATMAP_DENSE_MAX_RESOLUTION = 20  # Above this, refine progressively by default
+HEATMAP_DEFAULT_REFINE_THRESHOLD = 0.05
+
 @api_view(['GET'])
+@renderer_classes([
+    JSONRenderer,
+    BrowsableAPIRenderer,
+    HeatmapColumnarRenderer,
+    HeatmapBinaryRenderer
+])
 def heatmap(request):
     """
     GET /api/predict/heatmap/?lat=5.125&lon=7.356
     Generate 24-hour prediction heatmap
 
-    Returns grid of predictions for visualization
+    Returns grid of predictions for visualization.
+    Centres are snapped to a ~55m grid and cached per model version and
+    weekday (see heatmap_cache).
+
+    Optional query params:
+    - resolution: grid points per side (2-100, default 10)
+    - radius: half-width of the grid in meters (50-2000, default ~550)
+    - refine: risk-gradient threshold for progressive refinement. A coarse
+      grid is evaluated and only cells whose risk changes by more than this
+      are refined; the rest is interpolated. Defaults to 0.05 above
+      20x20, off (dense grid) otherwise.
+
+    Response format follows the Accept header:
+    - application/json: list of per-point dicts (default)
+    - application/vnd.eve.heatmap+json: axes + [hour][lat][lon] risk array
+    - application/vnd.eve.heatmap+binary: packed float16 grid (see renderers.py)
     """
     if not threat_predictor:
         return Response(
@@ -588,24 +764,96 @@ def heatmap(request):
         )
 
     try:
+        resolution = int(request.query_params.get('resolution', 10))
+        radius = request.query_params.get('radius')
+        radius_degrees = float(radius) / 111000 if radius else 0.005
+        refine = request.query_params.get('refine')
+        if refine is not None:
+            refine_threshold = float(refine)
+        elif resolution > HEATMAP_DENSE_MAX_RESOLUTION:
+            refine_threshold = HEATMAP_DEFAULT_REFINE_THRESHOLD
+        else:
+            refine_threshold = None
+    except ValueError:
+        return Response(
+            {"error": "resolution, radius and refine must be numbers"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not (2 <= resolution <= HEATMAP_MAX_RESOLUTION):
+        return Response(
+            {"error": f"resolution must be between 2 and {HEATMAP_MAX_RESOLUTION}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if radius and not (50 <= float(radius) <= 2000):
+        return Response(
+            {"error": "radius must be between 50 and 2000 meters"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        # Nearby centres share one cached heatmap
+        center_lat = heatmap_cache.snap(float(lat))
+        center_lon = heatmap_cache.snap(float(lon))
+        day_of_week = datetime.now().weekday()
+
         # Generate grid predictions around this point
-        predictions = threat_predictor.predict_24h_grid(
-            float(lat), 
-            float(lon)
+        grid, _ = heatmap_cache.get_or_compute(
+            center_lat,
+            center_lon,
+            threat_predictor.model_version,
+            day_of_week,
+            lambda: threat_predictor.predict_24h_risk(
+                center_lat,
+                center_lon,
+                radius_degrees=radius_degrees,
+                grid_points=resolution,
+                day_of_week=day_of_week,
+                refine_threshold=refine_threshold
+            ),
+            radius_degrees=radius_degrees,
+            variant=f"{resolution}:{refine_threshold}"
         )
-        return Response(predictions, status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
             {"error": f"Heatmap generation failed: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-    
-    
 
+    if prediction_logger.sampled():
+        _log_heatmap_sample(grid, day_of_week)
 
+    # Compact renderers encode the grid directly
+    if isinstance(request.accepted_renderer, (HeatmapColumnarRenderer, HeatmapBinaryRenderer)):
+        return Response(grid, status=status.HTTP_200_OK)
 
+    return Response(ThreatPredictor.grid_to_points(grid), status=status.HTTP_200_OK)
 
 
+def _log_heatmap_sample(grid, day_of_week):
+    """
+    Queue a random handful of heatmap cells for accuracy tracking
+
+    Only cells the model evaluated are logged; interpolated ones aren't
+    predictions.
+    """
+    risk = grid['risk']
+    evaluated = grid.get('evaluated')
+    if evaluated is None:
+        return  # Cached before grids recorded it
+    points = np.flatnonzero(evaluated)
+    choices = 24 * len(points)
+    cells = np.random.choice(choices, min(settings.PREDICTION_LOG_HEATMAP_CELLS, choices), replace=False)
+    hours, point_idx = np.divmod(cells, len(points))
+    lat_idx, lon_idx = np.unravel_index(points[point_idx], evaluated.shape)
+    prediction_logger.log_many(
+        grid['latitudes'][lat_idx],
+        grid['longitudes'][lon_idx],
+        [next_occurrence(h, day_of_week) for h in hours.tolist()],
+        risk[hours, lat_idx, lon_idx]
+    )
+
 
 @api_view(['POST'])
 def generate_crime_zones_api(request):
@@ -1152,7 +1400,9 @@ def suggest_safe_route(request):
     POST /api/safety/suggest-route/
     
     Suggests the safest route between two points based on threat predictions.
-    Logs predictions and route analysis to database.
+    Routes along the walking graph (`manage.py build_route_graph`) when it is
+    built, otherwise along the straight line. Logs predictions and route
+    analysis to database.
     
     Request body:
     {
@@ -1175,6 +1425,12 @@ def suggest_safe_route(request):
             {"lat": 5.127, "lon": 7.358, "risk": 35, "confidence": "High"},
             {"lat": 5.130, "lon": 7.360, "risk": 25, "confidence": "Medium"}
         ],
+        "routes": [  // graph routes, safest first (empty on straight-line fallback)
+            {"distance_km": 1.8, "average_risk": 21, "maximum_risk": 64, "points": [...]}
+        ],
+        "danger_zone_crossings": [  // zones (risk >= 60) the route passes through
+            {"zone_id": 3, "name": "Market Road", "risk_level": 80, "entry_m": 420.5, "exit_m": 610.0, ...}
+        ],
         "safe_zones_nearby": [
             {"name": "Police Station", "lat": 5.126, "lon": 7.357, "distance_m": 150}
         ],
@@ -1232,7 +1488,6 @@ def suggest_safe_route(request):
         hour = datetime.now().hour
         day_of_week = datetime.now().weekday()
     
-    # Generate waypoints (simple linear interpolation for now)
     num_waypoints = 5
     waypoints = []
     
@@ -1246,31 +1501,59 @@ def suggest_safe_route(request):
     else:
         prediction_datetime = timezone.now()
     
-    for i in range(num_waypoints + 1):
-        t = i / num_waypoints
-        lat = start_lat + t * (end_lat - start_lat)
-        lon = start_lon + t * (end_lon - start_lon)
-        
-        # Get prediction for this waypoint
-        prediction = threat_predictor.predict(lat, lon, hour, day_of_week)
-        
+    # Route along the walking graph when one is built, else a straight line.
+    # With a risk table, edges are scored for the departure hour without
+    # running the model.
+    edge_risk = route_graph.risk_table.column(hour, day_of_week) if route_graph else None
+    routes = route_graph.routes(
+        start_lat, start_lon, end_lat, end_lon, k=3, edge_risk=edge_risk
+    ) if route_graph else []
+    waypoint_risk = None
+
+    if routes:
+        best = routes[0]
+        route_points = [
+            {'lat': round(lat, 6), 'lon': round(lon, 6)}
+            for lat, lon in zip(best['latitudes'].tolist(), best['longitudes'].tolist())
+        ]
+        distance_km = best['length_m'] / 1000
+        waypoint_lats, waypoint_lons, waypoint_risk = route_graph.sample_route(
+            best, num_waypoints + 1, edge_risk
+        )
+    else:
+        t = np.linspace(0, 1, num_waypoints + 1)
+        waypoint_lats = start_lat + t * (end_lat - start_lat)
+        waypoint_lons = start_lon + t * (end_lon - start_lon)
+        route_points = None
+        distance_km = float(haversine_m(start_lat, start_lon, end_lat, end_lon)) / 1000
+
+    if waypoint_risk is None:
+        # One batched prediction for every waypoint
+        waypoint_risk = threat_predictor.predict_batch(
+            waypoint_lats, waypoint_lons, hour, day_of_week
+        )
+
+    for lat, lon, risk_prob in zip(
+        waypoint_lats.tolist(), waypoint_lons.tolist(), waypoint_risk.tolist()
+    ):
+        risk_probability = round(risk_prob, 3)
+        risk_percentage = round(risk_prob * 100, 1)
+
         waypoints.append({
             'latitude': round(lat, 6),
             'longitude': round(lon, 6),
-            'risk_probability': prediction['risk_probability'],
-            'risk_percentage': prediction['risk_percentage'],
-            'confidence': prediction['confidence']
+            'risk_probability': risk_probability,
+            'risk_percentage': risk_percentage,
+            'confidence': ThreatPredictor.confidence_level(risk_prob)
         })
-        
-        # LOG PREDICTION TO DATABASE
-        from apps.prediction.models import ThreatPrediction
-        ThreatPrediction.objects.create(
-            location=Point(lon, lat, srid=4326),
-            prediction_for_datetime=prediction_datetime,
-            predicted_risk_score=prediction['risk_percentage'],
-            prediction_confidence=prediction['risk_probability'] * 100,
-            incident_type_predicted='General Threat'
-        )
+
+    # LOG PREDICTIONS (written in the background)
+    prediction_logger.log_many(
+        [w['latitude'] for w in waypoints],
+        [w['longitude'] for w in waypoints],
+        prediction_datetime,
+        [w['risk_probability'] for w in waypoints]
+    )
     
     # Calculate overall route risk
     avg_risk = sum(w['risk_probability'] for w in waypoints) / len(waypoints)
@@ -1309,13 +1592,20 @@ def suggest_safe_route(request):
     if hour >= 22 or hour <= 5:
         recommendations.append("🌙 Night time travel - extra caution advised")
         # Calculate daytime risk
-        daytime_predictions = [
-            threat_predictor.predict(w['latitude'], w['longitude'], 14, day_of_week)
-            for w in waypoints
-        ]
-        daytime_avg = sum(p['risk_probability'] for p in daytime_predictions) / len(daytime_predictions)
-        if daytime_avg < avg_risk * 0.7:
-            recommendations.append(f"💡 Traveling at 2 PM would reduce risk by {int((avg_risk - daytime_avg)*100)}%")
+        if routes and edge_risk is not None:
+            current_avg = best['risk']
+            daytime_avg = route_graph.route_risk(best, route_graph.risk_table.column(14, day_of_week))
+        else:
+            current_avg = avg_risk
+            daytime_risk = threat_predictor.predict_batch(
+                [w['latitude'] for w in waypoints],
+                [w['longitude'] for w in waypoints],
+                14,
+                day_of_week
+            )
+            daytime_avg = float(np.round(daytime_risk, 3).mean())
+        if daytime_avg < current_avg * 0.7:
+            recommendations.append(f"💡 Traveling at 2 PM would reduce risk by {int((current_avg - daytime_avg)*100)}%")
     
     if safe_zones:
         recommendations.append(f"✅ {len(safe_zones)} safe zone(s) available along route")
@@ -1330,20 +1620,23 @@ def suggest_safe_route(request):
     # Calculate safety score (inverse of risk)
     safety_score = int((1 - avg_risk) * 100)
     
-    # Estimate travel time (rough calculation)
-    from math import radians, cos, sin, asin, sqrt
-    
-    def haversine(lon1, lat1, lon2, lat2):
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        km = 6371 * c
-        return km
-    
-    distance_km = haversine(start_lon, start_lat, end_lon, end_lat)
+    # Estimate travel time
     estimated_time = int(distance_km / 4 * 60)  # Assuming 4 km/h walking speed
+
+    # Alternatives, scored by their static edge risk
+    alternative_routes = [
+        {
+            'distance_km': round(r['length_m'] / 1000, 2),
+            'estimated_travel_time_minutes': int(r['length_m'] / 1000 / 4 * 60),
+            'average_risk': round(r['risk'] * 100, 1),
+            'maximum_risk': round(r['max_risk'] * 100, 1),
+            'points': [
+                {'lat': round(lat, 6), 'lon': round(lon, 6)}
+                for lat, lon in zip(r['latitudes'].tolist(), r['longitudes'].tolist())
+            ]
+        }
+        for r in routes
+    ]
     
     # LOG ROUTE ANALYSIS TO DATABASE
     from apps.prediction.models import RouteAnalysis
@@ -1356,15 +1649,13 @@ def suggest_safe_route(request):
         except UserProfile.DoesNotExist:
             pass
     
-    # Count danger zones crossed
-    danger_zones_count = 0
-    for waypoint in waypoints:
-        wp_point = Point(waypoint['longitude'], waypoint['latitude'], srid=4326)
-        nearby_danger = CrimeZone.objects.filter(
-            location__distance_lte=(wp_point, D(m=100)),
-            risk_level__gte=60
-        ).count()
-        danger_zones_count += nearby_danger
+    # Danger zones crossed, per segment of the full route polyline
+    if routes:
+        polyline_lats, polyline_lons = best['latitudes'], best['longitudes']
+    else:
+        polyline_lats, polyline_lons = [start_lat, end_lat], [start_lon, end_lon]
+    danger_zone_crossings = zone_index.crossings(polyline_lats, polyline_lons, min_risk=60)
+    danger_zones_count = len(danger_zone_crossings)
     
     # Count predicted threats (high risk waypoints)
     predicted_threats_count = sum(1 for w in waypoints if w['risk_probability'] > 0.6)
@@ -1373,7 +1664,7 @@ def suggest_safe_route(request):
         user_profile=user_profile,
         start_location=Point(start_lon, start_lat, srid=4326),
         end_location=Point(end_lon, end_lat, srid=4326),
-        route_points=[{'lat': w['latitude'], 'lon': w['longitude']} for w in waypoints],
+        route_points=route_points or [{'lat': w['latitude'], 'lon': w['longitude']} for w in waypoints],
         total_distance_meters=int(distance_km * 1000),
         estimated_duration_minutes=estimated_time,
         risk_score=round(avg_risk * 100, 1),
@@ -1388,7 +1679,10 @@ def suggest_safe_route(request):
             "safety_score": safety_score,
             "distance_km": round(distance_km, 2)
         },
+        "routing": "graph" if routes else "straight_line",
         "waypoints": waypoints,
+        "routes": alternative_routes,
+        "danger_zone_crossings": danger_zone_crossings,
         "safe_zones_nearby": safe_zones,
         "recommendations": recommendations,
         "overall_safety_score": safety_score,
@@ -1473,10 +1767,8 @@ def nearby_safe_zones(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Get current risk
     current_hour = datetime.now().hour
     current_day = datetime.now().weekday()
-    current_prediction = threat_predictor.predict(lat, lon, current_hour, current_day)
     
     # Find nearby safe zones
     from django.contrib.gis.geos import Point
@@ -1492,10 +1784,20 @@ def nearby_safe_zones(request):
         location__distance_lte=(user_location, D(m=radius)),
         risk_level__lte=40  # Only relatively safe zones
     ).order_by('distance')[:5]
+    nearby_zones = list(nearby_zones)
+
+    # Current location + every zone in one batched prediction
+    batch_risk = threat_predictor.predict_batch(
+        [lat] + [zone.location.y for zone in nearby_zones],
+        [lon] + [zone.location.x for zone in nearby_zones],
+        current_hour,
+        current_day
+    )
+    current_risk = float(batch_risk[0])
     
     safe_zones = []
     
-    for zone in nearby_zones:
+    for zone, zone_risk in zip(nearby_zones, batch_risk[1:].tolist()):
         distance_m = zone.location.distance(user_location) * 111000
         
         # Calculate bearing
@@ -1511,14 +1813,6 @@ def nearby_safe_zones(request):
         directions = ['North', 'Northeast', 'East', 'Southeast', 'South', 'Southwest', 'West', 'Northwest']
         direction = directions[int((bearing_deg + 22.5) / 45) % 8]
         
-        # Get prediction for this zone
-        zone_prediction = threat_predictor.predict(
-            zone.location.y, 
-            zone.location.x, 
-            current_hour, 
-            current_day
-        )
-        
         safe_zones.append({
             'name': zone.name,
             'latitude': zone.location.y,
@@ -1527,8 +1821,8 @@ def nearby_safe_zones(request):
             'bearing_degrees': round(bearing_deg, 1),
             'direction': direction,
             'risk_level': zone.risk_level,
-            'predicted_risk': zone_prediction['risk_percentage'],
-            'confidence': zone_prediction['confidence'],
+            'predicted_risk': round(zone_risk * 100, 1),
+            'confidence': ThreatPredictor.confidence_level(zone_risk),
             'directions': f"Head {direction.lower()} for {int(distance_m)}m"
         })
     
@@ -1543,8 +1837,8 @@ def nearby_safe_zones(request):
         "current_location": {
             "latitude": lat,
             "longitude": lon,
-            "current_risk": current_prediction['risk_percentage'],
-            "confidence": current_prediction['confidence']
+            "current_risk": round(current_risk * 100, 1),
+            "confidence": ThreatPredictor.confidence_level(current_risk)
         },
         "safe_zones": safe_zones,
         "escape_recommendation": escape_rec,
@@ -1812,6 +2106,10 @@ def report_incident(request):
         verified=False,  # Needs verification
         description=description
     )
+
+    # Make the new incident visible to location risk straight away
+    if threat_predictor:
+        threat_predictor.incident_index.add(latitude, longitude, incident.id)
     
     # If user is authenticated and not anonymous, we could link it
     # (Currently not linking to preserve privacy)
@@ -2004,7 +2302,8 @@ def prediction_accuracy(request):
     GET /api/safety/prediction-accuracy/
     
     Check how accurate our predictions have been.
-    Compares ThreatPredictions with actual IncidentReports.
+    Reads the totals kept by `manage.py verify_predictions`, which compares
+    ThreatPredictions with actual IncidentReports in the background.
     
     Returns:
     {
@@ -2015,84 +2314,26 @@ def prediction_accuracy(request):
         "false_positives": 97,
         "false_negatives": 45,
         "confidence_breakdown": {
-            "Very High": {"accuracy": 92.3, "count": 150},
-            "High": {"accuracy": 85.1, "count": 200},
-            "Medium": {"accuracy": 72.5, "count": 100}
-        }
+            "Very High": {"accuracy": 92.3, "count": 150, "verified": 150},
+            "High": {"accuracy": 85.1, "count": 200, "verified": 200},
+            "Medium": {"accuracy": null, "count": 100, "verified": 0}
+        },
+        "verified_through": "2024-12-18T16:00:00Z"
     }
     """
-    from apps.prediction.models import ThreatPrediction, IncidentReport
-    from django.db.models import Q
-    
-    # Get all predictions that have passed their prediction time
-    past_predictions = ThreatPrediction.objects.filter(
-        prediction_for_datetime__lt=timezone.now()
-    )
-    
-    total_predictions = past_predictions.count()
-    
-    if total_predictions == 0:
+    from apps.prediction.models import PredictionAccuracyState
+    from apps.prediction.verification import accuracy_summary
+
+    state = PredictionAccuracyState.objects.first()
+
+    if state is None or state.total_predictions == 0:
         return Response({
             "message": "No predictions to verify yet",
             "overall_accuracy": 0,
             "total_predictions": 0
         }, status=status.HTTP_200_OK)
-    
-    # Check each prediction against actual incidents
-    correct = 0
-    false_positives = 0
-    false_negatives = 0
-    
-    for prediction in past_predictions[:500]:  # Limit to 500 for performance
-        # Check if incident occurred near predicted location and time
-        time_window_start = prediction.prediction_for_datetime - timedelta(hours=1)
-        time_window_end = prediction.prediction_for_datetime + timedelta(hours=1)
-        
-        nearby_incidents = IncidentReport.objects.filter(
-            occurred_at__gte=time_window_start,
-            occurred_at__lte=time_window_end,
-            location__distance_lte=(prediction.location, D(m=500))
-        )
-        
-        actual_incidents_count = nearby_incidents.count()
-        
-        # Update prediction
-        if prediction.actual_incidents_count != actual_incidents_count:
-            prediction.actual_incidents_count = actual_incidents_count
-            
-            # Determine if prediction was accurate
-            # High risk prediction (>60) should have incidents
-            # Low risk prediction (<40) should not have incidents
-            if prediction.predicted_risk_score > 60:
-                prediction.was_accurate = actual_incidents_count > 0
-                if prediction.was_accurate:
-                    correct += 1
-                else:
-                    false_positives += 1
-            elif prediction.predicted_risk_score < 40:
-                prediction.was_accurate = actual_incidents_count == 0
-                if prediction.was_accurate:
-                    correct += 1
-                else:
-                    false_negatives += 1
-            else:
-                # Medium risk - harder to judge
-                prediction.was_accurate = None
-            
-            prediction.save()
-    
-    # Calculate accuracy
-    verified = past_predictions.filter(was_accurate__isnull=False).count()
-    correct_count = past_predictions.filter(was_accurate=True).count()
-    
-    accuracy = (correct_count / verified * 100) if verified > 0 else 0
-    
+
     return Response({
-        "overall_accuracy": round(accuracy, 1),
-        "total_predictions": total_predictions,
-        "verified_predictions": verified,
-        "correct_predictions": correct_count,
-        "false_positives": false_positives,
-        "false_negatives": false_negatives,
+        **accuracy_summary(state),
         "note": "Predictions are verified against actual incident reports within 1 hour and 500m radius"
     }, status=status.HTTP_200_OK)
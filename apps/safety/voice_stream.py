@@ -0,0 +1,158 @@
+"""
+Streaming voice monitoring
+
+Clients send short chunks of raw audio (PCM16, mono, 16 kHz) over a
+keep-alive connection instead of uploading a finished clip. Each session
+keeps a sliding window of recent audio, re-transcribes it whenever at
+least STEP_SECONDS of new audio has arrived and runs keyword spotting on
+the partial transcript, so a Voice alert goes out while the user is still
+speaking.
+
+Sessions live in process memory: deployments with several workers need
+sticky routing on the session id.
+"""
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from .audio_services import AudioAnalyzer
+from .audio_jobs import create_voice_crisis_alert
+
+
+class VoiceStreamSession:
+    """
+    Sliding audio window for one streaming client
+    """
+    WINDOW_SECONDS = 5.0  # Audio re-transcribed on each step
+    STEP_SECONDS = 1.0    # New audio needed before the next transcription
+
+    def __init__(self, user_profile=None):
+        self.id = uuid.uuid4()
+        self.user_profile = user_profile
+        self.sample_rate = AudioAnalyzer.SAMPLE_RATE
+
+        self.window = np.zeros(int(self.WINDOW_SECONDS * self.sample_rate), dtype=np.float32)
+        self.filled = 0           # Valid samples at the end of the window
+        self.pending = 0          # Samples received since the last transcription
+        self.total_samples = 0
+        self.leftover = b''       # Odd trailing byte of the last chunk
+
+        self.transcript = ''
+        self.keywords_found = []
+        self.alert = None
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    def push(self, pcm_bytes):
+        """
+        Append a chunk of PCM16 audio and transcribe if a step is due
+
+        Chunks needn't end on a sample boundary; an odd trailing byte is
+        held back and joined to the next chunk.
+
+        Args:
+            pcm_bytes: Raw little-endian int16 mono samples at 16 kHz
+
+        Returns:
+            Dict with the latest partial transcript and alert state
+        """
+        with self.lock:
+            if self.leftover:
+                pcm_bytes = self.leftover + pcm_bytes
+            usable = len(pcm_bytes) - len(pcm_bytes) % 2
+            self.leftover = pcm_bytes[usable:]
+            samples = np.frombuffer(pcm_bytes, dtype='<i2', count=usable // 2)
+
+            self.last_seen = time.monotonic()
+            self._append(samples.astype(np.float32) / 32768.0)
+
+            new_keywords = []
+            if self.pending >= self.STEP_SECONDS * self.sample_rate:
+                new_keywords = self._transcribe_window()
+
+            return {
+                'session_id': str(self.id),
+                'audio_seconds': round(self.total_samples / self.sample_rate, 2),
+                'partial_transcript': self.transcript,
+                'new_keywords': new_keywords,
+                'keywords_found': list(self.keywords_found),
+                'crisis_detected': bool(self.keywords_found),
+                'alert_created': self.alert is not None,
+                'alert_id': self.alert.id if self.alert else None
+            }
+
+    def _append(self, audio):
+        size = len(self.window)
+        if len(audio) >= size:
+            self.window[:] = audio[-size:]
+        else:
+            # Shift the window left and write the chunk at the end
+            self.window[:-len(audio) or None] = self.window[len(audio):]
+            self.window[size - len(audio):] = audio
+
+        self.filled = min(size, self.filled + len(audio))
+        self.pending += len(audio)
+        self.total_samples += len(audio)
+
+    def _transcribe_window(self):
+        self.pending = 0
+        audio = self.window[len(self.window) - self.filled:]
+
+        # Windows are short and overlap, so don't carry context between them
+        transcription = AudioAnalyzer.transcribe_array(
+            audio, fp16=False, condition_on_previous_text=False
+        )
+        self.transcript = transcription['text']
+
+        detection = AudioAnalyzer.detect_crisis(self.transcript)
+        new_keywords = [
+            keyword for keyword in detection['keywords_found']
+            if keyword not in self.keywords_found
+        ]
+        self.keywords_found.extend(new_keywords)
+
+        # One alert per session; later windows re-hear the same words
+        if new_keywords and self.alert is None and self.user_profile:
+            self.alert = create_voice_crisis_alert(self.user_profile, {
+                'transcript': self.transcript,
+                'keywords_found': self.keywords_found
+            })
+
+        return new_keywords
+
+
+class VoiceStreamRegistry:
+    """
+    Process-local store of open streaming sessions
+    """
+    SESSION_TTL = 60  # Seconds without a chunk before a session is dropped
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def open(cls, user_profile=None):
+        session = VoiceStreamSession(user_profile)
+        with cls._lock:
+            cls._expire()
+            cls._sessions[session.id] = session
+        return session
+
+    @classmethod
+    def get(cls, session_id):
+        with cls._lock:
+            cls._expire()
+            return cls._sessions.get(session_id)
+
+    @classmethod
+    def close(cls, session_id):
+        with cls._lock:
+            return cls._sessions.pop(session_id, None)
+
+    @classmethod
+    def _expire(cls):
+        cutoff = time.monotonic() - cls.SESSION_TTL
+        for session_id in [sid for sid, s in cls._sessions.items() if s.last_seen < cutoff]:
+            del cls._sessions[session_id]
@@ -0,0 +1,217 @@
+"""
+In-memory index over crime zones
+
+Zones change rarely but are looked up on every GPS tick, so each process
+keeps a haversine BallTree of them instead of asking PostGIS each time.
+"""
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.prediction.db_functions import PointX, PointY
+from .models import CrimeZone
+
+
+EARTH_RADIUS_M = 6371008.8
+
+Zone = namedtuple('Zone', ['id', 'name', 'latitude', 'longitude', 'risk_level', 'radius'])
+
+
+class ZoneIndex:
+    """
+    Process-local snapshot of CrimeZone rows
+
+    Saves and deletes in this process mark the index stale straight away
+    (via signals); changes made elsewhere, or through bulk operations, are
+    picked up by a reload at most REFRESH_INTERVAL seconds later.
+    """
+    REFRESH_INTERVAL = 60  # Seconds between reloads
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._loaded_at = None
+        self._stale = True
+        self.zones = []
+        self.latitudes = np.empty(0)
+        self.longitudes = np.empty(0)
+        self.risk_levels = np.empty(0)
+        self.radii = np.empty(0)
+
+    def __len__(self):
+        self._ensure_fresh()
+        return len(self.zones)
+
+    def load(self):
+        """
+        (Re)load every zone from the database
+        """
+        rows = list(CrimeZone.objects.annotate(
+            lat=PointY('location'), lon=PointX('location')
+        ).values_list('id', 'name', 'lat', 'lon', 'risk_level', 'radius'))
+
+        zones = [Zone(*row) for row in rows]
+        latitudes = np.array([z.latitude for z in zones], dtype=np.float64)
+        longitudes = np.array([z.longitude for z in zones], dtype=np.float64)
+
+        tree = None
+        if zones:
+            tree = BallTree(np.radians(np.column_stack([latitudes, longitudes])), metric='haversine')
+
+        with self._lock:
+            self.zones = zones
+            self.latitudes = latitudes
+            self.longitudes = longitudes
+            self.risk_levels = np.array([z.risk_level for z in zones], dtype=np.float64)
+            self.radii = np.array([z.radius for z in zones], dtype=np.float64)
+            self._tree = tree
+            self._loaded_at = time.monotonic()
+            self._stale = False
+
+        return self
+
+    def invalidate(self):
+        self._stale = True
+
+    def _ensure_fresh(self):
+        if self._stale or time.monotonic() - self._loaded_at > self.REFRESH_INTERVAL:
+            self.load()
+
+    def nearest(self, latitude, longitude):
+        """
+        Closest zone to a point
+
+        Returns:
+            (Zone, distance_m), or (None, None) if there are no zones
+        """
+        self._ensure_fresh()
+        tree = self._tree
+        if tree is None:
+            return None, None
+
+        dist, idx = tree.query(np.radians([[latitude, longitude]]), k=1)
+        return self.zones[idx[0, 0]], float(dist[0, 0] * EARTH_RADIUS_M)
+
+    def within(self, latitude, longitude, radius_m):
+        """
+        Zones whose centre is within radius_m of a point
+
+        Returns:
+            List of (Zone, distance_m), nearest first
+        """
+        self._ensure_fresh()
+        tree = self._tree
+        if tree is None:
+            return []
+
+        idx, dist = tree.query_radius(
+            np.radians([[latitude, longitude]]), r=radius_m / EARTH_RADIUS_M,
+            return_distance=True, sort_results=True
+        )
+        return [(self.zones[i], float(d * EARTH_RADIUS_M)) for i, d in zip(idx[0], dist[0])]
+
+    def crossings(self, latitudes, longitudes, min_risk=60):
+        """
+        Where a polyline passes through zones (buffered by their radius)
+
+        Each segment is intersected with every candidate zone's disc in a
+        local equirectangular projection; consecutive segments inside the
+        same zone merge into one crossing.
+
+        Args:
+            latitudes, longitudes: Route vertices, in order
+            min_risk: Only zones with risk_level >= this
+
+        Returns:
+            List of crossings ordered by entry distance:
+            {
+                'zone_id': 3, 'name': 'Market Road', 'risk_level': 80,
+                'entry_m': 420.5,       # distance along the route
+                'exit_m': 610.0,
+                'first_segment': 4,     # index of the segment entered on
+                'last_segment': 6
+            }
+        """
+        self._ensure_fresh()
+        tree = self._tree
+        lats = np.asarray(latitudes, dtype=np.float64)
+        lons = np.asarray(longitudes, dtype=np.float64)
+        if tree is None or len(lats) < 2:
+            return []
+
+        # Candidate zones: centres within reach of any route vertex
+        lat0, lon0 = lats.mean(), lons.mean()
+        x = EARTH_RADIUS_M * np.cos(np.radians(lat0)) * np.radians(lons - lon0)
+        y = EARTH_RADIUS_M * np.radians(lats - lat0)
+        reach = float(np.hypot(x, y).max() + self.radii.max())
+        idx = tree.query_radius(np.radians([[lat0, lon0]]), r=reach / EARTH_RADIUS_M)[0]
+        idx = idx[self.risk_levels[idx] >= min_risk]
+        if not len(idx):
+            return []
+
+        cx = EARTH_RADIUS_M * np.cos(np.radians(lat0)) * np.radians(self.longitudes[idx] - lon0)
+        cy = EARTH_RADIUS_M * np.radians(self.latitudes[idx] - lat0)
+        r = self.radii[idx]
+
+        # Segment i runs from vertex i to i+1; shapes are (segments, zones)
+        ax, ay = x[:-1, None], y[:-1, None]
+        dx, dy = (x[1:] - x[:-1])[:, None], (y[1:] - y[:-1])[:, None]
+        fx, fy = ax - cx, ay - cy
+        a = dx * dx + dy * dy
+        b = 2 * (dx * fx + dy * fy)
+        c = fx * fx + fy * fy - r * r
+        disc = b * b - 4 * a * c
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            root = np.sqrt(np.maximum(disc, 0))
+            t_in = np.where(a > 0, (-b - root) / (2 * a), 0.0)
+            t_out = np.where(a > 0, (-b + root) / (2 * a), 1.0)
+        t_in = np.clip(t_in, 0, 1)
+        t_out = np.clip(t_out, 0, 1)
+        inside = np.where(a > 0, (disc >= 0) & (t_out > t_in), c <= 0)
+
+        seg_len = np.hypot(dx, dy)[:, 0]
+        start_m = np.concatenate([[0.0], np.cumsum(seg_len)[:-1]])
+
+        crossings = []
+        for zone_col in np.flatnonzero(inside.any(axis=0)):
+            zone = self.zones[idx[zone_col]]
+            current = None
+            for seg in np.flatnonzero(inside[:, zone_col]).tolist():
+                entry = start_m[seg] + t_in[seg, zone_col] * seg_len[seg]
+                exit_ = start_m[seg] + t_out[seg, zone_col] * seg_len[seg]
+                # Still inside from the previous segment
+                if current and current['last_segment'] == seg - 1 and entry - current['exit_m'] < 1.0:
+                    current['exit_m'] = exit_
+                    current['last_segment'] = seg
+                    continue
+                current = {
+                    'zone_id': zone.id,
+                    'name': zone.name,
+                    'risk_level': zone.risk_level,
+                    'entry_m': entry,
+                    'exit_m': exit_,
+                    'first_segment': seg,
+                    'last_segment': seg,
+                }
+                crossings.append(current)
+
+        for crossing in crossings:
+            crossing['entry_m'] = round(float(crossing['entry_m']), 1)
+            crossing['exit_m'] = round(float(crossing['exit_m']), 1)
+        crossings.sort(key=lambda c: c['entry_m'])
+        return crossings
+
+
+zone_index = ZoneIndex()
+
+
+@receiver(post_save, sender=CrimeZone)
+@receiver(post_delete, sender=CrimeZone)
+def _invalidate_zone_index(sender, **kwargs):
+    zone_index.invalidate()
@@ -191,11 +191,15 @@ export const getHeatmap = async (centerLat = 5.125086, centerLon = 7.356695) =>
   try {
     if (USE_MOCK) return MOCK_HEATMAP_DATA;
 
+    // Columnar format: axes once + [hour][lat][lon] risk array
     const response = await fetch(
       `${BASE_URL}/safety/heatmap/?lat=${centerLat}&lon=${centerLon}`,
       {
         method: 'GET',
-        headers: getHeaders(),
+        headers: {
+          ...getHeaders(),
+          'Accept': 'application/vnd.eve.heatmap+json',
+        },
       }
     );
 
@@ -203,8 +207,25 @@ export const getHeatmap = async (centerLat = 5.125086, centerLon = 7.356695) =>
       throw new Error(`HTTP error! status: ${response.status}`);
     }
 
-    const data = await response.json();
-    return data;
+    const grid = await response.json();
+
+    // Expand to the per-point list the heatmap components use
+    const points = [];
+    grid.hours.forEach((hour, h) => {
+      grid.latitudes.forEach((latitude, i) => {
+        grid.longitudes.forEach((longitude, j) => {
+          const risk = grid.risk[h][i][j];
+          points.push({
+            latitude,
+            longitude,
+            hour,
+            risk_probability: risk,
+            risk_percentage: Math.round(risk * 1000) / 10,
+          });
+        });
+      });
+    });
+    return points;
   } catch (error) {
     console.error('Error fetching heatmap:', error);
     throw error;
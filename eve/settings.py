@@ -98,6 +98,26 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'eve-default',
+    },
+    # Heatmap responses (apps/safety/heatmap_cache.py); LocMemCache evicts LRU
+    'heatmap': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'eve-heatmap',
+        'TIMEOUT': 60 * 60,  # 1 hour
+        'OPTIONS': {
+            'MAX_ENTRIES': 500,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -178,3 +198,42 @@ SIMPLE_JWT = {
 }
 
 AUTH_USER_MODEL = 'accounts.User'
+
+# Audio analysis worker threads per process (apps/safety/audio_jobs.py)
+AUDIO_ANALYSIS_WORKERS = config('AUDIO_ANALYSIS_WORKERS', default=2, cast=int)
+
+# Whisper transcription (apps/safety/audio_services.py)
+# Model size: tiny / base / small - smaller is faster, larger is more accurate
+WHISPER_MODEL_SIZE = config('WHISPER_MODEL_SIZE', default='base')
+# Models per process; also the cap on concurrent transcriptions
+WHISPER_POOL_SIZE = config('WHISPER_POOL_SIZE', default=1, cast=int)
+# int8 dynamic quantization for CPU inference
+WHISPER_INT8 = config('WHISPER_INT8', default=False, cast=bool)
+# Load the pool when the worker starts instead of on the first request
+WHISPER_PRELOAD = config('WHISPER_PRELOAD', default=True, cast=bool)
+
+# Per-language crisis keywords and weights (apps/safety/keyword_matcher.py)
+CRISIS_KEYWORDS_FILE = config(
+    'CRISIS_KEYWORDS_FILE',
+    default=str(BASE_DIR / 'apps' / 'safety' / 'crisis_keywords.json')
+)
+
+# Location history retention (`manage.py prune_location_history`)
+# Fixes older than this are downsampled to one per user per minute
+LOCATION_RAW_RETENTION_DAYS = config('LOCATION_RAW_RETENTION_DAYS', default=7, cast=int)
+# Fixes older than this are dropped
+LOCATION_HISTORY_HORIZON_DAYS = config('LOCATION_HISTORY_HORIZON_DAYS', default=90, cast=int)
+
+# Prediction logging for accuracy tracking (apps/prediction/prediction_logger.py)
+# Share of predict_threat / heatmap requests whose predictions are logged
+PREDICTION_LOG_SAMPLE_RATE = config('PREDICTION_LOG_SAMPLE_RATE', default=0.1, cast=float)
+# Heatmap cells logged per sampled request
+PREDICTION_LOG_HEATMAP_CELLS = config('PREDICTION_LOG_HEATMAP_CELLS', default=25, cast=int)
+
+# ML artifacts
+# Location-risk raster tiles (built by `manage.py build_risk_raster`)
+LOCATION_RISK_RASTER_DIR = BASE_DIR / 'ml' / 'risk_raster'
+# Walking graph for safe routing (built by `manage.py build_route_graph`)
+ROUTE_GRAPH_PATH = BASE_DIR / 'ml' / 'route_graph.npz'
+# Hour-of-week edge risk for the graph (built nightly by `manage.py build_route_risk`)
+ROUTE_RISK_TABLE_PATH = BASE_DIR / 'ml' / 'route_risk.npy'
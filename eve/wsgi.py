@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eve.settings')
 
 application = get_wsgi_application()
+
+# Only server processes load Whisper up front
+from apps.safety.apps import start_whisper_preload  # noqa: E402
+
+start_whisper_preload()
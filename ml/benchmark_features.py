@@ -0,0 +1,88 @@
+"""
+Benchmark location_risk feature engineering: old iterrows loop vs KD-tree join
+
+Usage:
+    python ml/benchmark_features.py
+    python ml/benchmark_features.py --sizes 10000 100000 1000000 --legacy-rows 200
+
+The legacy loop is O(n) per row, so for large n it is timed on the first
+--legacy-rows rows and extrapolated (marked with ~).
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+from ml.neighbours import count_box_neighbours
+
+
+def make_incidents(n, seed=0):
+    """
+    Synthetic city: clustered hotspots plus uniform background noise
+    """
+    rng = np.random.default_rng(seed)
+    hotspots = rng.uniform([5.05, 7.30], [5.20, 7.45], size=(50, 2))
+    clustered = int(n * 0.8)
+    centres = hotspots[rng.integers(0, len(hotspots), clustered)]
+    points = np.vstack([
+        centres + rng.normal(0, 0.003, size=(clustered, 2)),
+        rng.uniform([5.05, 7.30], [5.20, 7.45], size=(n - clustered, 2)),
+    ])
+    return pd.DataFrame({'latitude': points[:, 0], 'longitude': points[:, 1]})
+
+
+def legacy_location_risk(df, rows):
+    """
+    The original engineer_features loop, over the first `rows` rows
+    """
+    location_risk = []
+    for idx, row in df.head(rows).iterrows():
+        nearby = df[
+            (abs(df['latitude'] - row['latitude']) < 0.001) &
+            (abs(df['longitude'] - row['longitude']) < 0.001)
+        ]
+        location_risk.append(len(nearby) / len(df))
+    return np.array(location_risk)
+
+
+def vectorized_location_risk(df):
+    lats = df['latitude'].values
+    lons = df['longitude'].values
+    return count_box_neighbours(lats, lons, lats, lons, half_width=0.001) / len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-rows', type=int, default=200,
+                        help='Rows to actually time the legacy loop on before extrapolating')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy (s)':>14} {'kd-tree (s)':>12} {'speedup':>10}")
+    print("-" * 50)
+
+    for n in args.sizes:
+        df = make_incidents(n)
+
+        start = time.perf_counter()
+        fast = vectorized_location_risk(df)
+        fast_time = time.perf_counter() - start
+
+        rows = min(n, args.legacy_rows)
+        start = time.perf_counter()
+        slow = legacy_location_risk(df, rows)
+        legacy_time = (time.perf_counter() - start) * n / rows
+
+        # Same answers on the rows both methods computed
+        assert np.allclose(slow, fast[:rows]), "vectorized result differs from legacy loop"
+
+        marker = '~' if rows < n else ' '
+        print(f"{n:>10,} {marker}{legacy_time:>13.2f} {fast_time:>12.3f} {legacy_time / fast_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
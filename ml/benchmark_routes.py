@@ -0,0 +1,137 @@
+"""
+Benchmark RouteGraph.routes: old penalty re-search vs bidirectional search
+
+Usage:
+    python ml/benchmark_routes.py
+    python ml/benchmark_routes.py --grid 700 --distances 0.666 3 5 10
+
+Builds a synthetic street grid (--grid x --grid nodes, ~15m apart) with
+blobs of risk, then times k=3 route queries over several straight-line
+distances. The legacy method is the original loop: up to 2k single-source
+Dijkstra runs bounded at 15x the straight-line cost, re-penalising each
+route found. The optimal cost is checked against an unbounded Dijkstra.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+sys.path.append('.')
+
+from ml.route_graph import RouteGraph, haversine_m
+
+
+STEP_DEG = 0.00014  # ~15.5m between grid nodes
+
+
+def make_grid(size, seed=1):
+    """
+    size x size 4-connected grid with smooth risk hotspots
+    """
+    rng = np.random.default_rng(seed)
+    ii, jj = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    lats = (6.4 + ii * STEP_DEG).ravel()
+    lons = (3.3 + jj * STEP_DEG).ravel()
+
+    ids = np.arange(size * size).reshape(size, size)
+    pairs = [(ids[:, :-1], ids[:, 1:]), (ids[:-1, :], ids[1:, :])]
+    rows = np.concatenate([a.ravel() for a, b in pairs] + [b.ravel() for a, b in pairs])
+    cols = np.concatenate([b.ravel() for a, b in pairs] + [a.ravel() for a, b in pairs])
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+
+    indptr = np.zeros(size * size + 1, dtype=np.int64)
+    np.add.at(indptr, rows + 1, 1)
+    indptr = np.cumsum(indptr)
+    lengths = haversine_m(lats[rows], lons[rows], lats[cols], lons[cols])
+
+    # Midpoint risk, so both directions of an edge match
+    mid_lat = (lats[rows] + lats[cols]) / 2
+    mid_lon = (lons[rows] + lons[cols]) / 2
+    risk = np.zeros(len(rows))
+    for _ in range(size // 12):
+        centre_lat = 6.4 + rng.random() * size * STEP_DEG
+        centre_lon = 3.3 + rng.random() * size * STEP_DEG
+        risk += 0.8 * np.exp(-((mid_lat - centre_lat) ** 2 + (mid_lon - centre_lon) ** 2) / (2 * 0.003 ** 2))
+
+    return RouteGraph(lats, lons, indptr, cols, lengths, np.clip(risk, 0, 1))
+
+
+def legacy_routes(graph, source, target, k=3):
+    """
+    The original routes() search loop (costs only, no route dicts)
+    """
+    risk = graph.edge_risk
+    base_cost = np.maximum(graph.lengths.astype(np.float64), 0.01) * (1.0 + graph.RISK_WEIGHT * risk)
+    cost = base_cost.copy()
+    crow = float(haversine_m(graph.latitudes[source], graph.longitudes[source],
+                             graph.latitudes[target], graph.longitudes[target]))
+    limit = max(crow, 500.0) * 3.0 * (1.0 + graph.RISK_WEIGHT)
+
+    costs = []
+    for _ in range(2 * k):
+        matrix = csr_matrix((cost, graph.indices, graph.indptr), shape=(graph.node_count, graph.node_count))
+        dist, predecessors = dijkstra(matrix, directed=True, indices=source, return_predecessors=True, limit=limit)
+        if not np.isfinite(dist[target]):
+            break
+        nodes = [target]
+        while nodes[-1] != source:
+            nodes.append(predecessors[nodes[-1]])
+        nodes = nodes[::-1]
+        edges = graph._edge_ids_between(nodes[:-1], nodes[1:])
+        costs.append(float(base_cost[edges].sum()))
+        cost[edges] *= 1.6
+        cost[graph._edge_ids_between(nodes[1:], nodes[:-1])] *= 1.6
+        if len(costs) == k:
+            break
+    return costs
+
+
+def timed(fn, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--grid', type=int, default=700, help='Nodes per side')
+    parser.add_argument('--distances', type=float, nargs='+', default=[0.666, 3, 5, 10],
+                        help='Straight-line query distances (km)')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    graph = make_grid(args.grid)
+    print(f"{graph.node_count:,} nodes, {graph.edge_count:,} edges")
+    print(f"{'km':>7} {'legacy (ms)':>12} {'new (ms)':>10} {'speedup':>9} {'routes':>7}")
+    print("-" * 50)
+
+    centre = 6.4 + args.grid * STEP_DEG / 2, 3.3 + args.grid * STEP_DEG / 2
+    for km in args.distances:
+        half = km * 1000 / 111_000 / np.sqrt(2) / 2
+        start = (centre[0] - half, centre[1] - half)
+        end = (centre[0] + half, centre[1] + half)
+        source, _ = graph.nearest_node(*start)
+        target, _ = graph.nearest_node(*end)
+
+        graph.routes(*start, *end)  # Warm the cost-graph cache
+        found, new_time = timed(lambda: graph.routes(*start, *end, k=3), args.repeats)
+        legacy, legacy_time = timed(lambda: legacy_routes(graph, source, target), 1)
+
+        # The safest route must still be optimal
+        exact = dijkstra(graph._cost_graph(graph.edge_risk), directed=True, indices=source)[target]
+        assert found and np.isclose(found[0]['cost'], exact), "bidirectional search missed the optimal route"
+        assert np.isclose(found[0]['cost'], legacy[0]), "safest route differs from the legacy search"
+
+        print(f"{km:>7.3f} {legacy_time * 1000:>12.0f} {new_time * 1000:>10.0f} "
+              f"{legacy_time / new_time:>8.1f}x {len(found):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,8 +15,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eve.settings')
 django.setup()
 
 from apps.prediction.models import IncidentReport
+from apps.prediction.db_functions import PointX, PointY
+from django.db.models import Count, Max
 from apps.safety.models import CrimeZone
 from sklearn.preprocessing import MinMaxScaler
+from ml.neighbours import count_box_neighbours
 
 
 class DataPreparation:
@@ -24,37 +27,99 @@ class DataPreparation:
     Converts incident data into ML-ready features
     """
     
+    # Rows per server-side cursor fetch
+    CHUNK_SIZE = 10000
+
     @staticmethod
-    def load_incidents():
+    def load_incidents(chunk_size=CHUNK_SIZE):
         """
         Load all incidents from database
         
+        Streams (lat, lon, hour, day, severity, type, time) tuples through a
+        server-side cursor straight into preallocated NumPy columns - no
+        model instances or GEOS points are built.
+
         Returns:
             DataFrame with columns:
             - latitude, longitude, hour, day_of_week, severity, incident_type
         """
-        # TODO:
-        # 1. Query all IncidentReports
-        incidents = IncidentReport.objects.all()
+        # Fix the row set up front so the preallocated size can't drift
+        stats = IncidentReport.objects.aggregate(max_id=Max('id'), total=Count('id'))
+        total = stats['total']
 
-        # 2. Extract needed fields
-        data = []
-        for inc in incidents:
-            data.append({
-                'latitude': inc.location.y,
-                'longitude': inc.location.x,
-                'hour': inc.hour_of_day,
-                'day_of_week': inc.day_of_week,
-                'severity': inc.severity,
-                'incident_type': inc.incident_type,
-                'occurred_at': inc.occurred_at
-            })
-        
-        # 3. Convert to pandas DataFrame
-        df = pd.DataFrame(data)
+        latitude = np.empty(total, dtype=np.float64)
+        longitude = np.empty(total, dtype=np.float64)
+        hour = np.empty(total, dtype=np.int16)
+        day_of_week = np.empty(total, dtype=np.int16)
+        severity = np.empty(total, dtype=np.int16)
+        incident_type = np.empty(total, dtype=object)
+        occurred_at = np.empty(total, dtype='datetime64[us]')
+
+        rows = IncidentReport.objects.filter(
+            id__lte=stats['max_id'] or 0
+        ).order_by().annotate(
+            lon=PointX('location'),
+            lat=PointY('location')
+        ).values_list(
+            'lat', 'lon', 'hour_of_day', 'day_of_week', 'severity',
+            'incident_type', 'occurred_at'
+        ).iterator(chunk_size=chunk_size)
+
+        count = 0
+        for row in rows:
+            if count == total:
+                break
+            (latitude[count], longitude[count], hour[count], day_of_week[count],
+             severity[count], incident_type[count], when) = row
+            # Stored in UTC; drop tzinfo so NumPy accepts it
+            occurred_at[count] = when.replace(tzinfo=None)
+            count += 1
+
+        # Rows deleted while streaming leave the tail unused
+        df = pd.DataFrame({
+            'latitude': latitude[:count],
+            'longitude': longitude[:count],
+            'hour': hour[:count],
+            'day_of_week': day_of_week[:count],
+            'severity': severity[:count],
+            'incident_type': incident_type[:count],
+            'occurred_at': occurred_at[:count]
+        })
         print(f"Loaded {len(df)} incidents")
 
-        # 4. Return
+        return df
+
+    @staticmethod
+    def export_snapshot(path, chunk_size=CHUNK_SIZE):
+        """
+        Write every incident to a columnar Parquet file so training runs
+        don't have to read the live PostGIS database
+
+        Requires pyarrow.
+
+        Returns:
+            Number of rows written
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Snapshot export requires pyarrow (pip install pyarrow)")
+
+        df = DataPreparation.load_incidents(chunk_size=chunk_size)
+        df.to_parquet(path, engine='pyarrow', index=False)
+        print(f"✅ Snapshot written to {path}")
+        return len(df)
+
+    @staticmethod
+    def load_snapshot(path):
+        """
+        Load incidents from a Parquet snapshot written by export_snapshot
+
+        Returns:
+            Same DataFrame layout as load_incidents
+        """
+        df = pd.read_parquet(path, engine='pyarrow')
+        print(f"Loaded {len(df)} incidents from {path}")
         return df
 
     @staticmethod
@@ -123,17 +188,20 @@ class DataPreparation:
         else:
             incident_df = df
             
-        location_risk = []
-        for idx, row in df.iterrows():
-            # Count incidents near this point
-            nearby = incident_df[
-                (abs(incident_df['latitude'] - row['latitude']) < 0.001) &
-                (abs(incident_df['longitude'] - row['longitude']) < 0.001)
-            ]
-            # Normalize by total incidents to get a density score
-            # A score of 0.1 means 10% of all crime happens in this 100m radius (that's high!)
-            risk = len(nearby) / len(incident_df) if len(incident_df) > 0 else 0
-            location_risk.append(risk)
+        # One KD-tree join over all rows (was an O(n^2) iterrows loop)
+        # Normalize by total incidents to get a density score
+        # A score of 0.1 means 10% of all crime happens in this 100m radius (that's high!)
+        if len(incident_df) > 0:
+            nearby = count_box_neighbours(
+                df['latitude'].values,
+                df['longitude'].values,
+                incident_df['latitude'].values,
+                incident_df['longitude'].values,
+                half_width=0.001
+            )
+            location_risk = nearby / len(incident_df)
+        else:
+            location_risk = 0
         
         df['location_risk'] = location_risk
         
@@ -189,9 +257,13 @@ class DataPreparation:
         return X_normalized, scaler
     
     @staticmethod
-    def prepare_full_dataset():
+    def prepare_full_dataset(snapshot_path=None):
         """
         Complete pipeline: load → engineer → sequences → normalize
+
+        Args:
+            snapshot_path: Optional Parquet snapshot to train from
+                           instead of the database
         
         Returns:
             {
@@ -205,7 +277,10 @@ class DataPreparation:
         """
         # TODO:
         # 1. Load incidents
-        incidents_df = DataPreparation.load_incidents()
+        if snapshot_path:
+            incidents_df = DataPreparation.load_snapshot(snapshot_path)
+        else:
+            incidents_df = DataPreparation.load_incidents()
         incidents_df['target'] = 1  # Label as threat
         
         # 1.5 Generate negative samples (Safe)
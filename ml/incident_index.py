@@ -0,0 +1,168 @@
+"""
+In-memory spatial index over incident locations.
+
+Answers "how many incidents within N metres" without a PostGIS round trip.
+"""
+import threading
+import time
+
+import numpy as np
+from sklearn.neighbors import BallTree
+from django.db.models import Count, Max
+
+from apps.prediction.models import IncidentReport
+from apps.prediction.db_functions import PointX, PointY
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+class IncidentIndex:
+    """
+    Process-local haversine BallTree of incident coordinates
+
+    New incidents are appended to a small pending buffer that is scanned
+    brute force, and folded into the tree once it grows past
+    REBUILD_THRESHOLD. Rows written by other workers are picked up by
+    refresh(), at most once every REFRESH_INTERVAL seconds.
+    """
+    REBUILD_THRESHOLD = 256  # Pending points before the tree is rebuilt
+    REFRESH_INTERVAL = 60  # Seconds between checks for new rows
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._tree_size = 0
+        self._pending = np.empty((0, 2), dtype=np.float64)
+        self._indexed = np.empty((0, 2), dtype=np.float64)
+        self._last_id = 0
+        self._last_refresh = 0.0
+
+        # Called as on_change(lat, lon) for each added incident, and
+        # on_change(None, None) after a full reload
+        self.on_change = None
+
+    def __len__(self):
+        return self._tree_size + len(self._pending)
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def coordinates(self):
+        """
+        All indexed incidents as an (n, 2) array of (lat, lon) degrees
+        """
+        return np.degrees(np.vstack([self._indexed, self._pending]))
+
+    @staticmethod
+    def _fetch(min_id=0):
+        """
+        Pull (id, lat, lon) for incidents with id > min_id
+        """
+        rows = IncidentReport.objects.filter(id__gt=min_id).annotate(
+            lon=PointX('location'),
+            lat=PointY('location')
+        ).order_by('id').values_list('id', 'lat', 'lon')
+
+        data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+        return data[:, 0].astype(np.int64), data[:, 1:]
+
+    def load(self):
+        """
+        (Re)build the index from every incident in the database
+        """
+        ids, coords = self._fetch()
+        with self._lock:
+            self._indexed = np.radians(coords)
+            self._rebuild()
+            self._pending = np.empty((0, 2), dtype=np.float64)
+            self._last_id = int(ids[-1]) if len(ids) else 0
+            self._last_refresh = time.monotonic()
+        print(f"✅ Incident index loaded ({len(self)} incidents)")
+
+        if self.on_change:
+            self.on_change(None, None)
+
+    def refresh(self):
+        """
+        Pick up incidents inserted by other processes.
+
+        Falls back to a full reload if rows were deleted.
+        """
+        stats = IncidentReport.objects.aggregate(max_id=Max('id'), total=Count('id'))
+        self._last_refresh = time.monotonic()
+
+        if (stats['max_id'] or 0) > self._last_id:
+            ids, coords = self._fetch(self._last_id)
+            for incident_id, (lat, lon) in zip(ids.tolist(), coords.tolist()):
+                self.add(lat, lon, incident_id)
+
+        if stats['total'] != len(self):
+            self.load()
+
+    def maybe_refresh(self):
+        if time.monotonic() - self._last_refresh > self.REFRESH_INTERVAL:
+            self.refresh()
+
+    def add(self, latitude, longitude, incident_id=None):
+        """
+        Add a newly reported incident
+        """
+        with self._lock:
+            if incident_id is not None:
+                if incident_id <= self._last_id:
+                    return
+                self._last_id = incident_id
+
+            point = np.radians([[latitude, longitude]])
+            self._pending = np.vstack([self._pending, point])
+
+            if len(self._pending) >= self.REBUILD_THRESHOLD:
+                self._indexed = np.vstack([self._indexed, self._pending])
+                self._rebuild()
+                self._pending = np.empty((0, 2), dtype=np.float64)
+
+        if self.on_change:
+            self.on_change(latitude, longitude)
+
+    def _rebuild(self):
+        self._tree = BallTree(self._indexed, metric='haversine') if len(self._indexed) else None
+        self._tree_size = len(self._indexed)
+
+    def count_within(self, lats, lons, radius_m):
+        """
+        Count incidents within radius_m of each query point
+
+        Args:
+            lats, lons: Array-likes of query coordinates
+            radius_m: Search radius in meters
+
+        Returns:
+            int array of counts, one per query point
+        """
+        self.maybe_refresh()
+
+        query = np.radians(np.column_stack([
+            np.asarray(lats, dtype=np.float64).ravel(),
+            np.asarray(lons, dtype=np.float64).ravel()
+        ]))
+        radius = radius_m / EARTH_RADIUS_M
+
+        # Snapshot so a concurrent add() can't swap arrays mid-query
+        tree, pending = self._tree, self._pending
+
+        counts = np.zeros(len(query), dtype=np.int64)
+        if tree is not None and len(query):
+            counts += tree.query_radius(query, r=radius, count_only=True)
+
+        if len(pending) and len(query):
+            # Haversine distance from every query point to every pending point
+            dlat = query[:, None, 0] - pending[None, :, 0]
+            dlon = query[:, None, 1] - pending[None, :, 1]
+            a = (np.sin(dlat / 2) ** 2 +
+                 np.cos(query[:, None, 0]) * np.cos(pending[None, :, 0]) * np.sin(dlon / 2) ** 2)
+            distance = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+            counts += (distance <= radius).sum(axis=1)
+
+        return counts
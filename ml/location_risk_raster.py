@@ -0,0 +1,249 @@
+"""
+Precomputed location-risk raster.
+
+Rasterizes the location_risk feature (share of all incidents within
+150m) into fixed-size tiles of CELL_SIZE_M cells, stored as .npy files
+and memory-mapped by every worker, so feature preparation is an array
+lookup instead of a spatial query.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+
+# Web Mercator sphere radius (EPSG:3857)
+MERCATOR_RADIUS_M = 6378137.0
+
+
+def to_mercator(lats, lons):
+    """
+    Project lat/lon degrees to Web Mercator meters
+    """
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    x = MERCATOR_RADIUS_M * lons
+    y = MERCATOR_RADIUS_M * np.log(np.tan(np.pi / 4 + lats / 2))
+    return x, y
+
+
+def from_mercator(x, y):
+    """
+    Inverse of to_mercator
+    """
+    lons = np.degrees(np.asarray(x, dtype=np.float64) / MERCATOR_RADIUS_M)
+    lats = np.degrees(2 * np.arctan(np.exp(np.asarray(y, dtype=np.float64) / MERCATOR_RADIUS_M)) - np.pi / 2)
+    return lats, lons
+
+
+class LocationRiskRaster:
+    """
+    Tiled location-risk raster on disk
+
+    Layout under `root`:
+        manifest.json             - points at the active build
+        <build_id>/<tx>_<ty>.npy  - float32 (TILE_CELLS, TILE_CELLS) risk tiles
+
+    Only tiles within reach of an incident are written; a missing tile
+    means zero risk. Cell size is in Mercator meters (25m at the equator,
+    ~24.9m in Nigeria).
+    """
+    CELL_SIZE_M = 25
+    TILE_CELLS = 256
+    RELOAD_INTERVAL = 30  # Seconds between manifest checks
+    KEEP_BUILDS = 2       # Newest builds kept on disk, so workers still on the previous one can read it
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.manifest = None
+        self._manifest_mtime = None
+        self._last_check = 0.0
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tile_size_m(self):
+        return self.CELL_SIZE_M * self.TILE_CELLS
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, 'manifest.json')
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def _maybe_reload(self, force=False):
+        """
+        Pick up a new build written by the management command
+
+        Args:
+            force: Check the manifest now instead of waiting RELOAD_INTERVAL
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.RELOAD_INTERVAL and self.manifest is not None:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            self.manifest = None
+            return
+
+        if mtime == self._manifest_mtime:
+            return
+
+        with self._lock:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            self._manifest_mtime = mtime
+            self._tiles = {}
+
+    def _tile(self, tx, ty):
+        key = (tx, ty)
+        if key not in self._tiles:
+            path = os.path.join(self.root, self.manifest['build_id'], f"{tx}_{ty}.npy")
+            # Missing tile = nothing within reach of an incident
+            self._tiles[key] = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+        return self._tiles[key]
+
+    def lookup(self, lats, lons, radius_m, incident_count, last_incident_id):
+        """
+        Look up location risk for many points
+
+        Args:
+            lats, lons: Array-likes of coordinates
+            radius_m: Neighbour radius the caller expects
+            incident_count: Incidents the caller currently knows about
+            last_incident_id: Highest incident id the caller knows about
+                (None if there are none), so that deleting one incident
+                and adding another doesn't go unnoticed
+
+        Returns:
+            float64 array of risk scores, or None if there is no build or
+            it is stale (different radius, incident count or last id)
+        """
+        self._maybe_reload()
+        manifest = self.manifest
+        if manifest is not None and not os.path.isdir(os.path.join(self.root, manifest['build_id'])):
+            # Our build was pruned after newer ones replaced it; missing
+            # tiles would otherwise read as zero risk
+            self._maybe_reload(force=True)
+            manifest = self.manifest
+        if (manifest is None or manifest['radius_m'] != radius_m
+                or manifest['incident_count'] != incident_count
+                or manifest.get('last_incident_id') != last_incident_id):
+            return None
+
+        x, y = to_mercator(lats, lons)
+        col = np.floor(x / self.CELL_SIZE_M).astype(np.int64).ravel()
+        row = np.floor(y / self.CELL_SIZE_M).astype(np.int64).ravel()
+        tx, cx = np.divmod(col, self.TILE_CELLS)
+        ty, cy = np.divmod(row, self.TILE_CELLS)
+
+        risk = np.zeros(len(col), dtype=np.float64)
+        tile_keys = np.column_stack([tx, ty])
+        unique_keys, inverse = np.unique(tile_keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        for k, (key_x, key_y) in enumerate(unique_keys.tolist()):
+            tile = self._tile(key_x, key_y)
+            if tile is None:
+                continue
+            mask = inverse == k
+            risk[mask] = tile[cy[mask], cx[mask]]
+
+        return risk
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def build(self, incident_index, radius_m, last_incident_id=None):
+        """
+        Rasterize location risk for every tile within radius_m of an incident
+
+        Args:
+            incident_index: Loaded ml.incident_index.IncidentIndex
+            radius_m: Neighbour radius (ThreatPredictor.LOCATION_RISK_RADIUS_M)
+            last_incident_id: Highest incident id included, for staleness checks
+
+        Returns:
+            Number of tiles written
+        """
+        total = len(incident_index)
+        coords = incident_index.coordinates()
+
+        tiles = set()
+        if total:
+            x, y = to_mercator(coords[:, 0], coords[:, 1])
+            # Mercator stretches by 1/cos(lat); pad by one cell for cell-centre rounding
+            reach = radius_m / np.cos(np.radians(coords[:, 0])) + self.CELL_SIZE_M
+            tile_m = self.tile_size_m
+            for x0, x1, y0, y1 in zip(
+                np.floor((x - reach) / tile_m).astype(int).tolist(),
+                np.floor((x + reach) / tile_m).astype(int).tolist(),
+                np.floor((y - reach) / tile_m).astype(int).tolist(),
+                np.floor((y + reach) / tile_m).astype(int).tolist(),
+            ):
+                for tx in range(x0, x1 + 1):
+                    for ty in range(y0, y1 + 1):
+                        tiles.add((tx, ty))
+
+        # Unique even for two builds in one second, so a build never
+        # writes into the directory the live manifest points at
+        build_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        build_dir = os.path.join(self.root, build_id)
+        os.makedirs(build_dir)
+
+        # Cell centre offsets within a tile, (row, col) = (y, x)
+        offsets = (np.arange(self.TILE_CELLS) + 0.5) * self.CELL_SIZE_M
+        for tx, ty in sorted(tiles):
+            cell_x = tx * self.tile_size_m + offsets
+            cell_y = ty * self.tile_size_m + offsets
+            grid_x, grid_y = np.meshgrid(cell_x, cell_y)
+            lats, lons = from_mercator(grid_x, grid_y)
+
+            counts = incident_index.count_within(lats.ravel(), lons.ravel(), radius_m)
+            risk = (counts / total).astype(np.float32).reshape(self.TILE_CELLS, self.TILE_CELLS)
+            np.save(os.path.join(build_dir, f"{tx}_{ty}.npy"), risk)
+
+        manifest = {
+            'build_id': build_id,
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'cell_size_m': self.CELL_SIZE_M,
+            'tile_cells': self.TILE_CELLS,
+            'radius_m': radius_m,
+            'incident_count': total,
+            'last_incident_id': last_incident_id,
+            'tiles': len(tiles),
+        }
+
+        # Swap the manifest atomically so workers never see a half-written build
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        # Workers re-read the manifest every RELOAD_INTERVAL, so keep the
+        # previous build for them; older ones may still be memory-mapped,
+        # but unlinking is safe on POSIX. Builds sort by when they finished.
+        builds = sorted(
+            (entry for entry in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, entry))),
+            key=lambda entry: os.path.getmtime(os.path.join(self.root, entry))
+        )
+        for entry in builds[:-self.KEEP_BUILDS]:
+            if entry != build_id:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+        return len(tiles)
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except OSError:
+            return None
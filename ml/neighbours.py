@@ -0,0 +1,41 @@
+"""
+Vectorized neighbour counting for feature engineering
+"""
+import numpy as np
+from sklearn.neighbors import KDTree
+
+
+def count_box_neighbours(lats, lons, ref_lats, ref_lons, half_width=0.001):
+    """
+    Count reference points inside the open box
+    |lat - ref_lat| < half_width and |lon - ref_lon| < half_width
+    around every query point.
+
+    Equivalent to filtering the reference DataFrame once per row, but
+    done as a single KD-tree join (Chebyshev metric), so it scales
+    roughly as n log n instead of n^2.
+
+    Args:
+        lats, lons: Query coordinates (degrees)
+        ref_lats, ref_lons: Reference coordinates (degrees)
+        half_width: Half the box side, in degrees
+
+    Returns:
+        int64 array of counts, one per query point
+    """
+    query = np.column_stack([
+        np.asarray(lats, dtype=np.float64),
+        np.asarray(lons, dtype=np.float64)
+    ])
+    ref = np.column_stack([
+        np.asarray(ref_lats, dtype=np.float64),
+        np.asarray(ref_lons, dtype=np.float64)
+    ])
+
+    if len(query) == 0 or len(ref) == 0:
+        return np.zeros(len(query), dtype=np.int64)
+
+    tree = KDTree(ref, metric='chebyshev')
+    # query_radius is inclusive (<=); step one ulp down for a strict <
+    radius = np.nextafter(half_width, 0)
+    return tree.query_radius(query, r=radius, count_only=True).astype(np.int64)
@@ -5,17 +5,18 @@ Prediction service using trained LSTM model.
 import torch
 import pickle
 import numpy as np
-from django.contrib.gis.geos import Point
 import os
+import time
 import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sentinelsphere.settings')
 django.setup()
 
 from ml.lstm_model import ThreatLSTM
-from apps.prediction.models import IncidentReport
+from ml.incident_index import IncidentIndex
+from ml.location_risk_raster import LocationRiskRaster
+from django.conf import settings
 from datetime import datetime
-from django.contrib.gis.measure import D
 
 
 
@@ -23,11 +24,26 @@ class ThreatPredictor:
     """
     Makes predictions using trained LSTM model
     """
+    # Max rows per scaler.transform + forward pass
+    BATCH_SIZE = 4096
+
+    # Incidents within this distance count towards location risk
+    LOCATION_RISK_RADIUS_M = 150
+
+    # Heatmap refinement: coarse grid spacing (in grid points) to start from
+    REFINE_COARSE_STEP = 8
+
     def __init__(self):
         self.model = None
         self.scalar = None
         self.feature_names = None
+        self.model_version = None
         self._load_model()
+
+        self.incident_index = IncidentIndex()
+        self.incident_index.load()
+
+        self.risk_raster = LocationRiskRaster(settings.LOCATION_RISK_RASTER_DIR)
     
     def _load_model(self):
         """
@@ -50,6 +66,9 @@ class ThreatPredictor:
             with open('ml/feature_names.pkl', 'rb') as f:
                 self.feature_names = pickle.load(f)
             print("✅ Feature names loaded successfully")
+
+            # New version on every (re)load - invalidates cached heatmaps
+            self.model_version = time.time_ns()
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             raise
@@ -66,21 +85,38 @@ class ThreatPredictor:
         Returns:
             Risk score (0.0 - 1.0)
         """
+        return float(self.location_risk_batch([lat], [long])[0])
+
+    def location_risk_batch(self, lats, lons):
+        """
+        Vectorized calculate_location_risk, answered from the
+        precomputed risk raster when it is fresh, otherwise from the
+        in-memory incident index - never from PostGIS
+
+        Args:
+            lats, lons: Array-likes of coordinates
 
-        point = Point(long, lat, srid=4326)
+        Returns:
+            float64 array of risk scores (0.0 - 1.0)
+        """
+        risk = self.risk_raster.lookup(
+            lats, lons, self.LOCATION_RISK_RADIUS_M, len(self.incident_index),
+            self.incident_index.last_id or None
+        )
+        if risk is not None:
+            return risk
 
-        nearby_incidents = IncidentReport.objects.filter(
-            location__distance_lte=(point, D(m=150))  # 150 meters
-        ).count()
+        nearby_incidents = self.incident_index.count_within(
+            lats, lons, self.LOCATION_RISK_RADIUS_M
+        )
 
-        total_incidents = IncidentReport.objects.count()
+        total_incidents = len(self.incident_index)
         
         if total_incidents == 0:
-            return 0.0
+            return np.zeros(len(nearby_incidents), dtype=np.float64)
         
         # Risk = percentage of incidents that happened here
-        risk = nearby_incidents / total_incidents
-        return risk
+        return nearby_incidents / total_incidents
     
     def prepare_features(self, latitude, longitude, hour, day_of_week):
         """
@@ -94,30 +130,124 @@ class ThreatPredictor:
         Returns:
             Feature array ready for model.
         """
-        # Calculate derived features
-        is_night = 1 if hour > 22 or hour < 6 else 0
-        is_weekend = 1 if day_of_week >= 5 else 0
-
-        location_risk = self.calculate_location_risk(latitude, longitude)       
-
-        # Create feature array (must match training order!)
-
-        features = np.array([
-            latitude,
-            longitude,
-            hour,
-            day_of_week,
-            is_night,
-            is_weekend,
-            location_risk
-        ])
+        features = self.build_feature_matrix(
+            [latitude], [longitude], [hour], [day_of_week]
+        )
 
         # Normalize using the saved scaler
-        # Reshape to 2D array (samples, features)
-        features = features.reshape(1, -1)
         features_normalized = self.scalar.transform(features)
 
         return features_normalized
+
+    def build_feature_matrix(self, lats, lons, hours, days):
+        """
+        Create the raw (unscaled) feature matrix for many points at once
+
+        Location risk only depends on the coordinates, so it is computed
+        once per unique (lat, lon) pair - a 24h heatmap needs 100 lookups
+        instead of 2,400.
+
+        Args:
+            lats, lons: Array-likes of coordinates
+            hours: Array-like of hours (0-23)
+            days: Array-like of days of week (0-6)
+
+        Returns:
+            (n, 7) float64 array in training column order
+        """
+        lats, lons, hours, days = np.broadcast_arrays(
+            np.asarray(lats, dtype=np.float64),
+            np.asarray(lons, dtype=np.float64),
+            np.asarray(hours, dtype=np.float64),
+            np.asarray(days, dtype=np.float64),
+        )
+        lats, lons, hours, days = (a.ravel() for a in (lats, lons, hours, days))
+
+        coords = np.column_stack([lats, lons])
+        unique_coords, inverse = np.unique(coords, axis=0, return_inverse=True)
+        unique_risk = self.location_risk_batch(unique_coords[:, 0], unique_coords[:, 1])
+
+        # Create feature matrix (must match training order!)
+        features = np.empty((len(lats), 7), dtype=np.float64)
+        features[:, 0] = lats
+        features[:, 1] = lons
+        features[:, 6] = unique_risk[inverse.ravel()]
+        return self.set_time_features(features, hours, days)
+
+    @staticmethod
+    def set_time_features(features, hours, days):
+        """
+        Write the time columns (hour, day, is_night, is_weekend) of a
+        feature matrix in place, so callers scoring the same points at
+        many times can reuse the location columns
+
+        Args:
+            features: (n, 7) array from build_feature_matrix
+            hours, days: Arrays of length n, or scalars
+
+        Returns:
+            features
+        """
+        hours = np.asarray(hours, dtype=np.float64)
+        days = np.asarray(days, dtype=np.float64)
+        features[:, 2] = hours
+        features[:, 3] = days
+        features[:, 4] = (hours > 22) | (hours < 6)
+        features[:, 5] = days >= 5
+        return features
+
+    def predict_features(self, features):
+        """
+        Run the model over a raw feature matrix
+
+        Scaling and the forward pass are done once per chunk of
+        BATCH_SIZE rows rather than once per point.
+
+        Args:
+            features: (n, 7) array from build_feature_matrix
+
+        Returns:
+            (n,) float32 array of risk probabilities
+        """
+        risk = np.empty(len(features), dtype=np.float32)
+
+        self.model.eval()
+        with torch.no_grad():
+            for start in range(0, len(features), self.BATCH_SIZE):
+                chunk = self.scalar.transform(features[start:start + self.BATCH_SIZE])
+                chunk_tensor = torch.from_numpy(chunk.astype(np.float32))
+                output = self.model(chunk_tensor)
+                risk[start:start + len(chunk)] = output.numpy().ravel()
+
+        return risk
+
+    def predict_batch(self, lats, lons, hours, days):
+        """
+        Predict threat probabilities for many location + time points
+
+        Args:
+            lats, lons: Arrays of coordinates
+            hours: Array of hours (0-23), or a scalar
+            days: Array of days of week (0-6), or a scalar
+
+        Returns:
+            (n,) float32 array of risk probabilities (0.0 - 1.0)
+        """
+        features = self.build_feature_matrix(lats, lons, hours, days)
+        return self.predict_features(features)
+
+    @staticmethod
+    def confidence_level(risk_prob):
+        """
+        Map a risk probability to its confidence label
+        """
+        if risk_prob > 0.8:
+            return 'Very High'
+        elif risk_prob > 0.6:
+            return 'High'
+        elif risk_prob > 0.4:
+            return 'Medium'
+        return 'Low'
     
     def predict(self, latitude, longitude, hour, day_of_week):
         """
@@ -136,33 +266,16 @@ class ThreatPredictor:
                 'features_used': {...}
             }
         """
-        features = self.prepare_features(latitude, longitude, hour, day_of_week)
-        
-        # COnvert to tensors
-        features_tensor = torch.FloatTensor(features)
-
-        # Make prediction
-        self.model.eval()
-        with torch.no_grad():
-            print(f"DEBUG FEATURES: {features[0]}")
-            prediction = self.model(features_tensor)
-            risk_prob = prediction.item()
+        features = self.build_feature_matrix(
+            [latitude], [longitude], [hour], [day_of_week]
+        )
+        risk_prob = float(self.predict_features(features)[0])
 
-        # Determine confidence level
-        if risk_prob > 0.8:
-            confidence = 'Very High'
-        elif risk_prob > 0.6:
-            confidence = 'High'
-        elif risk_prob > 0.4:
-            confidence = 'Medium'
-        else:
-            confidence = 'Low'
-        
         # Return result
         return {
             'risk_probability': round(risk_prob, 3),
             'risk_percentage': round(risk_prob * 100, 1),
-            'confidence': confidence,
+            'confidence': self.confidence_level(risk_prob),
             'features_used': {
                 'latitude': latitude,
                 'longitude': longitude,
@@ -170,30 +283,35 @@ class ThreatPredictor:
                 'day_of_week': day_of_week,
                 'is_night': 1 if (hour >= 22 or hour <= 5) else 0,
                 'is_weekend': 1 if (day_of_week >= 5) else 0,
-                'location_risk': self.calculate_location_risk(latitude, longitude)
+                'location_risk': float(features[0, 6])
             }
         }
     
-    def predict_24h_grid(self, center_lat, center_lon, radius_degrees=0.005, grid_points=10):
+    def predict_24h_risk(self, center_lat, center_lon, radius_degrees=0.005, grid_points=10,
+                         day_of_week=None, refine_threshold=None):
         """
-        Generate prediction grid for next 24 hours
-        Used for heatmap visualization
-        
+        Generate the 24-hour prediction grid as arrays
+
         Args:
             center_lat, center_lon: Center point
             radius_degrees: How far around center (0.005 ≈ 550m)
             grid_points: Grid resolution (10x10 = 100 predictions)
-            
+            day_of_week: 0-6, defaults to today
+            refine_threshold: If set, evaluate a coarse grid and only refine
+                              cells whose risk varies by more than this
+                              (see _refine_grid); otherwise evaluate every point
+
         Returns:
-            List of predictions:
-            [
-                {'lat': 5.125, 'lon': 7.356, 'hour': 0, 'risk': 0.23},
-                {'lat': 5.125, 'lon': 7.357, 'hour': 0, 'risk': 0.45},
-                ...
-            ]
+            {
+                'latitudes': (N,) array,
+                'longitudes': (N,) array,
+                'day_of_week': 4,
+                'risk': (24, N, N) float32 array indexed [hour, lat, lon],
+                'evaluated': (N, N) bool array, True where the model ran
+                             (the rest is interpolated),
+                'evaluated_points': how many grid points ran through the model
+            }
         """
-        # TODO:
-        predictions = []
         # 1. Create grid of locations around center
         lat_range = np.linspace(
             center_lat - radius_degrees,
@@ -206,26 +324,209 @@ class ThreatPredictor:
             grid_points
         )
         
-        # 2. For each hour (0-23):
         # Current day of week
-        current_day = datetime.now().weekday()
-        
-        # For each hour
-        for hour in range(24):
-            # For each grid point
-            for lat in lat_range:
-                for lon in lon_range:
-                    result = self.predict(lat, lon, hour, current_day)
-                    
-                    predictions.append({
-                        'latitude': lat,
-                        'longitude': lon,
-                        'hour': hour,
-                        'risk_probability': result['risk_probability'],
-                        'risk_percentage': result['risk_percentage']
-                    })
-    
-        return predictions
+        current_day = datetime.now().weekday() if day_of_week is None else day_of_week
+
+        if refine_threshold is not None:
+            risk, evaluated = self._refine_grid(
+                lat_range, lon_range, current_day, refine_threshold
+            )
+        else:
+            # 2. Every (hour, lat, lon) combination in one batch
+            hours, lats, lons = np.meshgrid(
+                np.arange(24), lat_range, lon_range, indexing='ij'
+            )
+            risk = self.predict_batch(lats, lons, hours, current_day).reshape(hours.shape)
+            evaluated = np.ones((grid_points, grid_points), dtype=bool)
+
+        return {
+            'latitudes': lat_range,
+            'longitudes': lon_range,
+            'day_of_week': current_day,
+            'risk': risk,
+            'evaluated': evaluated,
+            'evaluated_points': int(evaluated.sum())
+        }
+
+    def _predict_points_24h(self, lats, lons, day_of_week):
+        """
+        Risk for every hour at each point
+
+        Returns:
+            (24, P) float32 array
+        """
+        hours = np.arange(24)[:, None]
+        return self.predict_batch(
+            np.broadcast_to(lats, (24, len(lats))),
+            np.broadcast_to(lons, (24, len(lons))),
+            hours,
+            day_of_week
+        ).reshape(24, len(lats))
+
+    def _refine_grid(self, lat_range, lon_range, day_of_week, threshold):
+        """
+        Quadtree-style progressive refinement
+
+        Evaluates a coarse lattice (every REFINE_COARSE_STEP points), then
+        repeatedly splits cells whose corner risks differ by more than
+        `threshold` at any hour. Cells whose corners agree are also
+        sampled at their centre and split if it is more than `threshold`
+        off the interpolated value, so a hotspot between corners isn't
+        smoothed over. Points left inside unsplit cells are filled by
+        bilinear interpolation from the cell corners.
+
+        Returns:
+            ((24, N, M) float32 risk array, (N, M) bool mask of the points
+            the model evaluated)
+        """
+        n_lat, n_lon = len(lat_range), len(lon_range)
+        risk = np.zeros((24, n_lat, n_lon), dtype=np.float32)
+        known = np.zeros((n_lat, n_lon), dtype=bool)
+
+        def evaluate(points):
+            points = [p for p in dict.fromkeys(points) if not known[p]]
+            if not points:
+                return
+            rows, cols = np.array(points).T
+            risk[:, rows, cols] = self._predict_points_24h(
+                lat_range[rows], lon_range[cols], day_of_week
+            )
+            known[rows, cols] = True
+
+        def axis(n):
+            ticks = list(range(0, n, self.REFINE_COARSE_STEP))
+            if ticks[-1] != n - 1:
+                ticks.append(n - 1)
+            return ticks
 
+        lat_ticks, lon_ticks = axis(n_lat), axis(n_lon)
+        evaluate([(i, j) for i in lat_ticks for j in lon_ticks])
 
+        # Cells as (i0, i1, j0, j1), corners inclusive
+        cells = [
+            (i0, i1, j0, j1)
+            for i0, i1 in zip(lat_ticks, lat_ticks[1:])
+            for j0, j1 in zip(lon_ticks, lon_ticks[1:])
+        ]
+        leaves = []
 
+        def centre(cell):
+            i0, i1, j0, j1 = cell
+            return (i0 + i1) // 2, (j0 + j1) // 2
+
+        def interpolate_at(cell, i, j):
+            i0, i1, j0, j1 = cell
+            u = (i - i0) / (i1 - i0) if i1 > i0 else 0.0
+            v = (j - j0) / (j1 - j0) if j1 > j0 else 0.0
+            return (
+                risk[:, i0, j0] * (1 - u) * (1 - v) + risk[:, i0, j1] * (1 - u) * v +
+                risk[:, i1, j0] * u * (1 - v) + risk[:, i1, j1] * u * v
+            )
+
+        while cells:
+            to_split, flat = [], []
+            for cell in cells:
+                i0, i1, j0, j1 = cell
+                if i1 - i0 <= 1 and j1 - j0 <= 1:
+                    leaves.append(cell)
+                    continue
+                corners = risk[:, [i0, i0, i1, i1], [j0, j1, j0, j1]]
+                gradient = (corners.max(axis=1) - corners.min(axis=1)).max()
+                (to_split if gradient > threshold else flat).append(cell)
+
+            # Centres of flat cells go through the model in one batch;
+            # they are split points anyway if the cell turns out not flat
+            evaluate([centre(cell) for cell in flat])
+            for cell in flat:
+                i, j = centre(cell)
+                if np.abs(risk[:, i, j] - interpolate_at(cell, i, j)).max() > threshold:
+                    to_split.append(cell)
+                else:
+                    leaves.append(cell)
+
+            split, new_points = [], []
+            for i0, i1, j0, j1 in to_split:
+                i_mid = (i0 + i1) // 2 if i1 - i0 > 1 else None
+                j_mid = (j0 + j1) // 2 if j1 - j0 > 1 else None
+                i_splits = [i0, i_mid, i1] if i_mid is not None else [i0, i1]
+                j_splits = [j0, j_mid, j1] if j_mid is not None else [j0, j1]
+
+                new_points.extend((i, j) for i in i_splits for j in j_splits)
+                split.extend(
+                    (a0, a1, b0, b1)
+                    for a0, a1 in zip(i_splits, i_splits[1:])
+                    for b0, b1 in zip(j_splits, j_splits[1:])
+                )
+
+            evaluate(new_points)
+            cells = split
+
+        evaluated = known.copy()
+
+        # Fill the rest by bilinear interpolation inside each leaf
+        for i0, i1, j0, j1 in leaves:
+            block = ~known[i0:i1 + 1, j0:j1 + 1]
+            if not block.any():
+                continue
+            u = np.linspace(0, 1, i1 - i0 + 1)[:, None]
+            v = np.linspace(0, 1, j1 - j0 + 1)[None, :]
+            c00, c01 = risk[:, i0, j0, None, None], risk[:, i0, j1, None, None]
+            c10, c11 = risk[:, i1, j0, None, None], risk[:, i1, j1, None, None]
+            interpolated = (
+                c00 * (1 - u) * (1 - v) + c01 * (1 - u) * v +
+                c10 * u * (1 - v) + c11 * u * v
+            )
+            risk[:, i0:i1 + 1, j0:j1 + 1][:, block] = interpolated[:, block]
+            known[i0:i1 + 1, j0:j1 + 1] |= block
+
+        return risk, evaluated
+
+    @staticmethod
+    def grid_to_points(grid):
+        """
+        Expand a predict_24h_risk grid into the per-point list format
+        """
+        hours, lats, lons = np.meshgrid(
+            np.arange(grid['risk'].shape[0]), grid['latitudes'], grid['longitudes'],
+            indexing='ij'
+        )
+
+        predictions = []
+        for hour, lat, lon, risk_prob in zip(
+            hours.ravel().tolist(), lats.ravel().tolist(),
+            lons.ravel().tolist(), grid['risk'].ravel().tolist()
+        ):
+            predictions.append({
+                'latitude': lat,
+                'longitude': lon,
+                'hour': hour,
+                'risk_probability': round(risk_prob, 3),
+                'risk_percentage': round(risk_prob * 100, 1)
+            })
+
+        return predictions
+
+    def predict_24h_grid(self, center_lat, center_lon, radius_degrees=0.005, grid_points=10,
+                         day_of_week=None):
+        """
+        Generate prediction grid for next 24 hours
+        Used for heatmap visualization
+        
+        Args:
+            center_lat, center_lon: Center point
+            radius_degrees: How far around center (0.005 ≈ 550m)
+            grid_points: Grid resolution (10x10 = 100 predictions)
+            day_of_week: 0-6, defaults to today
+            
+        Returns:
+            List of predictions, ordered hour-major:
+            [
+                {'lat': 5.125, 'lon': 7.356, 'hour': 0, 'risk': 0.23},
+                {'lat': 5.125, 'lon': 7.357, 'hour': 0, 'risk': 0.45},
+                ...
+            ]
+        """
+        grid = self.predict_24h_risk(
+            center_lat, center_lon, radius_degrees, grid_points, day_of_week
+        )
+        return self.grid_to_points(grid)
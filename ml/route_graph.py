@@ -0,0 +1,579 @@
+"""
+Walkable road/footpath graph for safe routing.
+
+Built once from an OpenStreetMap extract (.osm XML, optionally .gz/.bz2)
+into a compact CSR adjacency (indptr / indices / edge length / edge risk)
+saved as .npz. Queries snap the endpoints to the nearest graph nodes and
+run a bidirectional Dijkstra over edge cost = length * (1 + RISK_WEIGHT * risk),
+bounded near the straight-line cost; alternative routes are via-node routes
+read off the same two search trees.
+
+Time-dependent edge risk lives in an EdgeRiskTable: a float16
+(168, edges) matrix with one row per hour-of-week, rebuilt nightly and
+memory-mapped, so routing at any departure time needs no model inference.
+"""
+import bz2
+import gzip
+import os
+import threading
+import time
+import weakref
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from sklearn.neighbors import BallTree
+
+
+EARTH_RADIUS_M = 6371008.8
+
+# OSM highway types a pedestrian can use
+WALKABLE_HIGHWAYS = {
+    'footway', 'path', 'pedestrian', 'living_street', 'residential', 'service',
+    'unclassified', 'tertiary', 'tertiary_link', 'secondary', 'secondary_link',
+    'primary', 'primary_link', 'track', 'steps', 'cycleway', 'road',
+}
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in meters (vectorised)
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _open_osm(path):
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_osm(path):
+    """
+    Stream an OSM XML extract and keep walkable ways
+
+    Returns:
+        (node_coords {osm_id: (lat, lon)}, ways [[osm_id, ...], ...])
+    """
+    node_coords = {}
+    ways = []
+
+    with _open_osm(path) as f:
+        for _, elem in ET.iterparse(f, events=('end',)):
+            if elem.tag == 'node':
+                node_coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+            elif elem.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+                if tags.get('highway') in WALKABLE_HIGHWAYS and tags.get('foot') != 'no' \
+                        and tags.get('access') not in ('private', 'no'):
+                    ways.append([int(nd.get('ref')) for nd in elem.iter('nd')])
+            elif elem.tag != 'relation':
+                continue
+            # Free parsed elements as we go
+            elem.clear()
+
+    return node_coords, ways
+
+
+HOURS_PER_WEEK = 168
+
+
+def hour_of_week(hour, day_of_week):
+    """
+    Bucket index (0-167) for an hour of day and day of week (0=Mon)
+    """
+    return int(day_of_week) % 7 * 24 + int(hour) % 24
+
+
+class EdgeRiskTable:
+    """
+    Per-edge risk for every hour-of-week, memory-mapped from an .npy file
+
+    Row hour_of_week(hour, day) holds the predicted risk at each edge
+    midpoint, in the graph's CSR edge order.
+    """
+    RELOAD_INTERVAL = 60  # Seconds between checks for a new build
+    CACHED_COLUMNS = 4    # float32 columns kept, so the graph can reuse their edge costs
+
+    def __init__(self, path, edge_count):
+        self.path = str(path)
+        self.edge_count = edge_count
+        self._table = None
+        self._columns = OrderedDict()
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        """
+        Pick up a table rewritten by the nightly job
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.RELOAD_INTERVAL and self._table is not None:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._table = None
+            return
+
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            table = np.load(self.path, mmap_mode='r')
+            # A table built for another graph is useless
+            self._table = table if table.shape == (HOURS_PER_WEEK, self.edge_count) else None
+            self._columns = OrderedDict()
+            self._mtime = mtime
+
+    def column(self, hour, day_of_week):
+        """
+        Returns:
+            float32 array of edge risk for that hour-of-week, or None if
+            no table matching the graph has been built
+        """
+        self._maybe_reload()
+        table = self._table
+        if table is None:
+            return None
+
+        bucket = hour_of_week(hour, day_of_week)
+        with self._lock:
+            column = self._columns.get(bucket)
+            if column is not None:
+                self._columns.move_to_end(bucket)
+                return column
+        column = np.asarray(table[bucket], dtype=np.float32)
+        with self._lock:
+            self._columns[bucket] = column
+            while len(self._columns) > self.CACHED_COLUMNS:
+                self._columns.popitem(last=False)
+        return column
+
+    @classmethod
+    def build(cls, path, graph, predictor, chunk_size=50000, progress=None):
+        """
+        Predict risk at every edge midpoint for all 168 hour-of-week buckets
+
+        Written to a temp file and swapped in, so readers never see a
+        partial table. Each chunk of edges gets its location features
+        once; only the time columns change between buckets.
+
+        Args:
+            graph: RouteGraph
+            predictor: ml.prediction_service.ThreatPredictor
+            progress: Optional callback(edges_done) after each chunk
+        """
+        path = str(path)
+        tmp_path = path + '.tmp.npy'
+        lats, lons = graph.edge_midpoints()
+
+        table = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float16, shape=(HOURS_PER_WEEK, graph.edge_count)
+        )
+        for start in range(0, graph.edge_count, chunk_size):
+            end = min(start + chunk_size, graph.edge_count)
+            features = predictor.build_feature_matrix(lats[start:end], lons[start:end], 0, 0)
+            for day in range(7):
+                for hour in range(24):
+                    predictor.set_time_features(features, hour, day)
+                    table[hour_of_week(hour, day), start:end] = predictor.predict_features(features)
+            if progress:
+                progress(end)
+        table.flush()
+        del table
+
+        os.replace(tmp_path, path)
+
+
+class RouteGraph:
+    """
+    CSR walking graph with per-edge length and risk
+    """
+    RISK_WEIGHT = 4.0       # A fully risky edge costs 5x its length
+    ALT_STRETCH = 0.25      # Alternatives may cost up to 25% more than the best route
+    MAX_OVERLAP = 0.8       # Alternatives sharing more length than this are dropped
+    MAX_VIA_TRIES = 8       # Via routes built and checked for alternatives
+    MAX_SNAP_M = 500        # Endpoints further than this from the graph can't be routed
+    SEARCH_SLACK = 1.5      # First search covers routes up to this times the straight line
+    MAX_DETOUR = 3.0        # Give up on routes longer than this times the straight line
+
+    def __init__(self, latitudes, longitudes, indptr, indices, lengths, edge_risk=None):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.edge_risk = (
+            np.zeros(len(self.indices), dtype=np.float32) if edge_risk is None
+            else np.asarray(edge_risk, dtype=np.float32)
+        )
+        # Attached by the caller; see EdgeRiskTable
+        self.risk_table = None
+        # id(risk array) -> (weakref to it, cost graph); see _cost_graph
+        self._cost_graphs = OrderedDict()
+        self._cost_lock = threading.Lock()
+        self._tree = BallTree(np.radians(np.column_stack([self.latitudes, self.longitudes])), metric='haversine')
+
+        # Edge i goes from node _edge_source[i] to node indices[i]
+        self._edge_source = np.repeat(np.arange(len(self.latitudes), dtype=np.int32), np.diff(self.indptr))
+
+        # (source, target) keys for vectorised edge lookup; rows from
+        # from_osm have sorted columns, so no reordering is usually needed
+        keys = self._edge_source.astype(np.int64) * self.node_count + self.indices
+        self._key_order = None
+        if len(keys) and np.any(keys[1:] < keys[:-1]):
+            self._key_order = np.argsort(keys, kind='stable')
+            keys = keys[self._key_order]
+        self._edge_keys = keys
+
+    @property
+    def node_count(self):
+        return len(self.latitudes)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    # ------------------------------------------------------------------
+    # Build / persist
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_osm(cls, path):
+        """
+        Build the graph from an OSM extract (both directions of every
+        walkable way segment)
+        """
+        node_coords, ways = parse_osm(path)
+
+        src, dst = [], []
+        for way in ways:
+            refs = [ref for ref in way if ref in node_coords]
+            src.extend(refs[:-1])
+            dst.extend(refs[1:])
+        if not src:
+            raise ValueError(f'No walkable ways found in {path}')
+
+        osm_ids = np.unique(np.concatenate([np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64)]))
+        coords = np.array([node_coords[i] for i in osm_ids], dtype=np.float64).reshape(-1, 2)
+
+        u = np.searchsorted(osm_ids, np.array(src, dtype=np.int64))
+        v = np.searchsorted(osm_ids, np.array(dst, dtype=np.int64))
+
+        # Undirected: add both directions, drop self-loops and duplicates
+        rows = np.concatenate([u, v])
+        cols = np.concatenate([v, u])
+        keep = rows != cols
+        pairs = np.unique(np.column_stack([rows[keep], cols[keep]]), axis=0)
+        rows, cols = pairs[:, 0], pairs[:, 1]
+
+        lengths = haversine_m(coords[rows, 0], coords[rows, 1], coords[cols, 0], coords[cols, 1])
+        indptr = np.zeros(len(osm_ids) + 1, dtype=np.int64)
+        np.add.at(indptr, rows + 1, 1)
+        indptr = np.cumsum(indptr)
+
+        # pairs are sorted by row, so cols/lengths are already in CSR order
+        return cls(coords[:, 0], coords[:, 1], indptr, cols, lengths)
+
+    def save(self, path):
+        np.savez(
+            path,
+            latitudes=self.latitudes, longitudes=self.longitudes,
+            indptr=self.indptr, indices=self.indices,
+            lengths=self.lengths, edge_risk=self.edge_risk
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(
+            data['latitudes'], data['longitudes'], data['indptr'], data['indices'],
+            data['lengths'], data['edge_risk'] if 'edge_risk' in data else None
+        )
+
+    def edge_midpoints(self):
+        """
+        Returns:
+            (latitudes, longitudes) of every directed edge's midpoint
+        """
+        lat = (self.latitudes[self._edge_source] + self.latitudes[self.indices]) / 2
+        lon = (self.longitudes[self._edge_source] + self.longitudes[self.indices]) / 2
+        return lat, lon
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def nearest_node(self, latitude, longitude):
+        """
+        Returns:
+            (node index, distance_m)
+        """
+        dist, idx = self._tree.query(np.radians([[latitude, longitude]]), k=1)
+        return int(idx[0, 0]), float(dist[0, 0] * EARTH_RADIUS_M)
+
+    def sample_route(self, route, count, edge_risk=None):
+        """
+        Points evenly spaced (by distance) along a route, endpoints included
+
+        Returns:
+            (latitudes, longitudes, risk) where risk is the edge_risk of the
+            edge each point lies on, or None if edge_risk isn't given
+        """
+        edges = route['edges']
+        if not len(edges):
+            lats = np.full(count, route['latitudes'][0])
+            lons = np.full(count, route['longitudes'][0])
+            return lats, lons, None if edge_risk is None else np.zeros(count, dtype=np.float32)
+
+        along = np.concatenate([[0.0], np.cumsum(self.lengths[edges], dtype=np.float64)])
+        targets = np.linspace(0, along[-1], count)
+        lats = np.interp(targets, along, route['latitudes'])
+        lons = np.interp(targets, along, route['longitudes'])
+        if edge_risk is None:
+            return lats, lons, None
+
+        on_edge = np.clip(np.searchsorted(along, targets, side='right') - 1, 0, len(edges) - 1)
+        return lats, lons, np.asarray(edge_risk, dtype=np.float32)[edges[on_edge]]
+
+    def route_risk(self, route, edge_risk):
+        """
+        Length-weighted mean edge risk of a route under another risk column
+        """
+        edges = route['edges']
+        if not len(edges) or not route['length_m']:
+            return 0.0
+        lengths = self.lengths[edges].astype(np.float64)
+        return float((np.asarray(edge_risk, dtype=np.float64)[edges] * lengths).sum() / route['length_m'])
+
+    def _tree_path(self, predecessors, node):
+        """
+        Nodes from node back to its search tree's root
+        """
+        nodes = [node]
+        while predecessors[nodes[-1]] >= 0:
+            nodes.append(int(predecessors[nodes[-1]]))
+        return nodes
+
+    def _edge_ids_between(self, sources, targets):
+        """
+        CSR positions of the edges sources[i] -> targets[i]
+        """
+        keys = np.asarray(sources, dtype=np.int64) * self.node_count + np.asarray(targets, dtype=np.int64)
+        positions = np.searchsorted(self._edge_keys, keys)
+        return positions if self._key_order is None else self._key_order[positions]
+
+    def _search(self, graph, source, target, limit):
+        """
+        Bidirectional Dijkstra: both trees grown to `limit`, then the
+        cheapest edge joining them
+
+        The graph is symmetric (every way is added in both directions with
+        the same midpoint risk), so the tree from the target doubles as the
+        reverse search. Any path of cost C has an edge whose ends lie within
+        C/2 of either endpoint, so a meeting cost <= 2 * limit is optimal.
+
+        Returns:
+            (dist (2, n), predecessors (2, n), meeting cost, (u, v) meeting edge)
+        """
+        dist, predecessors = dijkstra(
+            graph, directed=True, indices=[source, target], return_predecessors=True, limit=limit
+        )
+        reached = np.flatnonzero(np.isfinite(dist[0]))
+        starts, ends = self.indptr[reached], self.indptr[reached + 1]
+        counts = ends - starts
+        edges = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        sources = np.repeat(reached, counts)
+        joined = dist[0][sources] + graph.data[edges] + dist[1][self.indices[edges]]
+        if not len(joined) or not np.isfinite(joined.min()):
+            return dist, predecessors, np.inf, None
+        best = int(np.argmin(joined))
+        return dist, predecessors, float(joined[best]), (int(sources[best]), int(self.indices[edges[best]]))
+
+    def _describe(self, nodes, risk, base_cost):
+        edges = (
+            self._edge_ids_between(nodes[:-1], nodes[1:]) if len(nodes) > 1
+            else np.empty(0, dtype=np.int64)
+        )
+        lengths = self.lengths[edges].astype(np.float64)
+        length_m = float(lengths.sum())
+        return {
+            'nodes': nodes,
+            'edges': edges,
+            'latitudes': self.latitudes[nodes],
+            'longitudes': self.longitudes[nodes],
+            'length_m': length_m,
+            'risk': float((risk[edges] * lengths).sum() / length_m) if length_m else 0.0,
+            'max_risk': float(risk[edges].max()) if len(edges) else 0.0,
+            'cost': float(base_cost[edges].sum()),
+        }
+
+    def _cost_graph(self, risk):
+        """
+        Sparse cost matrix for a risk array, cached while that array is
+        alive (the static risk, or an EdgeRiskTable's cached columns), as
+        building it touches every edge
+        """
+        key = id(risk)
+        with self._cost_lock:
+            entry = self._cost_graphs.get(key)
+            if entry is not None and entry[0]() is risk:
+                self._cost_graphs.move_to_end(key)
+                return entry[1]
+
+        # Floor keeps coincident OSM nodes from producing zero-weight edges
+        base_cost = np.maximum(self.lengths.astype(np.float64), 0.01) * (1.0 + self.RISK_WEIGHT * risk)
+        graph = csr_matrix((base_cost, self.indices, self.indptr), shape=(self.node_count, self.node_count))
+        with self._cost_lock:
+            self._cost_graphs[key] = (weakref.ref(risk), graph)
+            while len(self._cost_graphs) > EdgeRiskTable.CACHED_COLUMNS + 1:
+                self._cost_graphs.popitem(last=False)
+        return graph
+
+    @staticmethod
+    def _branch_points(predecessors, reached, on_route, nodes):
+        """
+        For each of `nodes`, the last chosen-route node on its search-tree
+        path from the root (-1 if none), by pointer jumping over the nodes
+        the tree reached, so it stays vectorised
+        """
+        position = np.full(len(predecessors), -1, dtype=np.int64)
+        position[reached] = np.arange(len(reached))
+        parents = predecessors[reached]
+        parent_pos = np.where(parents >= 0, position[np.maximum(parents, 0)], -1)
+        own = np.arange(len(reached))
+        anchor = np.where(on_route[reached] | (parent_pos < 0), own, parent_pos)
+        while True:
+            jumped = anchor[anchor]
+            if np.array_equal(jumped, anchor):
+                break
+            anchor = jumped
+        branch = reached[anchor]
+        branch = np.where(on_route[branch], branch, -1)
+        return branch[position[nodes]]
+
+    def routes(self, start_lat, start_lon, end_lat, end_lon, k=3, edge_risk=None):
+        """
+        Up to k distinct low-cost walking routes
+
+        One bidirectional search finds the safest route; alternatives are
+        via-node routes (source -> v -> target through the two search
+        trees) costing at most ALT_STRETCH more, taken cheapest first and
+        skipped when they double back or mostly overlap a route already
+        chosen. No extra searches are run for them.
+
+        Args:
+            edge_risk: Optional per-edge risk (0-1) overriding self.edge_risk,
+                e.g. the column for the departure hour
+
+        Returns:
+            List of routes, safest (lowest cost) first:
+            {
+                'nodes': [node indices],
+                'edges': array of edge ids,
+                'latitudes': array, 'longitudes': array,
+                'length_m': 1830.5,
+                'risk': 0.21,       # length-weighted mean edge risk
+                'max_risk': 0.64,
+                'cost': 2410.0
+            }
+            Empty if an endpoint is too far from the graph or unreachable.
+        """
+        source, source_snap = self.nearest_node(start_lat, start_lon)
+        target, target_snap = self.nearest_node(end_lat, end_lon)
+        if source_snap > self.MAX_SNAP_M or target_snap > self.MAX_SNAP_M:
+            return []
+
+        risk = self.edge_risk if edge_risk is None else np.asarray(edge_risk, dtype=np.float32)
+        graph = self._cost_graph(risk)
+        base_cost = graph.data
+        if source == target:
+            return [self._describe([source], risk, base_cost)]
+
+        # Grow both trees to a bit over half the expected cost (enough for
+        # alternatives' midpoints too) and widen until the meeting cost is
+        # provably optimal (<= 2 * limit)
+        crow = float(haversine_m(
+            self.latitudes[source], self.longitudes[source],
+            self.latitudes[target], self.longitudes[target]
+        ))
+        limit = max(crow, 100.0) * self.SEARCH_SLACK * 0.55 * (1 + self.ALT_STRETCH)
+        max_limit = max(crow, 500.0) * self.MAX_DETOUR * (1.0 + self.RISK_WEIGHT)
+        while True:
+            dist, predecessors, best_cost, meeting = self._search(graph, source, target, limit)
+            if best_cost <= 2 * limit or limit >= max_limit:
+                break
+            limit = min(limit * 2, max_limit)
+        if meeting is None or best_cost > 2 * limit:
+            return []
+
+        u, v = meeting
+        best_nodes = self._tree_path(predecessors[0], u)[::-1] + self._tree_path(predecessors[1], v)
+        found = [self._describe(best_nodes, risk, base_cost)]
+        if k == 1:
+            return found
+
+        # Via-node candidates: source -> via -> target within the stretch
+        total = dist[0] + dist[1]
+        candidates = np.flatnonzero(total <= (1 + self.ALT_STRETCH) * best_cost)
+        reached = [np.flatnonzero(np.isfinite(d)) for d in dist]
+
+        on_route = np.zeros(self.node_count, dtype=bool)
+        on_route[best_nodes] = True
+        edge_sets = [set(found[0]['edges'].tolist())]
+        rejected = np.zeros(self.node_count, dtype=bool)
+        shared = None
+
+        for _ in range(self.MAX_VIA_TRIES):
+            if len(found) == k:
+                break
+
+            if shared is None:
+                # Cost shared with chosen routes: up to where the via route
+                # leaves them on the source side, and from where it rejoins
+                from_source = self._branch_points(predecessors[0], reached[0], on_route, candidates)
+                to_target = self._branch_points(predecessors[1], reached[1], on_route, candidates)
+                linked = (from_source >= 0) & (to_target >= 0)
+                shared = dist[0][np.maximum(from_source, 0)] + dist[1][np.maximum(to_target, 0)]
+
+            valid = linked & ~on_route[candidates] & ~rejected[candidates]
+            valid &= shared <= self.MAX_OVERLAP * total[candidates]
+            if not valid.any():
+                break
+
+            options = np.flatnonzero(valid)
+            via = int(candidates[options[np.argmin(total[candidates[options]])]])
+
+            nodes = self._tree_path(predecessors[0], via)[::-1] + self._tree_path(predecessors[1], via)[1:]
+            rejected[nodes] = True
+            # A via node on a spur gives a route that goes out and back
+            if len(set(nodes)) != len(nodes):
+                continue
+
+            route = self._describe(nodes, risk, base_cost)
+            edges = route['edges'].tolist()
+            lengths = self.lengths[route['edges']].astype(np.float64)
+            if any(
+                lengths[[e in edge_set for e in edges]].sum() > self.MAX_OVERLAP * max(route['length_m'], 1e-9)
+                for edge_set in edge_sets
+            ):
+                continue
+
+            found.append(route)
+            edge_sets.append(set(edges))
+            on_route[nodes] = True
+            shared = None
+
+        found.sort(key=lambda r: r['cost'])
+        return found
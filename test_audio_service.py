@@ -51,9 +51,9 @@ def test_model_loading():
     print("="*60)
     
     try:
-        model = AudioAnalyzer.get_model()
-        print("✅ Whisper model loaded successfully")
-        print(f"   Device: {model.device}")
+        with AudioAnalyzer.borrow_model() as model:
+            print("✅ Whisper model loaded successfully")
+            print(f"   Device: {model.device}")
         return True
     except Exception as e:
         print(f"❌ Failed to load model: {e}")
@@ -9,13 +9,17 @@ from ml.lstm_model import ThreatLSTM, ModelTrainer
 import pickle
 
 def main():
+    # Optional: train from a Parquet snapshot instead of the live database
+    # python train_model.py ml/incidents.parquet
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else None
+
     print("="*60)
     print("EVE - LSTM THREAT PREDICTION MODEL TRAINING")
     print("="*60)
     
     # Step 1: Prepare data
     print("\n[1/4] Preparing data...")
-    data = DataPreparation.prepare_full_dataset()
+    data = DataPreparation.prepare_full_dataset(snapshot_path=snapshot_path)
     
     # Step 2: Create model
     print("\n[2/4] Creating LSTM model...")